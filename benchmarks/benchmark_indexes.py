@@ -0,0 +1,114 @@
+"""
+Benchmark the habit and task lookups with and without the secondary indexes.
+
+Run from the project root:
+    python -m benchmarks.benchmark_indexes --habits 2000 --tasks-per-habit 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+from src.db import create_indexes
+from src.models import Base
+
+
+QUERIES = {
+    "tasks for habit": (
+        "SELECT * FROM tasks WHERE habit_id = :habit_id",
+        lambda habit_count: {"habit_id": random.randint(1, habit_count)},
+    ),
+    "latest task for habit": (
+        "SELECT * FROM tasks WHERE habit_id = :habit_id "
+        "ORDER BY expected_day DESC, id DESC LIMIT 1",
+        lambda habit_count: {"habit_id": random.randint(1, habit_count)},
+    ),
+    "tasks due in a day": (
+        "SELECT * FROM tasks WHERE expected_day = :day",
+        lambda habit_count: {"day": datetime(2024, 1, 10).toordinal()},
+    ),
+    "habits by periodicity": (
+        "SELECT * FROM habits WHERE periodicity = :periodicity",
+        lambda habit_count: {"periodicity": "weekly"},
+    ),
+    "habit by name": (
+        "SELECT * FROM habits WHERE name = :name",
+        lambda habit_count: {"name": f"Habit {random.randint(1, habit_count)}"},
+    ),
+}
+
+
+def populate(engine, habit_count, tasks_per_habit):
+    """
+    Fill the database with synthetic habits and tasks.
+    """
+    now = datetime(2024, 1, 1, 23, 59, 59)
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO habits (id, name, periodicity, current_streak, longest_streak, next_completion_date, created_at, updated_at) "
+                 "VALUES (:id, :name, :periodicity, 0, 0, :now, :now, :now)"),
+            [{"id": i, "name": f"Habit {i}", "periodicity": random.choice(["daily", "weekly"]), "now": now}
+             for i in range(1, habit_count + 1)]
+        )
+        for habit_id in range(1, habit_count + 1):
+            conn.execute(
+                text("INSERT INTO tasks (habit_id, completed, completed_on, expected_completion_by, expected_day, "
+                     "created_at, updated_at) VALUES (:habit_id, 1, NULL, :due, :due_day, :now, :now)"),
+                [{"habit_id": habit_id, "due": now + timedelta(days=day),
+                  "due_day": (now + timedelta(days=day)).toordinal(), "now": now}
+                 for day in range(tasks_per_habit)]
+            )
+
+
+def drop_indexes(engine):
+    """
+    Drop every secondary index so the baseline measures plain table scans.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.drop(bind=engine, checkfirst=True)
+
+
+def run_queries(engine, habit_count, repeat):
+    """
+    Print the query plan and mean latency of each benchmark query.
+    """
+    with engine.connect() as conn:
+        for label, (sql, params) in QUERIES.items():
+            plan = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params(habit_count)).fetchall()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(text(sql), params(habit_count)).fetchall()
+            elapsed = (time.perf_counter() - start) / repeat * 1000
+            print(f"  {label:<24} {elapsed:8.3f} ms  | {'; '.join(row[-1] for row in plan)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=1000)
+    parser.add_argument("--tasks-per-habit", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmpdir, 'benchmark.sqlite3')}")
+        Base.metadata.create_all(engine)
+        drop_indexes(engine)
+        print(f"Populating {args.habits} habits x {args.tasks_per_habit} tasks...")
+        populate(engine, args.habits, args.tasks_per_habit)
+
+        print("\nWithout indexes:")
+        run_queries(engine, args.habits, args.repeat)
+
+        create_indexes(engine)
+        with engine.connect() as conn:
+            conn.execute(text("ANALYZE"))
+        print("\nWith indexes:")
+        run_queries(engine, args.habits, args.repeat)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,7 @@ def list_habits():
     """
     List all habits.
     """
-    habit_manager = HabitManager(StorageComponent())
-    return habit_manager.habits
+    return list(HabitManager(StorageComponent()).habits)
 
 
 def list_habits_periodicity(periodicity):
@@ -17,8 +16,7 @@ def list_habits_periodicity(periodicity):
     Arguments:
     periodicity -- the periodicity to filter habits by (e.g., 'daily', 'weekly').
     """
-    habit_manager = HabitManager(StorageComponent())
-    habits = habit_manager.storage.load_habits(periodicity=periodicity)  # Filter by periodicity
+    habits = StorageComponent().load_habits(periodicity=periodicity)  # Filter by periodicity
     return habits if habits else f"No habits found with periodicity '{periodicity}'."
 
 
@@ -26,8 +24,7 @@ def longest_streak_from_habits():
     """
     Find the habit with the longest streak across all habits.
     """
-    habit_manager = HabitManager(StorageComponent())
-    habits = habit_manager.storage.load_habits()  # Load all habits
+    habits = list(HabitManager(StorageComponent()).habits)  # Loads all habits on first access
     
     if not habits:
         return "No habits found."
@@ -46,8 +43,7 @@ def longest_streak_for_given_habit(habit_name):
     Arguments:
     habit_name -- the name of the habit to find the longest streak for.
     """
-    habit_manager = HabitManager(StorageComponent())
-    habits = habit_manager.storage.load_habits(name=habit_name)  # Filter by habit name
+    habits = StorageComponent().load_habits(name=habit_name)  # Filter by habit name
     
     if not habits:
         return f"No habit found with the name '{habit_name}'."
@@ -57,3 +53,60 @@ def longest_streak_for_given_habit(habit_name):
     
     return f"The longest streak for habit '{habit_name}' is {longest_streak_habit.longest_streak}."
 
+
+
+def completions_by_month_for_given_habit(habit_name):
+    """
+    Count the completions of a habit per month, across hot and archived tasks.
+
+    Arguments:
+    habit_name -- the name of the habit to count completions for.
+    """
+    storage = StorageComponent()
+    habits = storage.load_habits(name=habit_name)
+
+    if not habits:
+        return f"No habit found with the name '{habit_name}'."
+
+    return [(row.month, row.completed_count, row.on_time_count)
+            for habit in habits for row in storage.load_monthly_completions(habit.id)]
+
+
+def completion_rates():
+    """
+    List every habit with its completion totals, best on-time rate first.
+    Reads the habit_stats summary, so the cost grows with the number of habits, not tasks.
+    """
+    rates = StorageComponent().load_completion_rates()
+    return sorted(rates, key=lambda row: row.on_time_rate, reverse=True)
+
+
+def list_habits_across_shards(router, periodicity=None):
+    """
+    List habits of every user on every shard, querying the shards in parallel.
+
+    Arguments:
+    router -- the ShardRouter holding the shards.
+    periodicity -- optional periodicity to filter habits by (e.g., 'daily', 'weekly').
+    """
+    results = router.fan_out(lambda storage: storage.load_habits(periodicity=periodicity))
+    return [habit for shard_habits in results for habit in shard_habits]
+
+
+def longest_streak_across_shards(router):
+    """
+    Find the habit with the longest streak across all users on every shard.
+
+    Arguments:
+    router -- the ShardRouter holding the shards.
+    """
+    # Each shard returns only its own best habit, so little data crosses threads
+    results = router.fan_out(lambda storage: max(
+        storage.load_habits(), key=lambda habit: habit.longest_streak, default=None))
+    habits = [habit for habit in results if habit is not None]
+
+    if not habits:
+        return "No habits found."
+
+    longest_habit = max(habits, key=lambda habit: habit.longest_streak)
+    return f"The habit with the longest streak is '{longest_habit.name}' with a streak of {longest_habit.longest_streak}."
@@ -0,0 +1,57 @@
+"""
+Move old completed tasks into the archive table, keeping per-habit monthly rollups.
+
+Run from the project root, e.g. nightly:
+    python -m src.archive --horizon-days 90
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+from src.db import BULK_CHUNK_SIZE, StorageComponent
+
+
+# Completed tasks due longer ago than this are archived
+ARCHIVE_HORIZON_DAYS = 90
+
+
+def load_archive_horizon():
+    """
+    Read the archive horizon from the TASK_ARCHIVE_HORIZON_DAYS environment variable.
+    :return: The horizon in days.
+    """
+    return int(os.getenv("TASK_ARCHIVE_HORIZON_DAYS", str(ARCHIVE_HORIZON_DAYS)))
+
+
+def archive_old_tasks(storage_component, horizon_days=None, now=None, batch_size=BULK_CHUNK_SIZE):
+    """
+    Archive the completed tasks due more than `horizon_days` before `now`.
+
+    :param storage_component: Storage component to archive through.
+    :param horizon_days: Age in days after which tasks are archived, see load_archive_horizon().
+    :param now: Optional reference time, defaults to the current time.
+    :param batch_size: Number of tasks moved per transaction.
+    :return: The number of archived tasks.
+    """
+    if horizon_days is None:
+        horizon_days = load_archive_horizon()
+    cutoff = (now or datetime.now()) - timedelta(days=horizon_days)
+    return storage_component.archive_tasks(cutoff, batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old completed tasks.")
+    parser.add_argument("--horizon-days", type=int, default=None,
+                        help="Archive tasks due longer ago than this (default: TASK_ARCHIVE_HORIZON_DAYS or 90).")
+    parser.add_argument("--batch-size", type=int, default=BULK_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    storage = StorageComponent()
+    try:
+        archived = archive_old_tasks(storage, args.horizon_days, batch_size=args.batch_size)
+    finally:
+        storage.close()
+    print(f"Archived {archived} tasks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+from contextlib import asynccontextmanager
+from datetime import datetime
+from sqlalchemy import delete, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from src.db import (
+    _habit_values,
+    _task_values,
+    habit_filters,
+    habit_stats_statements,
+    install_sqlite_pragmas,
+    latest_task_statement,
+    load_database_config,
+)
+from src.models import ArchivedTask, Habit, HabitPeriodStats, HabitStats, Task, TaskRollup
+
+
+# Async driver used when the configured URL names a backend without one
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+_async_engine = None
+
+
+def create_async_db_engine(config=None):
+    """
+    Create an asyncio engine from the same settings as create_db_engine().
+    A plain `sqlite:///` URL is switched to the aiosqlite driver.
+
+    :param config: Optional dict of settings, see load_database_config().
+    :return: A new AsyncEngine.
+    """
+    config = {**load_database_config(), **(config or {})}
+    url = make_url(config["url"])
+    backend = url.get_backend_name()
+    if url.drivername in ASYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[url.drivername])
+
+    engine_kwargs = {}
+    if config["pool_size"] and backend != "sqlite":
+        engine_kwargs["pool_size"] = config["pool_size"]
+    engine = create_async_engine(url, **engine_kwargs)
+
+    if backend == "sqlite":
+        install_sqlite_pragmas(engine.sync_engine, config)
+    return engine
+
+
+def get_async_engine():
+    """
+    Return the application async engine, creating it on first use.
+    """
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_db_engine()
+    return _async_engine
+
+
+class AsyncStorageComponent:
+    """
+    Asyncio counterpart of StorageComponent.
+    Every call runs in its own short-lived session, so many calls can be in flight
+    at once; use `unit_of_work()` to run several calls in one transaction.
+    """
+
+    def __init__(self, engine=None, session_factory=None, session=None):
+        self.engine = engine if engine is not None else get_async_engine()
+        self.session_factory = session_factory or async_sessionmaker(self.engine, expire_on_commit=False)
+        # Set only on the component handed out by unit_of_work()
+        self.session = session
+
+    @asynccontextmanager
+    async def _session_scope(self):
+        if self.session is not None:
+            yield self.session
+            await self.session.flush()
+            return
+        async with self.session_factory() as session:
+            async with session.begin():
+                yield session
+
+    @asynccontextmanager
+    async def unit_of_work(self):
+        """
+        Run the storage calls made inside the block in one transaction.
+        Committed when the block exits cleanly, rolled back if it raises.
+
+        Usage:
+            async with storage.unit_of_work() as uow:
+                await uow.save_task(task)
+                await uow.save_habit(habit)
+        """
+        if self.session is not None:
+            yield self
+            return
+        async with self.session_factory() as session:
+            async with session.begin():
+                yield AsyncStorageComponent(self.engine, self.session_factory, session)
+
+    async def load_habits(self, name=None, periodicity=None, current_streak=None, longest_streak=None, ids=None):
+        """
+        Load habits from the database with optional filters.
+        See StorageComponent.load_habits() for the filters.
+        :return: A list of filtered habits.
+        """
+        async with self._session_scope() as session:
+            result = await session.scalars(
+                select(Habit).where(*habit_filters(name, periodicity, current_streak, longest_streak, ids)))
+            return result.all()
+
+    async def load_tasks(self, ids=None):
+        """
+        Load tasks from the database.
+        :param ids: Optional collection of task IDs to restrict the results to.
+        """
+        statement = select(Task)
+        if ids is not None:
+            statement = statement.where(Task.id.in_(ids))
+        async with self._session_scope() as session:
+            result = await session.scalars(statement)
+            return result.all()
+
+    async def load_tasks_for_habit(self, habit_id):
+        """
+        Load every task of a habit.
+        :param habit_id: The ID of the habit.
+        :return: The tasks in insertion order, or None if the habit does not exist.
+        """
+        async with self._session_scope() as session:
+            if await session.get(Habit, habit_id) is None:
+                return None
+            result = await session.scalars(
+                select(Task).where(Task.habit_id == habit_id).order_by(Task.id))
+            return result.all()
+
+    async def load_latest_task(self, habit_id):
+        """
+        Load the most recent task of a habit without loading its task history.
+        :param habit_id: The ID of the habit.
+        :return: The latest task, or None if the habit has no tasks.
+        """
+        async with self._session_scope() as session:
+            result = await session.scalars(latest_task_statement(habit_id))
+            return result.first()
+
+    async def save_habit(self, habit):
+        """
+        Save or update a habit to the database.
+        :param habit: The habit object to be saved or updated.
+        :return: The persisted habit.
+        """
+        return await self._save_one(Habit, habit, _habit_values)
+
+    async def save_task(self, task):
+        """
+        Save or update a task to the database.
+        :param task: The task object to be saved or updated.
+        :return: The persisted task.
+        """
+        return await self._save_one(Task, task, _task_values)
+
+    async def _save_one(self, model, obj, values):
+        now = datetime.now()
+        async with self._session_scope() as session:
+            if isinstance(obj, model) and obj in session:
+                obj.updated_at = now
+                return obj
+
+            obj_id = getattr(obj, "id", None)
+            if obj_id is not None:
+                result = await session.execute(
+                    update(model).where(model.id == obj_id).values(updated_at=now, **values(obj)))
+                if result.rowcount:
+                    return obj
+
+            new_obj = model(created_at=now, updated_at=now, **values(obj))
+            session.add(new_obj)
+            await session.flush()
+            return new_obj
+
+    async def update_habit_stats(self, habit_id, completed_on, expected_completion_by):
+        """
+        Count a completion in the habit's summary rows.
+        See StorageComponent.update_habit_stats().
+        """
+        async with self._session_scope() as session:
+            for update_statement, insert_statement in habit_stats_statements(
+                    habit_id, completed_on, expected_completion_by):
+                if not (await session.execute(update_statement)).rowcount:
+                    await session.execute(insert_statement)
+
+    async def delete_habit(self, habit_id):
+        """
+        Delete a habit and its tasks, archived ones included.
+        :param habit_id: The ID of the habit to be deleted.
+        """
+        async with self._session_scope() as session:
+            for model in (Task, ArchivedTask, TaskRollup, HabitStats, HabitPeriodStats):
+                await session.execute(delete(model).where(model.habit_id == habit_id))
+            await session.execute(delete(Habit).where(Habit.id == habit_id))
+
+    async def delete_task(self, task_id):
+        """
+        Delete a single task.
+        :param task_id: The ID of the task to be deleted.
+        """
+        async with self._session_scope() as session:
+            await session.execute(delete(Task).where(Task.id == task_id))
+
+    async def close(self):
+        """
+        Release the engine's connections.
+        """
+        await self.engine.dispose()
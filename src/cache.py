@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live, used to keep query results in memory.
+    Counts hits and misses so the hit rate can be monitored.
+    """
+
+    def __init__(self, maxsize=128, ttl=60, clock=time.monotonic):
+        """
+        :param maxsize: Maximum number of entries; the least recently used entry is evicted first.
+        :param ttl: Seconds an entry stays valid, or None to never expire.
+        :param clock: Function returning the current time in seconds.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a load that raced with a write is not cached
+        self._generation = 0
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value for `key`, calling `loader()` and caching its result on a miss.
+
+        :param key: A hashable cache key.
+        :param loader: Function computing the value.
+        :return: The cached or freshly loaded value.
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if generation != self._generation:
+                return value
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, predicate=None):
+        """
+        Drop cached entries.
+
+        :param predicate: Optional function of (key, value); only entries for which it
+                          returns True are dropped. All entries are dropped when omitted.
+        :return: The number of entries dropped.
+        """
+        with self._lock:
+            self._generation += 1
+            if predicate is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                return dropped
+            stale = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stats(self):
+        """
+        :return: A dict with the hit and miss counters and the current number of entries.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
@@ -3,6 +3,8 @@ from datetime import datetime, time
 from .habits import HabitManager
 from .tasks import TaskManager
 from .db import StorageComponent
+from .periodicity import WEEKDAYS
+from .snapshot import HabitSnapshot
 from .analytics import list_habits, longest_streak_for_given_habit, longest_streak_from_habits, list_habits_periodicity
 from .generate_gif import main
 
@@ -10,7 +12,9 @@ from .generate_gif import main
 class HabitTrackerCLI:
     def __init__(self):
         self.storage_component = StorageComponent()
-        self.habit_manager = HabitManager(self.storage_component)
+        # Habits are listed from the snapshot and only loaded when one is selected
+        self.snapshot = HabitSnapshot.load(self.storage_component)
+        self.habit_manager = HabitManager(self.storage_component, snapshot=self.snapshot)
         self.task_manager = TaskManager(self.storage_component)
 
     def create_habit(self):
@@ -23,16 +27,25 @@ class HabitTrackerCLI:
             return
         name = questionary.text("Enter the name of the habit:").ask()
         periodicity = questionary.select(
-            "Select the periodicity of the habit:", choices=["daily", "weekly"]).ask()
+            "Select the periodicity of the habit:",
+            choices=["daily", "weekly", "monthly", "every N days", "specific weekdays"]).ask()
+        if periodicity == "every N days":
+            days = questionary.text("Every how many days?", validate=lambda text: text.isdigit() and int(text) > 0).ask()
+            periodicity = f"every {days} days"
+        elif periodicity == "specific weekdays":
+            weekdays = questionary.checkbox(
+                "Select the weekdays:", choices=list(WEEKDAYS), validate=lambda selected: bool(selected)).ask()
+            periodicity = ",".join(weekdays)
 
         # Create habit and corresponding task
         created_habit = self.habit_manager.create_habit(name, periodicity)
         self.task_manager.create_task(
             created_habit.id, created_habit.periodicity)
+        self.snapshot.refresh(self.storage_component, created_habit.id)
         print("Habit successfully created😊!")
 
     def update_habit(self):
-        habits = self.habit_manager.habits
+        habits = list(self.habit_manager.habits)
         if not habits:
             print("No habits available to update.")
             return
@@ -63,7 +76,7 @@ class HabitTrackerCLI:
             break
 
     def delete_habit(self):
-        habits = self.habit_manager.habits
+        habits = list(self.habit_manager.habits)
         if not habits:
             print("No habits available to delete.")
             return
@@ -85,7 +98,7 @@ class HabitTrackerCLI:
             break
 
     def list_habits(self):
-        habits = list_habits()
+        habits = list(self.habit_manager.habits)
         if not habits:
             print("No habits found.")
             return
@@ -100,7 +113,7 @@ class HabitTrackerCLI:
         if selected_habit_name == "Go back":
             return
         selected_index = int(selected_habit_name.split('.')[0]) - 1
-        selected_habit = habits[selected_index]
+        selected_habit = self.storage_component.load_habit(habits[selected_index].id)
         print(f"\nID: {selected_habit.id}\nName: {selected_habit.name}\nPeriodicity: {selected_habit.periodicity}\nCreated On: {selected_habit.created_at.strftime('%A, %B %d, %Y')}\nNext Completion Date: {selected_habit.next_completion_date.strftime('%A, %B %d, %Y')}\n")
 
         while True:
@@ -149,7 +162,7 @@ class HabitTrackerCLI:
         Display habits filtered by periodicity.
         """
         periodicity = questionary.select(
-            "Select the periodicity to filter by:", choices=["daily", "weekly", "Go back"]
+            "Select the periodicity to filter by:", choices=["daily", "weekly", "monthly", "Go back"]
         ).ask()
 
         if periodicity == "Go back":
@@ -220,6 +233,7 @@ class HabitTrackerCLI:
             elif action == "View Analytics":
                 self.view_analytics()
             elif action == "Exit":
+                self.snapshot.close()
                 self.storage_component.close()
                 exit()
 
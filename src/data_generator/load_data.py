@@ -1,5 +1,5 @@
 import pandas as pd
-from src.db import session
+from src.db import session_scope, StorageComponent
 from src.models import Habit, Task
 from .generate_habit_tracker_dataset import generate_habit_tracker_dataset
 from .validate_sample_habits import validate_habit_data
@@ -9,31 +9,32 @@ from .validate_sample_tasks import validate_task_entries_from_csv
 def load_habits_from_csv(csv_file):
     df = pd.read_csv(csv_file)
 
-    for index, row in df.iterrows():
-        habit = Habit(
-            id=row['id'],
+    habits = (
+        Habit(
+            id=int(row['id']),
             name=row['name'],
             periodicity=row['periodicity'],
-            current_streak=row['current_streak'],
-            longest_streak=row['longest_streak'],
+            current_streak=int(row['current_streak']),
+            longest_streak=int(row['longest_streak']),
             next_completion_date=pd.to_datetime(row['next_completion_date']),
             created_at=pd.to_datetime(row['created_at']),
             updated_at=pd.to_datetime(row['updated_at'])
         )
-        session.add(habit)
-
-    session.commit()
-    session.close()
+        for index, row in df.iterrows()
+    )
+    storage = StorageComponent()
+    storage.save_habits(habits)
+    storage.close()
     print("Habits loaded successfully.")
 
 
 def load_tasks_from_csv(csv_file):
     df = pd.read_csv(csv_file)
 
-    for index, row in df.iterrows():
-        task = Task(
-            habit_id=row['habit_id'],
-            completed=row['completed'],
+    tasks = (
+        Task(
+            habit_id=int(row['habit_id']),
+            completed=bool(row['completed']),
             completed_on=pd.to_datetime(row['completed_on']) if pd.notnull(
                 row['completed_on']) else None,
             expected_completion_by=pd.to_datetime(
@@ -41,19 +42,19 @@ def load_tasks_from_csv(csv_file):
             created_at=pd.to_datetime(row['created_at']),
             updated_at=pd.to_datetime(row['updated_at'])
         )
-        session.add(task)
-
-    session.commit()
-    session.close()
+        for index, row in df.iterrows()
+    )
+    storage = StorageComponent()
+    storage.save_tasks(tasks)
+    storage.close()
     print("Tasks loaded successfully.")
 
 
 def load_data():
     # delete existing data if any
-    session.query(Habit).delete()
-    session.query(Task).delete()
-    session.commit()
-    session.close()
+    with session_scope() as session:
+        session.query(Habit).delete()
+        session.query(Task).delete()
 
     # generating habit data
     generate_habit_tracker_dataset()
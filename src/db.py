@@ -1,33 +1,660 @@
-from datetime import datetime
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from src.models import Base, Habit, Task
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from itertools import islice
+from sqlalchemy import (
+    Date,
+    DateTime,
+    Integer,
+    and_,
+    bindparam,
+    case,
+    cast,
+    column,
+    create_engine,
+    delete,
+    event,
+    exists,
+    func,
+    insert,
+    inspect,
+    literal,
+    literal_column,
+    or_,
+    select,
+    table,
+    union_all,
+    update,
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import aliased, scoped_session, sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
+from src.cache import QueryCache
+from src.habits import COMPLETED, NOT_DUE, NOT_FOUND, CompletionResult, Habit as HabitSchedule
+from src.tasks import Task as TaskSchedule
+from src.periodicity import is_supported, rollover_deadlines
+from src.models import (
+    ArchivedTask,
+    Base,
+    Habit,
+    HabitPeriodStats,
+    HabitStats,
+    JournalCheckpoint,
+    Task,
+    TaskRollup,
+    day_ordinal,
+)
 
 
 DATABASE_URL = "sqlite:///habit_tracker.sqlite3"
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
-session = Session()
+# Rows written per transaction by the bulk save methods
+BULK_CHUNK_SIZE = 500
+# Rows fetched per query by the streaming loaders
+STREAM_BATCH_SIZE = 1000
+# Size and time-to-live (seconds) of the load_habits() result cache
+HABIT_CACHE_SIZE = 128
+HABIT_CACHE_TTL = 60
 
+# Instances stay loaded after commit, so a later save of an object the caller
+# already holds goes straight to an UPDATE instead of re-reading the row first.
+# The registry hands every thread its own session.
+Session = scoped_session(sessionmaker(expire_on_commit=False))
 
-def initialize_db():
+# Created on first use by get_engine(), so importing this module does not open a database
+_engine = None
+# load_habits() caches shared by every StorageComponent on the same engine. Entries hold
+# live instances, so they are keyed by the session that loaded them and only served to it.
+_habit_caches = weakref.WeakKeyDictionary()
+# Whether each engine's database has the habits_fts index, checked once per engine
+_search_index_available = weakref.WeakKeyDictionary()
+
+# SQLite FTS5 index over habits.name, kept in sync by triggers. The trigram
+# tokenizer indexes every 3-character substring, so substring, prefix and
+# token searches of 3+ characters are all index lookups.
+habits_fts = table("habits_fts", column("rowid"), column("name"), column("rank"))
+HABIT_SEARCH_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS habits_fts USING fts5("
+    "name, content='habits', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS habits_fts_insert AFTER INSERT ON habits BEGIN "
+    "INSERT INTO habits_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS habits_fts_delete AFTER DELETE ON habits BEGIN "
+    "INSERT INTO habits_fts(habits_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS habits_fts_update AFTER UPDATE OF name ON habits BEGIN "
+    "INSERT INTO habits_fts(habits_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO habits_fts(rowid, name) VALUES (new.id, new.name); END",
+)
+# Shortest term the trigram index can match
+MIN_SEARCH_TERM_LENGTH = 3
+# Indexes replaced by the day-ordinal indexes, dropped from older databases by create_indexes()
+OBSOLETE_INDEXES = (
+    "ix_tasks_habit_id_expected_completion_by",
+    "ix_tasks_expected_completion_by",
+    "ix_tasks_archive_habit_id_expected_completion_by",
+)
+
+
+def load_database_config():
+    """
+    Read the database settings from the environment.
+
+    DATABASE_URL         -- SQLAlchemy URL, defaults to the local SQLite file.
+    DATABASE_POOL_SIZE   -- Connection pool size (file databases and servers only).
+    SQLITE_JOURNAL_MODE  -- PRAGMA journal_mode, WAL lets readers run alongside a writer.
+    SQLITE_SYNCHRONOUS   -- PRAGMA synchronous, NORMAL is safe in WAL mode.
+    SQLITE_CACHE_SIZE    -- PRAGMA cache_size, negative values are KiB.
+    SQLITE_MMAP_SIZE     -- PRAGMA mmap_size in bytes.
+    SQLITE_BUSY_TIMEOUT  -- Milliseconds to wait for a lock before failing.
+
+    :return: A dict of settings accepted by create_db_engine().
+    """
+    pool_size = os.getenv("DATABASE_POOL_SIZE")
+    return {
+        "url": os.getenv("DATABASE_URL", DATABASE_URL),
+        "pool_size": int(pool_size) if pool_size else None,
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-64000")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),
+    }
+
+
+def create_db_engine(config=None):
+    """
+    Create an engine from the environment settings, with `config` overriding them.
+    SQLite connections get the performance pragmas applied as they are opened.
+
+    :param config: Optional dict of settings, see load_database_config().
+    :return: A new SQLAlchemy engine.
+    """
+    config = {**load_database_config(), **(config or {})}
+    url = make_url(config["url"])
+    is_sqlite = url.get_backend_name() == "sqlite"
+    in_memory = is_sqlite and url.database in (None, "", ":memory:")
+
+    engine_kwargs = {}
+    if config["pool_size"] and not in_memory:
+        engine_kwargs["pool_size"] = config["pool_size"]
+    if is_sqlite:
+        engine_kwargs["connect_args"] = {"timeout": config["busy_timeout"] / 1000}
+    else:
+        engine_kwargs["pool_pre_ping"] = True
+    engine = create_engine(url, **engine_kwargs)
+
+    if is_sqlite:
+        install_sqlite_pragmas(engine, config)
+
+    return engine
+
+
+def install_sqlite_pragmas(engine, config):
+    """
+    Apply the SQLite performance pragmas from `config` to every new connection of an engine.
+    :param engine: A sync engine (use `AsyncEngine.sync_engine` for async engines).
+    :param config: Dict of settings, see load_database_config().
+    """
+    pragmas = {
+        "journal_mode": config["journal_mode"],
+        "synchronous": config["synchronous"],
+        "cache_size": config["cache_size"],
+        "mmap_size": config["mmap_size"],
+        "busy_timeout": config["busy_timeout"],
+    }
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            if value is not None:
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+
+def get_engine():
+    """
+    Return the application engine, creating it on first use.
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_db_engine()
+        Session.configure(bind=_engine)
+    return _engine
+
+
+def get_session():
+    """
+    Return the calling thread's application session, creating it on first use.
+    """
+    get_engine()
+    return Session()
+
+
+@contextmanager
+def session_scope():
+    """
+    Provide a transactional scope around a series of operations.
+    A new session is opened for the block, committed once when it exits cleanly,
+    rolled back if it raises, and closed either way.
+
+    Usage:
+        with session_scope() as session:
+            session.add(habit)
+    """
+    get_engine()
+    session = Session.session_factory()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def __getattr__(name):
+    # Keep `from src.db import engine, session` working without creating them at import time
+    if name == "engine":
+        return get_engine()
+    if name == "session":
+        return get_session()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def initialize_db(engine=None):
     """
     Initialize the database schema.
     This method should handle creating all necessary tables and setting up the schema.
     """
+    engine = engine or get_engine()
+    had_tasks = inspect(engine).has_table(Task.__tablename__)
+    had_stats = inspect(engine).has_table(HabitStats.__tablename__)
     Base.metadata.create_all(engine)
+    add_missing_columns(engine)
+    backfill_task_days(engine)
+    create_indexes(engine)
+    create_search_index(engine)
+    if had_tasks and not had_stats:
+        # Existing database: fill the new summary tables from the task history
+        with sessionmaker(bind=engine).begin() as session:
+            rebuild_habit_stats(session)
+
+
+def add_missing_columns(engine=None):
+    """
+    Add columns declared on the models but missing from existing tables.
+    `create_all` skips tables that already exist, so database files created before
+    a column was added need this to pick it up. New columns are added as nullable.
+    :return: The names of the added columns, as "table.column".
+    """
+    engine = engine or get_engine()
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {existing_column["name"] for existing_column in inspector.get_columns(table.name)}
+            for model_column in table.columns:
+                if model_column.name not in existing:
+                    conn.exec_driver_sql(
+                        f"ALTER TABLE {table.name} ADD COLUMN {model_column.name} "
+                        f"{model_column.type.compile(dialect=engine.dialect)}")
+                    added.append(f"{table.name}.{model_column.name}")
+    return added
+
+
+def day_ordinal_of(expression, dialect_name):
+    """
+    SQL expression for the day_ordinal() of a datetime expression.
+    """
+    if dialect_name == "postgresql":
+        return cast(expression, Date) - literal(date(1, 1, 1), Date) + 1
+    # julianday() of 0001-01-01 is 1721425.5 and its ordinal is 1
+    return cast(func.julianday(func.date(expression)) - 1721424.5, Integer)
+
+
+def backfill_task_days(engine=None):
+    """
+    Fill the expected_day and completed_day columns of hot and archived tasks written
+    before the columns existed.
+    :return: The number of rows updated.
+    """
+    engine = engine or get_engine()
+    # Inspected before the transaction starts, as the inspection would end it on in-memory databases
+    inspector = inspect(engine)
+    models = [model for model in (Task, ArchivedTask) if inspector.has_table(model.__tablename__)]
+    updated = 0
+    with engine.begin() as conn:
+        for model in models:
+            for day_column, date_column in ((model.expected_day, model.expected_completion_by),
+                                            (model.completed_day, model.completed_on)):
+                updated += conn.execute(
+                    update(model.__table__)
+                    .where(day_column.is_(None), date_column.isnot(None))
+                    .values({day_column.name: day_ordinal_of(date_column, engine.dialect.name)})).rowcount
+    return updated
+
+
+def create_indexes(engine=None):
+    """
+    Create any missing secondary indexes declared on the models and drop the OBSOLETE_INDEXES.
+    `create_all` skips tables that already exist, so database files created before
+    an index was added need this to pick it up.
+    """
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        for name in OBSOLETE_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        # Tables that do not exist yet get their indexes from create_all
+        if not inspector.has_table(table.name):
+            continue
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def create_search_index(engine=None):
+    """
+    Create the habits_fts full-text index and its sync triggers, and fill it from
+    the existing habits. Only SQLite is supported; other databases keep using LIKE.
+
+    :return: True if the index is available.
+    """
+    engine = engine or get_engine()
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.begin() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'habits_fts'").first()
+        for statement in HABIT_SEARCH_INDEX_DDL:
+            conn.exec_driver_sql(statement)
+        if not exists:
+            conn.exec_driver_sql("INSERT INTO habits_fts(habits_fts) VALUES ('rebuild')")
+    _search_index_available[engine] = True
+    return True
+
+
+def has_search_index(engine):
+    """
+    Whether the database behind `engine` has the habits_fts index.
+    """
+    if engine not in _search_index_available:
+        available = False
+        if engine.dialect.name == "sqlite":
+            with engine.connect() as conn:
+                available = conn.exec_driver_sql(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'habits_fts'").first() is not None
+        _search_index_available[engine] = available
+    return _search_index_available[engine]
+
+
+def _search_phrase(term):
+    """
+    Quote a search term as an FTS5 phrase so its characters are matched literally.
+    """
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _chunked(iterable, size):
+    """
+    Yield successive lists of at most `size` items from an iterable.
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def habit_filters(name=None, periodicity=None, current_streak=None, longest_streak=None, ids=None,
+                  use_search_index=False, user_id=None):
+    """
+    Build the WHERE criteria shared by the sync and async habit loaders.
+    See StorageComponent.load_habits() for the meaning of each filter.
+    :param use_search_index: Match `name` through the habits_fts index instead of LIKE.
+    :param user_id: Optional owner to restrict the habits to.
+    :return: A list of SQL expressions.
+    """
+    criteria = []
+    if user_id is not None:
+        criteria.append(Habit.user_id == user_id)
+    if name and use_search_index and len(name) >= MIN_SEARCH_TERM_LENGTH:
+        # Partial match for name, answered by the trigram index
+        criteria.append(Habit.id.in_(select(habits_fts.c.rowid).where(
+            literal_column("habits_fts").op("MATCH")(_search_phrase(name)))))
+    elif name:
+        # Partial match for name
+        criteria.append(Habit.name.like(f'%{name}%'))
+    if periodicity:
+        criteria.append(Habit.periodicity == periodicity)
+    if current_streak is not None:
+        criteria.append(Habit.current_streak == current_streak)
+    if longest_streak is not None:
+        criteria.append(Habit.longest_streak == longest_streak)
+    if ids is not None:
+        criteria.append(Habit.id.in_(ids))
+    return criteria
+
+
+def latest_task_statement(habit_id, user_id=None):
+    """
+    SELECT for the most recent task of a habit, served by the
+    (habit_id, expected_day) index.
+    """
+    criteria = [Task.habit_id == habit_id]
+    if user_id is not None:
+        criteria.append(Task.user_id == user_id)
+    return (select(Task)
+            .where(*criteria)
+            .order_by(Task.expected_day.desc(), Task.id.desc())
+            .limit(1))
+
+
+# Columns shared by hot and archived tasks, as returned by task_history_statement()
+TASK_HISTORY_COLUMNS = ("id", "habit_id", "user_id", "completed", "completed_on", "expected_completion_by",
+                        "completed_day", "expected_day")
+
+
+def month_of(expression, dialect_name):
+    """
+    SQL expression for the "YYYY-MM" month of a datetime expression.
+    """
+    if dialect_name == "postgresql":
+        return func.to_char(expression, "YYYY-MM")
+    return func.strftime("%Y-%m", expression)
+
+
+def task_history_statement(habit_id=None, user_id=None):
+    """
+    SELECT over the hot and archived tasks together, ordered by expected completion date.
+    """
+    selects = []
+    for model in (Task, ArchivedTask):
+        criteria = []
+        if habit_id is not None:
+            criteria.append(model.habit_id == habit_id)
+        if user_id is not None:
+            criteria.append(model.user_id == user_id)
+        selects.append(select(*(model.__table__.c[name] for name in TASK_HISTORY_COLUMNS)).where(*criteria))
+    history = union_all(*selects).subquery()
+    return select(history).order_by(history.c.expected_day, history.c.id)
+
+
+# Period kinds of HabitPeriodStats, each with the function naming a date's period
+STATS_PERIODS = {
+    "week": lambda day: (day - timedelta(days=day.weekday())).strftime("%Y-%m-%d"),
+    "month": lambda day: day.strftime("%Y-%m"),
+}
+
+
+def habit_stats_statements(habit_id, completed_on, expected_completion_by, user_id=None):
+    """
+    Statements counting one completion in a habit's summary rows.
+    Run the UPDATE of each pair, and the INSERT only if the UPDATE matched no row.
+
+    :return: A list of (UPDATE, INSERT) statement pairs.
+    """
+    missed = int(day_ordinal(completed_on) > day_ordinal(expected_completion_by))
+    now = datetime.now()
+    keys = [(HabitStats, {"habit_id": habit_id}, {"last_completed_on": completed_on, "updated_at": now})]
+    keys += [(HabitPeriodStats, {"habit_id": habit_id, "kind": kind, "period": period(completed_on)}, {})
+             for kind, period in STATS_PERIODS.items()]
+
+    statements = []
+    for model, key, extra in keys:
+        changes = {"completions": model.completions + 1, "misses": model.misses + missed}
+        if "last_completed_on" in extra:
+            changes["last_completed_on"] = case(
+                (model.last_completed_on > completed_on, model.last_completed_on), else_=completed_on)
+            changes["updated_at"] = now
+        statements.append((
+            update(model)
+            .where(*(getattr(model, name) == value for name, value in key.items()))
+            .values(**changes)
+            .execution_options(synchronize_session=False),
+            insert(model).values(**key, **extra, user_id=user_id, completions=1, misses=missed),
+        ))
+    return statements
+
+
+def summarize_completions(tasks):
+    """
+    Count completed tasks into habit_stats and habit_period_stats rows.
+
+    :param tasks: Iterable of task rows or objects; uncompleted tasks are skipped.
+    :return: A (totals, periods) tuple of dicts of row values, keyed by habit ID
+             and by (habit ID, kind, period) respectively.
+    """
+    totals = {}
+    periods = {}
+    for task in tasks:
+        if not task.completed or task.completed_on is None:
+            continue
+        missed = int(task.expected_day is not None and day_ordinal(task.completed_on) > task.expected_day)
+        total = totals.setdefault(task.habit_id, {
+            "habit_id": task.habit_id, "user_id": task.user_id, "completions": 0, "misses": 0,
+            "last_completed_on": None})
+        total["completions"] += 1
+        total["misses"] += missed
+        total["last_completed_on"] = max(filter(None, (total["last_completed_on"], task.completed_on)))
+        for kind, period in STATS_PERIODS.items():
+            key = (task.habit_id, kind, period(task.completed_on))
+            counts = periods.setdefault(key, {
+                "habit_id": task.habit_id, "kind": kind, "period": key[2], "user_id": task.user_id,
+                "completions": 0, "misses": 0})
+            counts["completions"] += 1
+            counts["misses"] += missed
+    return totals, periods
+
+
+def rebuild_habit_stats(session, user_id=None):
+    """
+    Recompute habit_stats and habit_period_stats from the full task history, hot and archived.
+    Runs in the caller's transaction.
+
+    :param session: Session to run in.
+    :param user_id: Optional user whose rows are rebuilt; all rows by default.
+    """
+    for model in (HabitStats, HabitPeriodStats):
+        criteria = [model.user_id == user_id] if user_id is not None else []
+        session.execute(delete(model).where(*criteria))
+
+    history = task_history_statement(user_id=user_id).execution_options(yield_per=STREAM_BATCH_SIZE)
+    totals, periods = summarize_completions(session.execute(history))
+
+    now = datetime.now()
+    if totals:
+        session.execute(insert(HabitStats), [dict(total, updated_at=now) for total in totals.values()])
+    if periods:
+        session.execute(insert(HabitPeriodStats), list(periods.values()))
+
+
+def _habit_matches_filters(habit, key):
+    """
+    Whether a habit satisfies the load_habits() filters stored in a cache key.
+    """
+    name, periodicity, current_streak, longest_streak, ids = key
+    return ((not name or name.lower() in (habit.name or "").lower())
+            and (not periodicity or habit.periodicity == periodicity)
+            and (current_streak is None or habit.current_streak == current_streak)
+            and (longest_streak is None or habit.longest_streak == longest_streak)
+            and (ids is None or habit.id in ids))
+
+
+def _habit_values(habit):
+    """
+    Column values of a habit object, excluding the primary key and timestamps.
+    """
+    return {
+        "name": habit.name,
+        "periodicity": habit.periodicity,
+        "current_streak": habit.current_streak,
+        "longest_streak": habit.longest_streak,
+        "next_completion_date": habit.next_completion_date,
+    }
+
+
+def _task_values(task):
+    """
+    Column values of a task object, excluding the primary key and timestamps.
+    """
+    return {
+        "habit_id": task.habit_id,
+        "completed": task.completed,
+        "completed_on": task.completed_on,
+        "expected_completion_by": task.expected_completion_by,
+        "completed_day": day_ordinal(task.completed_on),
+        "expected_day": day_ordinal(task.expected_completion_by),
+    }
 
 
 class StorageComponent:
     """
     Storage component responsible for managing database interactions.
+    With a `user_id`, every read is restricted to that user's rows and every write is stamped with it;
+    with a `router` as well, the engine and session of that user's shard are used.
     """
 
-    def __init__(self, engine=engine, session=session):
-        self.engine = engine
-        self.session = session
+    def __init__(self, engine=None, session=None, habit_cache=None, user_id=None, router=None):
+        if router is not None:
+            engine = router.engine_for(user_id)
+            session = router.session_for(user_id)
+        self.engine = engine if engine is not None else get_engine()
+        # Defaults to the scoped session registry, so each thread works in its own session
+        self.session = session if session is not None else Session
+        self.user_id = user_id
+        # Read-through cache of load_habits() results, shared per engine by default
+        if habit_cache is None:
+            habit_cache = _habit_caches.setdefault(
+                self.engine, QueryCache(maxsize=HABIT_CACHE_SIZE, ttl=HABIT_CACHE_TTL))
+        self.habit_cache = habit_cache
+        self._local = threading.local()
+        # Looked up once per engine and remembered
+        has_search_index(self.engine)
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Group the storage calls made inside the block into one transaction.
+        Writes are flushed as they happen and committed once when the outermost
+        block exits, or rolled back if it raises. Blocks may be nested.
+
+        Usage:
+            with storage.unit_of_work():
+                storage.save_task(task)
+                storage.save_habit(habit)
+        """
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        try:
+            yield self
+            if depth == 0:
+                self.session.commit()
+        except Exception:
+            if depth == 0:
+                self.session.rollback()
+                # Entries loaded inside the block may hold rolled back writes
+                self.habit_cache.invalidate()
+            raise
+        finally:
+            self._local.depth = depth
+
+    def _owned_by_user(self, model):
+        """
+        WHERE criteria restricting `model` rows to this component's user, if any.
+        """
+        return [model.user_id == self.user_id] if self.user_id is not None else []
+
+    def _row_values(self, obj, values):
+        """
+        Column values to write for `obj`, stamped with its owner when one is known.
+        """
+        row = values(obj)
+        owner = self.user_id if self.user_id is not None else getattr(obj, "user_id", None)
+        if owner is not None:
+            row["user_id"] = owner
+        return row
+
+    def _session_key(self):
+        """
+        Identifies the session this component's queries run in; with the registry,
+        that is the calling thread's own session.
+        """
+        session = self.session() if isinstance(self.session, scoped_session) else self.session
+        return session.hash_key
+
+    def _commit(self):
+        """
+        Commit the current write, or only flush it when inside a unit of work.
+        """
+        if getattr(self._local, "depth", 0):
+            self.session.flush()
+        else:
+            self.session.commit()
 
-    def load_habits(self, name=None, periodicity=None, current_streak=None, longest_streak=None):
+    def load_habits(self, name=None, periodicity=None, current_streak=None, longest_streak=None, ids=None):
         """
         Load habits from the database with optional filters.
 
@@ -35,100 +662,945 @@ class StorageComponent:
         :param periodicity: Optional filter by periodicity (e.g., 'daily', 'weekly').
         :param current_streak: Optional filter by current streak value.
         :param longest_streak: Optional filter by longest streak value.
+        :param ids: Optional collection of habit IDs to restrict the results to.
         :return: A list of filtered habits.
+        Results are served from `habit_cache` to the same session until a write invalidates them
+        or they expire.
         """
-        query = self.session.query(Habit)
-
-        # Apply filters based on provided arguments
-        if name:
-            # Partial match for name
-            query = query.filter(Habit.name.like(f'%{name}%'))
-        if periodicity:
-            query = query.filter(Habit.periodicity == periodicity)
-        if current_streak is not None:
-            query = query.filter(Habit.current_streak == current_streak)
-        if longest_streak is not None:
-            query = query.filter(Habit.longest_streak == longest_streak)
-
-        return query.all()
+        key = (name or None, periodicity or None, current_streak, longest_streak,
+               frozenset(ids) if ids is not None else None, self.user_id, self._session_key())
+        habits = self.habit_cache.get_or_load(key, lambda: self.session.query(Habit).filter(
+            *habit_filters(name, periodicity, current_streak, longest_streak, ids,
+                           use_search_index=has_search_index(self.engine), user_id=self.user_id)).all())
+        # Callers own the returned list, so hand out a copy of the cached one
+        return list(habits)
 
-    def load_tasks(self):
+    def load_tasks(self, ids=None):
         """
         Load tasks from the database.
         This method will query the database and return all task records.
+        :param ids: Optional collection of task IDs to restrict the results to.
         """
-        return self.session.query(Task).all()
+        query = self.session.query(Task).filter(*self._owned_by_user(Task))
+        if ids is not None:
+            query = query.filter(Task.id.in_(ids))
+        return query.all()
+
+    def search_habits(self, query, limit=None):
+        """
+        Search habits by name. Every whitespace-separated term must appear in the name
+        (substrings, prefixes and whole words all match, case-insensitively).
+        Names starting with the query come first, then the best full-text matches.
+
+        :param query: The text to search for.
+        :param limit: Optional maximum number of results.
+        :return: A list of matching habits, best match first.
+        """
+        terms = query.split()
+        if not terms:
+            return []
+
+        statement = select(Habit).where(*self._owned_by_user(Habit))
+        indexed_terms = [term for term in terms if len(term) >= MIN_SEARCH_TERM_LENGTH]
+        if has_search_index(self.engine) and indexed_terms:
+            match = " AND ".join(_search_phrase(term) for term in indexed_terms)
+            statement = (statement
+                         .join(habits_fts, habits_fts.c.rowid == Habit.id)
+                         .where(literal_column("habits_fts").op("MATCH")(match)))
+            # Terms too short for the trigram index are checked on the matched rows only
+            terms = [term for term in terms if len(term) < MIN_SEARCH_TERM_LENGTH]
+            ranking = [habits_fts.c.rank]
+        else:
+            ranking = [Habit.name]
+        statement = statement.where(*(Habit.name.like(f"%{term}%") for term in terms))
+
+        starts_with = case((Habit.name.like(f"{query.strip()}%"), 0), else_=1)
+        statement = statement.order_by(starts_with, *ranking, Habit.id)
+        if limit is not None:
+            statement = statement.limit(limit)
+        return self.session.scalars(statement).all()
+
+    def load_recent_tasks(self, limit):
+        """
+        Load the most recently created tasks.
+        :param limit: Maximum number of tasks to return.
+        :return: Up to `limit` tasks, oldest first.
+        """
+        tasks = self.session.scalars(
+            select(Task).where(*self._owned_by_user(Task)).order_by(Task.id.desc()).limit(limit)).all()
+        return tasks[::-1]
+
+    def iter_habits(self, batch_size=STREAM_BATCH_SIZE, **filters):
+        """
+        Stream habits in ID order, fetching `batch_size` rows per query with keyset pagination.
+        :param batch_size: Number of habits fetched per query.
+        :param filters: Same filters as load_habits().
+        :return: A generator of habits.
+        """
+        criteria = habit_filters(use_search_index=has_search_index(self.engine), user_id=self.user_id, **filters)
+        last_id = None
+        while True:
+            statement = select(Habit).where(*criteria).order_by(Habit.id).limit(batch_size)
+            if last_id is not None:
+                statement = statement.where(Habit.id > last_id)
+            batch = self.session.scalars(statement).all()
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            last_id = batch[-1].id
+
+    def iter_tasks(self, habit_id=None, start=None, end=None, order_by="id", batch_size=STREAM_BATCH_SIZE):
+        """
+        Stream tasks, fetching `batch_size` rows per query with keyset pagination,
+        so memory use does not grow with the size of the table.
+
+        :param habit_id: Optional filter by habit ID.
+        :param start: Optional lower bound (inclusive) on the day of expected_completion_by.
+        :param end: Optional upper bound (exclusive) on the day of expected_completion_by.
+        :param order_by: 'id' or 'expected_completion_by'.
+        :param batch_size: Number of tasks fetched per query.
+        :return: A generator of tasks.
+        """
+        if order_by not in ("id", "expected_completion_by"):
+            raise ValueError("Unsupported order. Use 'id' or 'expected_completion_by'.")
+
+        criteria = self._owned_by_user(Task)
+        if habit_id is not None:
+            criteria.append(Task.habit_id == habit_id)
+        if start is not None:
+            criteria.append(Task.expected_day >= day_ordinal(start))
+        if end is not None:
+            criteria.append(Task.expected_day < day_ordinal(end))
+
+        by_deadline = order_by == "expected_completion_by"
+        ordering = (Task.expected_day, Task.id) if by_deadline else (Task.id,)
+        last_task = None
+        while True:
+            statement = select(Task).where(*criteria).order_by(*ordering).limit(batch_size)
+            if last_task is not None and by_deadline:
+                statement = statement.where(or_(
+                    Task.expected_day > last_task.expected_day,
+                    and_(Task.expected_day == last_task.expected_day,
+                         Task.id > last_task.id)))
+            elif last_task is not None:
+                statement = statement.where(Task.id > last_task.id)
+            batch = self.session.scalars(statement).all()
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            last_task = batch[-1]
+
+    def iter_rows(self, model, batch_size=STREAM_BATCH_SIZE):
+        """
+        Stream the raw rows of a table in ID order without building ORM objects,
+        for bulk readers such as exports.
+
+        :param model: The mapped class of the table, e.g. Habit or Task.
+        :param batch_size: Number of rows fetched per query.
+        :return: A generator of row batches; rows are tuples in `model.__table__.columns` order.
+        """
+        columns = model.__table__.columns
+        last_id = None
+        while True:
+            statement = select(*columns).where(*self._owned_by_user(model)).order_by(model.id).limit(batch_size)
+            if last_id is not None:
+                statement = statement.where(model.id > last_id)
+            batch = self.session.execute(statement).all()
+            if batch:
+                yield batch
+            if len(batch) < batch_size:
+                return
+            last_id = batch[-1].id
 
     def load_tasks_for_habit(self, habit_id):
-        habit = self.session.query(Habit).filter_by(id=habit_id).first()
+        habit = self.session.query(Habit).filter(
+            Habit.id == habit_id, *self._owned_by_user(Habit)).first()
         return habit.tasks if habit else None
 
+    def load_task_history(self, habit_id=None):
+        """
+        Load the full task history, hot and archived tasks together.
+        :param habit_id: Optional filter by habit ID.
+        :return: Rows with the TASK_HISTORY_COLUMNS, ordered by expected completion date.
+        """
+        return self.session.execute(task_history_statement(habit_id, self.user_id)).all()
+
+    def load_monthly_completions(self, habit_id=None):
+        """
+        Count completions per habit and month of the expected completion date, adding the
+        archived tasks' rollups to an aggregate of the hot tasks.
+
+        :param habit_id: Optional filter by habit ID.
+        :return: Rows of (habit_id, month, completed_count, on_time_count), ordered by habit and month.
+        """
+        hot_criteria = [Task.completed.is_(True), *self._owned_by_user(Task)]
+        rollup_criteria = self._owned_by_user(TaskRollup)
+        if habit_id is not None:
+            hot_criteria.append(Task.habit_id == habit_id)
+            rollup_criteria.append(TaskRollup.habit_id == habit_id)
+
+        month = month_of(Task.expected_completion_by, self.engine.dialect.name)
+        hot = select(
+            Task.habit_id,
+            month.label("month"),
+            func.count().label("completed_count"),
+            func.sum(case((Task.completed_day <= Task.expected_day, 1), else_=0)).label("on_time_count"),
+        ).where(*hot_criteria).group_by(Task.habit_id, month)
+        archived = select(
+            TaskRollup.habit_id, TaskRollup.month, TaskRollup.completed_count, TaskRollup.on_time_count,
+        ).where(*rollup_criteria)
+
+        combined = union_all(hot, archived).subquery()
+        return self.session.execute(
+            select(combined.c.habit_id, combined.c.month,
+                   func.sum(combined.c.completed_count).label("completed_count"),
+                   func.sum(combined.c.on_time_count).label("on_time_count"))
+            .group_by(combined.c.habit_id, combined.c.month)
+            .order_by(combined.c.habit_id, combined.c.month)).all()
+
+    def archive_tasks(self, before, batch_size=BULK_CHUNK_SIZE):
+        """
+        Move completed tasks due before `before` from `tasks` to `tasks_archive` and add
+        them to the per-month rollups. Each batch is copied, rolled up and deleted with
+        set-based statements in one transaction. A habit's latest task is never archived,
+        so load_latest_task() keeps working on the hot table alone.
+
+        :param before: Tasks whose expected completion day is earlier are archived.
+        :param batch_size: Number of tasks moved per transaction.
+        :return: The number of archived tasks.
+        """
+        later = aliased(Task)
+        eligible = select(Task.id).where(
+            Task.completed.is_(True),
+            Task.expected_day < day_ordinal(before),
+            *self._owned_by_user(Task),
+            exists().where(
+                later.habit_id == Task.habit_id,
+                or_(later.expected_day > Task.expected_day,
+                    and_(later.expected_day == Task.expected_day, later.id > Task.id))),
+        ).order_by(Task.id).limit(batch_size)
+        month = month_of(Task.expected_completion_by, self.engine.dialect.name)
+        columns = [model_column.name for model_column in Task.__table__.columns]
+
+        archived = 0
+        while True:
+            with self.unit_of_work():
+                task_ids = self.session.scalars(eligible).all()
+                if not task_ids:
+                    return archived
+                now = datetime.now()
+                self.session.execute(insert(ArchivedTask).from_select(
+                    columns + ["archived_at"],
+                    select(*Task.__table__.columns, literal(now, DateTime)).where(Task.id.in_(task_ids))))
+
+                summaries = self.session.execute(select(
+                    Task.habit_id,
+                    month.label("month"),
+                    func.max(Task.user_id).label("user_id"),
+                    func.count().label("completed_count"),
+                    func.sum(case((Task.completed_day <= Task.expected_day, 1), else_=0))
+                    .label("on_time_count"),
+                    func.min(Task.completed_on).label("first_completed_on"),
+                    func.max(Task.completed_on).label("last_completed_on"),
+                ).where(Task.id.in_(task_ids)).group_by(Task.habit_id, month)).all()
+                for summary in summaries:
+                    self._add_to_rollup(summary, now)
+
+                self.session.execute(delete(Task).where(Task.id.in_(task_ids)))
+            archived += len(task_ids)
+            if len(task_ids) < batch_size:
+                return archived
+
+    def sweep_overdue(self, now=None):
+        """
+        Reset the streak of every habit whose latest task passed its deadline uncompleted,
+        and roll the habit forward to a new task for the current period. The missed task
+        stays uncompleted in the history. The overdue habits are read with one SELECT, their
+        new deadlines computed in one rollover_deadlines() call, and the writes made with one
+        executemany INSERT and one executemany UPDATE, in one transaction.
+        Habits with an unsupported periodicity are left alone.
+
+        :param now: Optional reference time, defaults to the current time.
+        :return: A (number of reset habits, number of new tasks) tuple.
+        """
+        now = now or datetime.now()
+        later = aliased(Task)
+        with self.unit_of_work():
+            overdue = [row for row in self.session.execute(
+                select(Task.habit_id, Task.user_id, Task.expected_completion_by, Habit.periodicity, Habit.created_at)
+                .join(Habit, Habit.id == Task.habit_id)
+                .where(
+                    Task.completed.is_not(True),
+                    Task.expected_day < day_ordinal(now),
+                    *self._owned_by_user(Task),
+                    ~exists().where(
+                        later.habit_id == Task.habit_id,
+                        or_(later.expected_day > Task.expected_day,
+                            and_(later.expected_day == Task.expected_day, later.id > Task.id)))))
+                if is_supported(row.periodicity)]
+            if not overdue:
+                return 0, 0
+
+            deadlines = [deadline.item() for deadline in rollover_deadlines(
+                [row.periodicity for row in overdue], [row.expected_completion_by for row in overdue], now,
+                [row.created_at for row in overdue])]
+            self.session.execute(insert(Task), [
+                {"habit_id": row.habit_id, "user_id": row.user_id, "completed": False,
+                 "expected_completion_by": deadline, "expected_day": day_ordinal(deadline),
+                 "created_at": now, "updated_at": now}
+                for row, deadline in zip(overdue, deadlines)])
+            habit_rows = [{"id": row.habit_id, "current_streak": 0, "next_completion_date": deadline,
+                           "updated_at": now}
+                          for row, deadline in zip(overdue, deadlines)]
+            self.session.execute(update(Habit), habit_rows)
+            self._commit()
+
+        for row in habit_rows:
+            self._sync_loaded(Habit, row.pop("id"), **row)
+        self.habit_cache.invalidate()
+        return len(habit_rows), len(overdue)
+
+    def _add_to_rollup(self, summary, now):
+        rollup = self.session.get(TaskRollup, (summary.habit_id, summary.month))
+        if rollup is None:
+            self.session.add(TaskRollup(
+                habit_id=summary.habit_id, month=summary.month, user_id=summary.user_id,
+                completed_count=summary.completed_count, on_time_count=summary.on_time_count,
+                first_completed_on=summary.first_completed_on, last_completed_on=summary.last_completed_on,
+                updated_at=now))
+            return
+        rollup.completed_count += summary.completed_count
+        rollup.on_time_count += summary.on_time_count
+        rollup.first_completed_on = min(filter(None, (rollup.first_completed_on, summary.first_completed_on)),
+                                        default=None)
+        rollup.last_completed_on = max(filter(None, (rollup.last_completed_on, summary.last_completed_on)),
+                                       default=None)
+        rollup.updated_at = now
+
+    def update_habit_stats(self, habit_id, completed_on, expected_completion_by):
+        """
+        Count a completion in the habit's summary rows.
+        Call it in the unit of work that saves the completion.
+
+        :param habit_id: The ID of the completed habit.
+        :param completed_on: When the habit was completed.
+        :param expected_completion_by: The completed task's expected completion date.
+        """
+        for update_statement, insert_statement in habit_stats_statements(
+                habit_id, completed_on, expected_completion_by, self.user_id):
+            if not self.session.execute(update_statement).rowcount:
+                self.session.execute(insert_statement)
+        self._commit()
+
+    def load_habit_stats(self, habit_id):
+        """
+        :param habit_id: The ID of the habit.
+        :return: A (HabitStats, list of HabitPeriodStats) tuple; the HabitStats is None
+                 if the habit has never been completed.
+        """
+        stats = self.session.get(HabitStats, habit_id, populate_existing=True)
+        if stats is not None and self.user_id is not None and stats.user_id != self.user_id:
+            return None, []
+        periods = self.session.scalars(
+            select(HabitPeriodStats)
+            .where(HabitPeriodStats.habit_id == habit_id, *self._owned_by_user(HabitPeriodStats))
+            .order_by(HabitPeriodStats.kind, HabitPeriodStats.period)
+            .execution_options(populate_existing=True)).all()
+        return stats, periods
+
+    def load_completion_rates(self):
+        """
+        Completion totals of every habit, read from habit_stats in one query.
+        :return: Rows of (habit_id, name, completions, misses, on_time_rate), where on_time_rate
+                 is the share of completions made by the expected completion date.
+        """
+        completions = func.coalesce(HabitStats.completions, 0)
+        misses = func.coalesce(HabitStats.misses, 0)
+        return self.session.execute(
+            select(
+                Habit.id.label("habit_id"),
+                Habit.name,
+                completions.label("completions"),
+                misses.label("misses"),
+                case((completions > 0, (completions - misses) * 1.0 / completions), else_=0.0).label("on_time_rate"),
+            )
+            .outerjoin(HabitStats, HabitStats.habit_id == Habit.id)
+            .where(*self._owned_by_user(Habit))
+            .order_by(Habit.id)).all()
+
+    def rebuild_habit_stats(self):
+        """
+        Recompute the summary rows from the task history, see rebuild_habit_stats().
+        """
+        with self.unit_of_work():
+            rebuild_habit_stats(self.session, self.user_id)
+
+    def iter_task_days(self, batch_size=STREAM_BATCH_SIZE):
+        """
+        Stream the completion flag and day ordinals of every task, hot and archived, as plain
+        integer tuples, for vectorized readers such as the streak engine. NULLs are read as 0.
+
+        :param batch_size: Number of rows fetched at a time.
+        :return: A generator of batches of (habit_id, id, completed, completed_day, expected_day) tuples,
+                 in no particular order.
+        """
+        history = task_history_statement(user_id=self.user_id).order_by(None).subquery()
+        statement = select(
+            history.c.habit_id,
+            history.c.id,
+            func.coalesce(cast(history.c.completed, Integer), 0),
+            func.coalesce(history.c.completed_day, 0),
+            func.coalesce(history.c.expected_day, 0),
+        ).execution_options(yield_per=batch_size)
+        for batch in self.session.execute(statement).partitions():
+            yield batch
+
+    def load_streaks(self):
+        """
+        :return: Rows of (id, current_streak, longest_streak) of every habit, in ID order.
+        """
+        return self.session.execute(
+            select(Habit.id, Habit.current_streak, Habit.longest_streak)
+            .where(*self._owned_by_user(Habit))
+            .order_by(Habit.id)).all()
+
+    def save_streaks(self, streaks, chunk_size=BULK_CHUNK_SIZE):
+        """
+        Overwrite the streaks of many habits with bulk UPDATEs by primary key, one transaction per chunk.
+
+        :param streaks: Iterable of (habit_id, current_streak, longest_streak) tuples.
+        :param chunk_size: Number of habits updated per transaction.
+        :return: The number of updated habits.
+        """
+        updated = 0
+        for chunk in _chunked(streaks, chunk_size):
+            now = datetime.now()
+            rows = [{"id": habit_id, "current_streak": current_streak, "longest_streak": longest_streak,
+                     "updated_at": now}
+                    for habit_id, current_streak, longest_streak in chunk]
+            self.session.execute(update(Habit), rows)
+            self._commit()
+            for row in rows:
+                self._sync_loaded(Habit, row.pop("id"), **row)
+            updated += len(chunk)
+        if updated:
+            self.habit_cache.invalidate()
+        return updated
+
+    def load_due_dates(self):
+        """
+        Read the next completion date of every habit through the next_completion_date index.
+        :return: Rows of (next_completion_date, id), earliest first; habits without a date are left out.
+        """
+        return self.session.execute(
+            select(Habit.next_completion_date, Habit.id)
+            .where(Habit.next_completion_date.is_not(None), *self._owned_by_user(Habit))
+            .order_by(Habit.next_completion_date, Habit.id)).all()
+
+    def load_due_between(self, start, end):
+        """
+        Range scan of the next_completion_date index.
+        :param start: Earliest next completion date, inclusive; None for no lower bound.
+        :param end: Latest next completion date, inclusive.
+        :return: Rows of (next_completion_date, id), earliest first.
+        """
+        criteria = [Habit.next_completion_date <= end]
+        criteria.append(Habit.next_completion_date >= start if start is not None
+                        else Habit.next_completion_date.is_not(None))
+        return self.session.execute(
+            select(Habit.next_completion_date, Habit.id)
+            .where(*criteria, *self._owned_by_user(Habit))
+            .order_by(Habit.next_completion_date, Habit.id)).all()
+
+    def load_habit(self, habit_id, refresh=False):
+        """
+        Load a single habit by ID, from the session's identity map when it is already loaded.
+        :param habit_id: The ID of the habit.
+        :param refresh: Re-read the row even if the habit is already loaded.
+        :return: The habit, or None if it does not exist.
+        """
+        habit = self.session.get(Habit, habit_id, populate_existing=refresh)
+        if habit is not None and self.user_id is not None and habit.user_id != self.user_id:
+            return None
+        return habit
+
+    def load_latest_task(self, habit_id):
+        """
+        Load the most recent task of a habit without loading its task history.
+        :param habit_id: The ID of the habit.
+        :return: The latest task, or None if the habit has no tasks.
+        """
+        return self.session.scalars(latest_task_statement(habit_id, self.user_id)).first()
+
+    def load_latest_task_ids(self):
+        """
+        Find the latest task of every habit in one query.
+        :return: A dict mapping habit IDs to the ID of their latest task.
+        """
+        ranked = select(
+            Task.id,
+            Task.habit_id,
+            func.row_number().over(
+                partition_by=Task.habit_id,
+                order_by=(Task.expected_day.desc(), Task.id.desc())).label("rank"),
+        ).where(*self._owned_by_user(Task)).subquery()
+        return dict(self.session.execute(select(ranked.c.habit_id, ranked.c.id).where(ranked.c.rank == 1)).all())
+
+    def load_snapshot_stamp(self):
+        """
+        Summary of the habits and tasks tables that changes whenever they are written,
+        used to tell whether a HabitSnapshot is still current.
+        :return: A (habit count, latest habit update, highest task ID) tuple.
+        """
+        habit_count, updated_at = self.session.execute(
+            select(func.count(Habit.id), func.max(Habit.updated_at)).where(*self._owned_by_user(Habit))).one()
+        max_task_id = self.session.scalar(select(func.max(Task.id)).where(*self._owned_by_user(Task)))
+        return habit_count, updated_at, max_task_id
+
+    def complete_habit(self, habit_id, completed_at=None):
+        """
+        Complete a habit directly on its persisted rows, in one short transaction.
+        The habit is not loaded through the ORM: its latest task is read through the
+        (habit_id, expected_day) index, the task is closed with a compare-and-set so two
+        concurrent completions cannot both count, and the streak is incremented by a single
+        UPDATE from the stored values. The cost does not grow with the habit's history.
+
+        :param habit_id: The ID of the habit.
+        :param completed_at: When the habit was completed, defaults to now.
+        :return: A CompletionResult; its status is COMPLETED, NOT_DUE or NOT_FOUND.
+        """
+        completed_at = completed_at or datetime.now()
+        today = day_ordinal(completed_at)
+        now = datetime.now()
+        with self.unit_of_work():
+            latest = self.session.execute(
+                select(Task.id, Task.user_id, Task.expected_completion_by, Task.expected_day,
+                       Habit.periodicity, Habit.next_completion_date, Habit.created_at)
+                .join(Habit, Habit.id == Task.habit_id)
+                .where(Task.habit_id == habit_id, *self._owned_by_user(Task))
+                .order_by(Task.expected_day.desc(), Task.id.desc())
+                .limit(1)).first()
+            if latest is None:
+                return CompletionResult(habit_id, NOT_FOUND)
+            if latest.expected_day > today:
+                return CompletionResult(habit_id, NOT_DUE)
+
+            closed = self.session.execute(
+                update(Task)
+                .where(Task.id == latest.id, Task.completed.is_not(True))
+                .values(completed=True, completed_on=completed_at, completed_day=today, updated_at=now)
+                .execution_options(synchronize_session=False))
+            if not closed.rowcount:
+                # Completed by someone else since it was read
+                return CompletionResult(habit_id, NOT_DUE)
+
+            current_streak = func.coalesce(Habit.current_streak, 0)
+            longest_streak = func.coalesce(Habit.longest_streak, 0)
+            if today <= latest.expected_day:
+                streak = {"current_streak": current_streak + 1,
+                          "longest_streak": case((current_streak + 1 > longest_streak, current_streak + 1),
+                                                 else_=longest_streak)}
+            else:
+                streak = {"current_streak": 1}
+            next_completion_date = HabitSchedule(
+                None, latest.periodicity, next_completion_date=latest.next_completion_date, created_at=latest.created_at
+            ).calculate_next_completion(completed_at)
+            self.session.execute(
+                update(Habit)
+                .where(Habit.id == habit_id)
+                .values(next_completion_date=next_completion_date, updated_at=now, **streak)
+                .execution_options(synchronize_session=False))
+
+            expected_completion_by = TaskSchedule(habit_id).calculate_expected_completion_by(
+                latest.periodicity, latest.expected_completion_by, now=completed_at, origin=latest.created_at)
+            task_id = self.session.execute(insert(Task).values(
+                habit_id=habit_id,
+                user_id=self.user_id if self.user_id is not None else latest.user_id,
+                completed=False,
+                expected_completion_by=expected_completion_by,
+                expected_day=day_ordinal(expected_completion_by),
+                created_at=now,
+                updated_at=now,
+            )).inserted_primary_key[0]
+            self.update_habit_stats(habit_id, completed_at, latest.expected_completion_by)
+
+            habit = self.session.execute(
+                select(Habit.id, Habit.name, Habit.periodicity, Habit.current_streak, Habit.longest_streak,
+                       Habit.next_completion_date, Habit.user_id, Habit.updated_at)
+                .where(Habit.id == habit_id)).one()
+        self._sync_loaded(Habit, habit_id, current_streak=habit.current_streak,
+                          longest_streak=habit.longest_streak, next_completion_date=habit.next_completion_date,
+                          updated_at=habit.updated_at)
+        self._sync_loaded(Task, latest.id, completed=True, completed_on=completed_at, completed_day=today,
+                          updated_at=now)
+        self._invalidate_habit(habit_id, habit)
+        return CompletionResult(habit_id, COMPLETED, habit.current_streak, habit.longest_streak,
+                                habit.next_completion_date, task_id)
+
+    def complete_habits(self, completions, chunk_size=BULK_CHUNK_SIZE):
+        """
+        Complete many habits in one transaction, e.g. a batch of completions synced from a device.
+        Each completion is checked against the habit's latest task at its own timestamp, and several
+        completions of one habit are applied in time order. Per chunk of habits, the latest tasks are
+        read in one query, closed in one UPDATE and followed by their next tasks in one INSERT;
+        the habits and their summary rows are updated with executemany statements.
+
+        :param completions: Iterable of (habit_id, completed_at) pairs; a None completed_at means now.
+        :param chunk_size: Number of habits handled per set of statements.
+        :return: A CompletionResult per completion, in input order.
+        :raises ValueError: If one of the tasks was completed concurrently; nothing is written then.
+        """
+        now = datetime.now()
+        completions = [(habit_id, completed_at or now) for habit_id, completed_at in completions]
+        # Applied in time order; sorted() is stable, so ties keep their input order
+        order = sorted(range(len(completions)), key=lambda index: completions[index][1])
+        results = [None] * len(completions)
+
+        with self.unit_of_work():
+            for chunk in _chunked(dict.fromkeys(habit_id for habit_id, _ in completions), chunk_size):
+                chunk_ids = set(chunk)
+                self._complete_chunk(chunk, [(index, *completions[index]) for index in order
+                                             if completions[index][0] in chunk_ids], results, now)
+        self.habit_cache.invalidate()
+        return results
+
+    def _complete_chunk(self, habit_ids, completions, results, now):
+        """
+        Apply the time-ordered (index, habit_id, completed_at) completions of the habits in `habit_ids`.
+        """
+        ranked = select(
+            Task.id,
+            Task.habit_id,
+            Task.user_id,
+            Task.completed,
+            Task.expected_completion_by,
+            func.row_number().over(
+                partition_by=Task.habit_id,
+                order_by=(Task.expected_day.desc(), Task.id.desc())).label("rank"),
+        ).where(Task.habit_id.in_(habit_ids), *self._owned_by_user(Task)).subquery()
+        rows = self.session.execute(
+            select(ranked, Habit.name, Habit.periodicity, Habit.current_streak, Habit.longest_streak,
+                   Habit.next_completion_date, Habit.created_at)
+            .join(Habit, Habit.id == ranked.c.habit_id)
+            .where(ranked.c.rank == 1)).all()
+
+        # Replay the completions in memory on the domain classes, then write the outcome in bulk
+        habits, latest_tasks, closed_tasks, new_tasks, completed = {}, {}, [], [], []
+        for row in rows:
+            habits[row.habit_id] = HabitSchedule(row.name, row.periodicity, row.current_streak or 0,
+                                                 row.longest_streak or 0, row.next_completion_date, row.created_at)
+            task = TaskSchedule(row.habit_id, bool(row.completed), expected_completion_by=row.expected_completion_by)
+            task.id = row.id
+            task.user_id = self.user_id if self.user_id is not None else row.user_id
+            latest_tasks[row.habit_id] = task
+
+        for index, habit_id, completed_at in completions:
+            habit, task = habits.get(habit_id), latest_tasks.get(habit_id)
+            if habit is None:
+                results[index] = CompletionResult(habit_id, NOT_FOUND)
+                continue
+            if task.completed or not habit.apply_completion(task, completed_at):
+                results[index] = CompletionResult(habit_id, NOT_DUE)
+                continue
+            if hasattr(task, "id"):
+                # Otherwise it is a next task created earlier in this batch, not inserted yet
+                closed_tasks.append(task)
+
+            next_task = TaskSchedule(habit_id)
+            next_task.expected_completion_by = next_task.calculate_expected_completion_by(
+                habit.periodicity, task.expected_completion_by, now=completed_at, origin=habit.created_at)
+            next_task.user_id = task.user_id
+            new_tasks.append(next_task)
+            latest_tasks[habit_id] = next_task
+            completed.append((index, task, CompletionResult(
+                habit_id, COMPLETED, habit.current_streak, habit.longest_streak, habit.next_completion_date, next_task)))
+
+        if not completed:
+            return
+        if closed_tasks:
+            completed_on = {task.id: task.completed_on for task in closed_tasks}
+            closed = self.session.execute(
+                update(Task)
+                .where(Task.id.in_(list(completed_on)), Task.completed.is_not(True))
+                .values(completed=True,
+                        completed_on=case(completed_on, value=Task.id),
+                        completed_day=case({task_id: day_ordinal(value) for task_id, value in completed_on.items()},
+                                           value=Task.id),
+                        updated_at=now)
+                .execution_options(synchronize_session=False))
+            if closed.rowcount != len(completed_on):
+                raise ValueError("Some of the habits were completed concurrently; retry the batch.")
+
+        task_ids = self.session.scalars(
+            insert(Task).returning(Task.id, sort_by_parameter_order=True),
+            [dict(_task_values(task), user_id=task.user_id, created_at=now, updated_at=now)
+             for task in new_tasks]).all()
+        for task, task_id in zip(new_tasks, task_ids):
+            task.id = task_id
+
+        completed_habits = {task.habit_id: habits[task.habit_id] for _, task, _ in completed}
+        habit_rows = [{"id": habit_id, "current_streak": habit.current_streak, "longest_streak": habit.longest_streak,
+                       "next_completion_date": habit.next_completion_date, "updated_at": now}
+                      for habit_id, habit in completed_habits.items()]
+        self.session.execute(update(Habit), habit_rows)
+        self._add_habit_stats(*summarize_completions(task for _, task, _ in completed), now)
+        self._commit()
+
+        for index, _, result in completed:
+            results[index] = result._replace(task_id=result.task_id.id)
+        for row in habit_rows:
+            self._sync_loaded(Habit, row.pop("id"), **row)
+        for task in closed_tasks:
+            self._sync_loaded(Task, task.id, completed=True, completed_on=task.completed_on,
+                              completed_day=task.completed_day, updated_at=now)
+
+    def _add_habit_stats(self, totals, periods, now):
+        """
+        Add the counts of summarize_completions() to the summary rows, with one executemany
+        UPDATE per table for rows that exist and one INSERT for those that do not.
+        """
+        existing = set(self.session.scalars(
+            select(HabitStats.habit_id).where(HabitStats.habit_id.in_(list(totals)))))
+        stats = HabitStats.__table__
+        self._upsert_counts(
+            update(stats)
+            .where(stats.c.habit_id == bindparam("key_habit_id"))
+            .values(completions=stats.c.completions + bindparam("add_completions"),
+                    misses=stats.c.misses + bindparam("add_misses"),
+                    last_completed_on=case((stats.c.last_completed_on > bindparam("last_on"), stats.c.last_completed_on),
+                                           else_=bindparam("last_on")),
+                    updated_at=now),
+            insert(HabitStats),
+            [(total["habit_id"] in existing, dict(total, updated_at=now), {
+                "key_habit_id": total["habit_id"], "add_completions": total["completions"],
+                "add_misses": total["misses"], "last_on": total["last_completed_on"]})
+             for total in totals.values()])
+
+        existing = set(self.session.execute(
+            select(HabitPeriodStats.habit_id, HabitPeriodStats.kind, HabitPeriodStats.period)
+            .where(HabitPeriodStats.habit_id.in_(list(totals)),
+                   HabitPeriodStats.period.in_({key[2] for key in periods}))).tuples())
+        period_stats = HabitPeriodStats.__table__
+        self._upsert_counts(
+            update(period_stats)
+            .where(period_stats.c.habit_id == bindparam("key_habit_id"), period_stats.c.kind == bindparam("key_kind"),
+                   period_stats.c.period == bindparam("key_period"))
+            .values(completions=period_stats.c.completions + bindparam("add_completions"),
+                    misses=period_stats.c.misses + bindparam("add_misses")),
+            insert(HabitPeriodStats),
+            [(key in existing, counts, {
+                "key_habit_id": key[0], "key_kind": key[1], "key_period": key[2],
+                "add_completions": counts["completions"], "add_misses": counts["misses"]})
+             for key, counts in periods.items()])
+
+    def _upsert_counts(self, update_statement, insert_statement, rows):
+        """
+        :param rows: (exists, insert parameters, update parameters) tuples.
+        """
+        updates = [update_parameters for exists, _, update_parameters in rows if exists]
+        inserts = [insert_parameters for exists, insert_parameters, _ in rows if not exists]
+        if updates:
+            self.session.execute(update_statement, updates)
+        if inserts:
+            self.session.execute(insert_statement, inserts)
+
+    def _sync_loaded(self, model, ident, **values):
+        """
+        Copy values written by a statement onto the instance in the identity map, if one is loaded,
+        without marking it as changed.
+        """
+        instance = self.session.identity_map.get(self.session.identity_key(model, ident))
+        if instance is not None:
+            for key, value in values.items():
+                set_committed_value(instance, key, value)
+
     def save_habit(self, habit):
         """
         Save or update a habit to the database.
         :param habit: The habit object to be saved or updated.
+        :return: The persisted habit.
         """
-        existing_habit = self.session.query(Habit).filter_by(
-            id=habit.id).first() if hasattr(habit, 'id') else None
-        if existing_habit:
-            # Update existing habit
-            # print("in here updated")
-            existing_habit.name = habit.name
-            existing_habit.periodicity = habit.periodicity
-            existing_habit.current_streak = habit.current_streak
-            existing_habit.longest_streak = habit.longest_streak
-            existing_habit.next_completion_date = habit.next_completion_date
-            existing_habit.updated_at = datetime.now()
-            self.session.commit()
-            return existing_habit
-        else:
-            # Create new habit
-            # print("in here created")
-            new_habit = Habit(
-                name=habit.name,
-                periodicity=habit.periodicity,
-                current_streak=habit.current_streak,
-                longest_streak=habit.longest_streak,
-                next_completion_date=habit.next_completion_date,
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            )
-            self.session.add(new_habit)
-            self.session.commit()
-            return new_habit
+        saved_habit = self._save_one(Habit, habit, _habit_values)
+        self._invalidate_habit(saved_habit.id, saved_habit)
+        return saved_habit
 
     def save_task(self, task):
         """
         Save or update a task to the database.
         :param task: The task object to be saved or updated.
+        :return: The persisted task.
         """
-        existing_task = self.session.query(Task).filter_by(
-            id=task.id).first() if hasattr(task, 'id') else None
-        if existing_task:
-            # Update existing task
-            existing_task.habit_id = task.habit_id
-            existing_task.completed = task.completed
-            existing_task.completed_on = task.completed_on
-            existing_task.expected_completion_by = task.expected_completion_by
-            existing_task.updated_at = datetime.now()
-            self.session.commit()
-            return existing_task
-        else:
-            # Create new task
-            new_task = Task(
-                habit_id=task.habit_id,
-                completed=task.completed,
-                completed_on=task.completed_on,
-                expected_completion_by=task.expected_completion_by,
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            )
-            self.session.add(new_task)
-            self.session.commit()
-            return new_task
+        return self._save_one(Task, task, _task_values)
+
+    def _save_one(self, model, obj, values):
+        now = datetime.now()
+        if isinstance(obj, model) and obj in self.session:
+            # Already tracked by the session, so the flush issues a single
+            # UPDATE of the changed columns without reading the row first
+            obj.updated_at = now
+            self._commit()
+            return obj
+
+        obj_id = getattr(obj, "id", None)
+        if obj_id is not None:
+            # Update by primary key; any copy in the identity map is kept in sync
+            result = self.session.execute(
+                update(model).where(model.id == obj_id, *self._owned_by_user(model))
+                .values(updated_at=now, **self._row_values(obj, values)))
+            if result.rowcount:
+                self._commit()
+                return obj
+
+        new_obj = model(created_at=now, updated_at=now, **self._row_values(obj, values))
+        self.session.add(new_obj)
+        self._commit()
+        return new_obj
+
+    def save_habits(self, habits, chunk_size=BULK_CHUNK_SIZE):
+        """
+        Save or update many habits, one executemany statement per chunk and one commit per chunk.
+        Habits whose ID already exists in the database are updated, the rest are inserted.
+        :param habits: Iterable of habit objects to be saved or updated.
+        :param chunk_size: Number of habits written per transaction.
+        :return: The IDs of the persisted habits, in input order.
+        """
+        try:
+            return self._save_many(Habit, habits, _habit_values, chunk_size)
+        finally:
+            self.habit_cache.invalidate()
+
+    def save_tasks(self, tasks, chunk_size=BULK_CHUNK_SIZE):
+        """
+        Save or update many tasks, one executemany statement per chunk and one commit per chunk.
+        Tasks whose ID already exists in the database are updated, the rest are inserted.
+        :param tasks: Iterable of task objects to be saved or updated.
+        :param chunk_size: Number of tasks written per transaction.
+        :return: The IDs of the persisted tasks, in input order.
+        """
+        return self._save_many(Task, tasks, _task_values, chunk_size)
+
+    def _save_many(self, model, objects, values, chunk_size):
+        persisted_ids = []
+        for chunk in _chunked(objects, chunk_size):
+            now = datetime.now()
+            rows = []
+            for obj in chunk:
+                row = self._row_values(obj, values)
+                row["id"] = getattr(obj, "id", None)
+                rows.append(row)
+
+            requested_ids = [row["id"] for row in rows if row["id"] is not None]
+            existing_ids = set(self.session.scalars(
+                select(model.id).where(model.id.in_(requested_ids), *self._owned_by_user(model)))) \
+                if requested_ids else set()
+
+            updates = []
+            inserts = []
+            for row, obj in zip(rows, chunk):
+                if row["id"] in existing_ids:
+                    updates.append(dict(row, updated_at=now))
+                else:
+                    inserts.append((row, dict({"user_id": None}, **row,
+                                              created_at=getattr(obj, "created_at", None) or now,
+                                              updated_at=getattr(obj, "updated_at", None) or now)))
+
+            if updates:
+                self.session.execute(update(model), updates)
+
+            # Rows with and without an explicit ID are inserted separately so each
+            # executemany batch has a uniform set of parameters
+            for with_id in (True, False):
+                batch = [(row, params) for row, params in inserts if (row["id"] is not None) == with_id]
+                if not batch:
+                    continue
+                params = [params if with_id else {k: v for k, v in params.items() if k != "id"}
+                          for row, params in batch]
+                new_ids = self.session.scalars(
+                    insert(model).returning(model.id, sort_by_parameter_order=True), params).all()
+                for (row, _), new_id in zip(batch, new_ids):
+                    row["id"] = new_id
+
+            self._commit()
+            persisted_ids.extend(row["id"] for row in rows)
+        return persisted_ids
+
+    def load_journal_position(self, name):
+        """
+        :param name: Name of the journal consumer.
+        :return: The journal position the consumer has applied up to, 0 if it has not started.
+        """
+        checkpoint = self.session.get(JournalCheckpoint, name)
+        return checkpoint.position if checkpoint else 0
+
+    def save_journal_position(self, name, position):
+        """
+        Record the journal position a consumer has applied up to.
+        Call inside the unit of work that applied the events, so both commit together.
+        :param name: Name of the journal consumer.
+        :param position: The journal position.
+        """
+        checkpoint = self.session.get(JournalCheckpoint, name)
+        if checkpoint is None:
+            checkpoint = JournalCheckpoint(name=name)
+            self.session.add(checkpoint)
+        checkpoint.position = position
+        checkpoint.updated_at = datetime.now()
+        self._commit()
+
+    def delete_habit(self, habit_id):
+        """
+        Delete a habit and its tasks, archived ones included.
+        :param habit_id: The ID of the habit to be deleted.
+        """
+        for model in (Task, ArchivedTask, TaskRollup, HabitStats, HabitPeriodStats):
+            self.session.execute(delete(model).where(model.habit_id == habit_id, *self._owned_by_user(model)))
+        self.session.execute(delete(Habit).where(Habit.id == habit_id, *self._owned_by_user(Habit)))
+        self._commit()
+        self._invalidate_habit(habit_id)
+
+    def delete_task(self, task_id):
+        """
+        Delete a single task.
+        :param task_id: The ID of the task to be deleted.
+        """
+        self.session.execute(delete(Task).where(Task.id == task_id, *self._owned_by_user(Task)))
+        self._commit()
+
+    def clear_habits(self):
+        """
+        Delete every habit and task, archived ones included (only the user's own when a user_id is set).
+        """
+        for model in (Task, ArchivedTask, TaskRollup, HabitStats, HabitPeriodStats, Habit):
+            self.session.execute(delete(model).where(*self._owned_by_user(model)))
+        self._commit()
+        self.habit_cache.invalidate()
+
+    def _invalidate_habit(self, habit_id, habit=None):
+        """
+        Drop the cached load_habits() results a write to one habit can change:
+        those that contain it, and those whose filters its new values match.
+        """
+        owner = self.user_id if self.user_id is not None else getattr(habit, "user_id", None)
+
+        def affected(key, habits):
+            if any(cached.id == habit_id for cached in habits):
+                return True
+            if habit is None:
+                return False
+            key_user = key[-2]
+            if key_user is not None and owner is not None and key_user != owner:
+                return False
+            return _habit_matches_filters(habit, key[:-2])
+        self.habit_cache.invalidate(affected)
 
     def close(self):
         """
         Close the database session.
         """
-        self.session.close()
+        # Instances cached for the session are detached by closing it
+        session_key = self._session_key()
+        self.habit_cache.invalidate(lambda key, habits: key[-1] == session_key)
+        if isinstance(self.session, scoped_session):
+            self.session.remove()
+        else:
+            self.session.close()
@@ -0,0 +1,156 @@
+"""
+Export the habits and tasks tables to Parquet for offline analysis.
+
+Run from the project root:
+    python -m src.export --output exports
+
+Writes `habits.parquet` and a `tasks/` dataset partitioned as
+`habit_id=<id>/month=<YYYY-MM>/`, both readable with `pandas.read_parquet()`.
+"""
+import argparse
+import os
+import shutil
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import Boolean, DateTime, Integer
+from src.db import STREAM_BATCH_SIZE, StorageComponent
+from src.models import Habit, Task
+
+
+# Columns with few distinct values, stored dictionary-encoded
+DICTIONARY_COLUMNS = {"periodicity"}
+# Partition column derived from expected_completion_by
+MONTH_COLUMN = "month"
+
+
+def arrow_schema(model):
+    """
+    :param model: The mapped class of the table.
+    :return: The Arrow schema of the table's columns, in `model.__table__.columns` order.
+    """
+    fields = []
+    for column in model.__table__.columns:
+        if isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        elif column.name in DICTIONARY_COLUMNS:
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _record_batches(storage, model, schema, batch_size):
+    """
+    Convert the table's row batches into Arrow record batches, one at a time.
+    """
+    for rows in storage.iter_rows(model, batch_size):
+        arrays = []
+        for index, field in enumerate(schema):
+            values = [row[index] for row in rows]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, field.type.value_type).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _with_month(batches, schema):
+    """
+    Append the month partition column to each task batch.
+    :param schema: The schema of the resulting batches.
+    """
+    deadlines = schema.get_field_index("expected_completion_by")
+    for batch in batches:
+        month = pc.strftime(batch.column(deadlines), format="%Y-%m")
+        yield pa.RecordBatch.from_arrays(batch.columns + [month], schema=schema)
+
+
+def export_habits(storage, path, batch_size=STREAM_BATCH_SIZE):
+    """
+    Write the habits table to a single Parquet file, one row group per batch.
+
+    :param storage: Storage component to read from.
+    :param path: Output file path.
+    :param batch_size: Number of rows read and written at a time.
+    :return: The number of exported habits.
+    """
+    schema = arrow_schema(Habit)
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in _record_batches(storage, Habit, schema, batch_size):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+def export_tasks(storage, directory, batch_size=STREAM_BATCH_SIZE):
+    """
+    Write the tasks table to a Parquet dataset partitioned by habit and month of the deadline.
+    A previous export in the same directory is replaced.
+
+    :param storage: Storage component to read from.
+    :param directory: Output directory.
+    :param batch_size: Number of rows read and written at a time.
+    :return: The number of exported tasks.
+    """
+    table_schema = arrow_schema(Task)
+    schema = table_schema.append(pa.field(MONTH_COLUMN, pa.string()))
+    partitioning = ds.partitioning(
+        pa.schema([schema.field("habit_id"), schema.field(MONTH_COLUMN)]), flavor="hive")
+
+    shutil.rmtree(directory, ignore_errors=True)
+    count = 0
+    # Each batch is written by the calling thread: the session must not be used from
+    # the Arrow writer threads, and a batch at a time keeps memory flat.
+    for number, batch in enumerate(_with_month(_record_batches(storage, Task, table_schema, batch_size), schema)):
+        ds.write_dataset(
+            batch,
+            directory,
+            format="parquet",
+            partitioning=partitioning,
+            basename_template=f"part-{number}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        count += batch.num_rows
+    return count
+
+
+def export(storage, output, batch_size=STREAM_BATCH_SIZE):
+    """
+    Export both tables into `output`.
+
+    :param storage: Storage component to read from.
+    :param output: Output directory, created if missing.
+    :param batch_size: Number of rows read at a time.
+    :return: A dict with the number of exported habits and tasks.
+    """
+    os.makedirs(output, exist_ok=True)
+    return {
+        "habits": export_habits(storage, os.path.join(output, "habits.parquet"), batch_size),
+        "tasks": export_tasks(storage, os.path.join(output, "tasks"), batch_size),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export habits and tasks to Parquet.")
+    parser.add_argument("--output", default="exports", help="Output directory.")
+    parser.add_argument("--batch-size", type=int, default=STREAM_BATCH_SIZE)
+    args = parser.parse_args()
+
+    storage = StorageComponent()
+    try:
+        counts = export(storage, args.output, args.batch_size)
+    finally:
+        storage.close()
+    print(f"Exported {counts['habits']} habits and {counts['tasks']} tasks to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
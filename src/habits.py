@@ -1,10 +1,34 @@
-from datetime import datetime, timedelta
-from .tasks import TaskManager
+from collections import namedtuple
+from datetime import datetime
+from operator import attrgetter
+from .indexed import IndexedCollection
+from .periodicity import next_deadline
+from .tasks import AsyncTaskManager, TaskManager
+
+
+COMPLETED_MESSAGE = "Habit marked as completed😊!"
+NOT_DUE_MESSAGE = "This habit is not due for completion yet😌."
+NOT_FOUND_MESSAGE = "Habit not found."
+
+# Outcomes of a completion attempt, see StorageComponent.complete_habit()
+COMPLETED = "completed"
+NOT_DUE = "not_due"
+NOT_FOUND = "not_found"
+STATUS_MESSAGES = {COMPLETED: COMPLETED_MESSAGE, NOT_DUE: NOT_DUE_MESSAGE, NOT_FOUND: NOT_FOUND_MESSAGE}
+
+# The habit's state after a completion; only habit_id and status are set unless it was COMPLETED
+CompletionResult = namedtuple("CompletionResult", [
+    "habit_id", "status", "current_streak", "longest_streak", "next_completion_date", "task_id"],
+    defaults=(None, None, None, None))
+
+# Secondary indexes of a manager's habit list
+HABIT_INDEXES = {"name": attrgetter("name")}
 
 
 class Habit:
 
-    def __init__(self, name, periodicity, current_streak=0, longest_streak=0, next_completion_date=None):
+    def __init__(self, name, periodicity, current_streak=0, longest_streak=0, next_completion_date=None,
+                 created_at=None):
         """
         Initialize a new Habit instance.
 
@@ -13,12 +37,14 @@ class Habit:
         :param current_streak: The current streak of the habit.
         :param longest_streak: The longest streak achieved for the habit.
         :param next_completion_date: The date when the habit should next be completed.
+        :param created_at: When the habit was created; monthly deadlines keep its day of the month.
         """
         self.name = name
         self.periodicity = periodicity
         self.current_streak = current_streak
         self.longest_streak = longest_streak
         self.next_completion_date = next_completion_date
+        self.created_at = created_at
 
     def get_streak(self):
         """
@@ -28,62 +54,31 @@ class Habit:
         """
         return self.current_streak
 
-    def calculate_next_completion(self):
+    def calculate_next_completion(self, now=None):
         """
-        Calculate the next completion date based on the periodicity.
+        Calculate the next completion date based on the periodicity, see src.periodicity.
 
+        :param now: Optional reference time, defaults to the current time.
         :return: The next completion date.
         """
-        now = datetime.now()
-        end_of_day = now.replace(hour=23, minute=59, second=59, microsecond=0)
-
-        if self.periodicity == 'daily':
-            return end_of_day + timedelta(days=1) if self.next_completion_date else end_of_day
-        elif self.periodicity == 'weekly':
-            if self.next_completion_date:
-                next_completion_weekday = self.next_completion_date.weekday()
-                end_of_day_weekday = end_of_day.weekday()
-
-                # If the end_of_day weekday matches the next completion date weekday
-                if next_completion_weekday == end_of_day_weekday:
-                    return end_of_day + timedelta(weeks=1)
-                else:
-                    # Calculate the difference in days to get the next closest matching weekday
-                    days_difference = (
-                        next_completion_weekday - end_of_day_weekday + 7) % 7
-
-                    next_closest_date = end_of_day + \
-                        timedelta(days=days_difference)
-
-                    # Check if the next closest date falls in the same week as the end_of_day (a week is Monday to Sunday (0-6))
-                    if next_closest_date <= end_of_day + timedelta(days=6-end_of_day_weekday):
-                        # meaning that the time completion time had elapsed, but the user went ahead to complete the habit in the current week, hence the following week should be the next completion date
-                        return next_closest_date + timedelta(weeks=1)
-                    else:
-                        return next_closest_date
-            else:
-                return end_of_day
-        else:
-            raise ValueError(
-                "Unsupported periodicity. Use 'daily' or 'weekly'.")
+        return next_deadline(self.periodicity, self.next_completion_date, now or datetime.now(), self.created_at)
 
-    def complete_habit(self, latest_task, storage_component):
+    def apply_completion(self, latest_task, now):
         """
-        Mark the habit as completed, update the streak and calculate the next completion date.
+        Update the streak, the latest task and the next completion date in memory for a completion at `now`.
+        Nothing is persisted.
 
         :param latest_task: The latest task record for the given habit.
-        :param storage_component: Storage component instance to handle database interactions.
-        :return: A message indicating the result of the completion attempt.
+        :param now: The moment the habit was completed.
+        :return: True if the habit was due and has been completed, False otherwise.
         """
-        now = datetime.now()
-        # print(vars(latest_task))
-        # print(latest_task.expected_completion_by.date())
-
-        if latest_task.expected_completion_by.date() > now.date():
-            return "This habit is not due for completion yet😌."
+        # Deadlines are at the end of their day, so comparing day ordinals is enough
+        today = now.toordinal()
+        if latest_task.expected_day > today:
+            return False
 
         # Proceed with updating the habit
-        if now <= latest_task.expected_completion_by:
+        if today <= latest_task.expected_day:
             # Person is on track with their habit
             self.current_streak += 1
             if self.current_streak > self.longest_streak:
@@ -94,20 +89,37 @@ class Habit:
 
         latest_task.completed = True
         latest_task.completed_on = now
-        storage_component.save_task(latest_task)
-
-        # Create a new task record for the next expected completion
-        TaskManager(storage_component).create_task(
-            latest_task.habit_id, self.periodicity)
 
         # Update the next completion date of the habit
-        self.next_completion_date = self.calculate_next_completion()
+        self.next_completion_date = self.calculate_next_completion(now)
         self.updated_at = now
         self.id = latest_task.habit_id
+        return True
+
+    def complete_habit(self, latest_task, storage_component):
+        """
+        Mark the habit as completed, update the streak and calculate the next completion date.
+
+        :param latest_task: The latest task record for the given habit.
+        :param storage_component: Storage component instance to handle database interactions.
+        :return: A message indicating the result of the completion attempt.
+        """
+        if not self.apply_completion(latest_task, datetime.now()):
+            return NOT_DUE_MESSAGE
+
+        # All three writes are committed together
+        with storage_component.unit_of_work():
+            storage_component.save_task(latest_task)
 
-        storage_component.save_habit(self)
+            # Create a new task record for the next expected completion
+            TaskManager(storage_component).create_task(
+                latest_task.habit_id, self.periodicity, self.created_at)
 
-        return "Habit marked as completed😊!"
+            storage_component.save_habit(self)
+            storage_component.update_habit_stats(
+                latest_task.habit_id, latest_task.completed_on, latest_task.expected_completion_by)
+
+        return COMPLETED_MESSAGE
 
     def reset_streak(self):
         """
@@ -132,9 +144,103 @@ class HabitManager:
     needs the storage component on initialization
     """
 
-    def __init__(self, storage_component):
+    def __init__(self, storage_component, journal=None, snapshot=None, due_queue=None):
         self.storage = storage_component
-        self.habits = self.storage.load_habits()
+        self.journal = journal
+        self.snapshot = snapshot
+        # Optional DueQueue, kept in step with every change to a next completion date
+        self.due_queue = due_queue
+        # The habit list is loaded from storage on first access; until then it only holds the habits
+        # created or looked up by ID. A HabitSnapshot stands in for the list, and habits are then
+        # loaded one at a time when touched.
+        self._habits = IndexedCollection((), HABIT_INDEXES)
+        self._loaded = False
+        if snapshot is not None:
+            self.habits = snapshot
+
+    @property
+    def habits(self):
+        if not self._loaded:
+            habits = IndexedCollection(self.storage.load_habits(), HABIT_INDEXES)
+            # Habits created before the first access are normally part of the result already
+            habits.extend(habit for habit in self._habits if habit not in habits)
+            self._habits = habits
+            self._loaded = True
+        return self._habits
+
+    @habits.setter
+    def habits(self, habits):
+        # Any other habit list is indexed by ID and name
+        if habits is self.snapshot or isinstance(habits, IndexedCollection):
+            self._habits = habits
+        else:
+            self._habits = IndexedCollection(habits, HABIT_INDEXES)
+        self._loaded = True
+
+    def _find_habit(self, habit_id):
+        if self.snapshot is not None:
+            return self.storage.load_habit(habit_id) if habit_id in self.snapshot else None
+        habit = self._habits.get(habit_id)
+        if habit is None and not self._loaded:
+            habit = self.storage.load_habit(habit_id)
+            if habit is not None:
+                self._habits.append(habit)
+        return habit
+
+    def get_habits(self, habit_ids):
+        """
+        Habits by ID, loading only the ones not in memory yet instead of the whole habit list.
+        :param habit_ids: The IDs of the habits.
+        :return: The habits that exist, in the order of `habit_ids`.
+        """
+        habit_ids = list(habit_ids)
+        if self.snapshot is not None:
+            loaded = self.storage.load_habits(ids=[habit_id for habit_id in habit_ids if habit_id in self.snapshot])
+            by_id = {habit.id: habit for habit in loaded}
+            return [by_id[habit_id] for habit_id in habit_ids if habit_id in by_id]
+        missing = [habit_id for habit_id in habit_ids if self._habits.get(habit_id) is None]
+        if missing and not self._loaded:
+            self._habits.extend(self.storage.load_habits(ids=missing))
+        return [habit for habit in map(self._habits.get, habit_ids) if habit is not None]
+
+    def refresh(self, habit_ids=None):
+        """
+        Re-read habits from storage, e.g. after another process changed them.
+        :param habit_ids: IDs of the habits to re-read now; None drops the whole habit list,
+                          which is then loaded again on next access.
+        """
+        if self.snapshot is not None:
+            if habit_ids is None:
+                self.snapshot.rebuild(self.storage)
+            for habit_id in habit_ids or ():
+                self.snapshot.refresh(self.storage, habit_id)
+            return
+        if habit_ids is None:
+            self._habits = IndexedCollection((), HABIT_INDEXES)
+            self._loaded = False
+            return
+        for habit_id in habit_ids:
+            habit = self.storage.load_habit(habit_id, refresh=True)
+            self._habits.discard(habit_id)
+            if habit is not None:
+                self._habits.append(habit)
+
+    def find_habits(self, name):
+        """
+        :param name: The name of the habits.
+        :return: The habits in the habit list with that name.
+        """
+        if self.snapshot is not None:
+            return [habit for habit in self.snapshot if habit.name == name]
+        return self.habits.find("name", name)
+
+    def _refresh_snapshot(self, habit_id):
+        if self.snapshot is not None:
+            self.snapshot.refresh(self.storage, habit_id)
+
+    def _schedule(self, habit_id, next_completion_date):
+        if self.due_queue is not None:
+            self.due_queue.push(habit_id, next_completion_date)
 
     def create_habit(self, name, periodicity):
         """
@@ -147,72 +253,203 @@ class HabitManager:
         # print("Habits", self.habits)
         # print("New Habit", new_habit)
         created_habit = self.storage.save_habit(new_habit)
-        self.habits.append(created_habit)
+        self._habits.append(created_habit)
+        if self.due_queue is not None:
+            self.due_queue.push(created_habit.id, created_habit.next_completion_date)
         return created_habit
 
+    def create_habits(self, habit_specs):
+        """
+        Creates several habits in bulk and adds them to the habit list.
+        :param habit_specs: Iterable of (name, periodicity) pairs.
+        :return: The created habits, in input order.
+        """
+        new_habits = []
+        for name, periodicity in habit_specs:
+            new_habit = Habit(name=name, periodicity=periodicity)
+            new_habit.next_completion_date = new_habit.calculate_next_completion()
+            new_habits.append(new_habit)
+        if not new_habits:
+            return []
+
+        habit_ids = self.storage.save_habits(new_habits)
+        created_by_id = {habit.id: habit for habit in self.storage.load_habits(ids=habit_ids)}
+        created_habits = [created_by_id[habit_id] for habit_id in habit_ids]
+        self._habits.extend(created_habits)
+        if self.due_queue is not None:
+            for habit in created_habits:
+                self.due_queue.push(habit.id, habit.next_completion_date)
+        return created_habits
+
     def update_habit(self, habit_id, **kwargs):
         """
         Updates an existing habit.
         :param habit_id: The ID of the habit to be updated.
         :param kwargs: Key-value pairs of attributes to update.
         """
-        habit = next((h for h in self.habits if h.id == habit_id), None)
+        habit = self._find_habit(habit_id)
         if habit:
             for key, value in kwargs.items():
                 if hasattr(habit, key):
                     setattr(habit, key, value)
             self.storage.save_habit(habit)
+            if self.snapshot is None:
+                self._habits.reindex(habit)
+            self._refresh_snapshot(habit_id)
+            self._schedule(habit_id, habit.next_completion_date)
 
     def delete_habit(self, habit_id):
         """
         Deletes a habit from the habit list.
         :param habit_id: The ID of the habit to be deleted.
         """
-        habit = next((h for h in self.habits if h.id == habit_id), None)
+        habit = self._find_habit(habit_id)
         if habit:
-            self.habits.remove(habit)
-            self.storage.session.delete(habit)
-            self.storage.session.commit()
-
-    # def delete_habit(self, habit_id):
-    #     """
-    #     Deletes a habit from the habit list.
-    #     :param habit_id: The ID of the habit to be deleted.
-    #     """
-    #     habit = next((h for h in self.habits if h.id == habit_id), None)
-    #     if habit:
-    #         self.habits.remove(habit)
-    #         self.storage.delete_habit(habit_id)
+            self._habits.remove(habit)
+            self.storage.delete_habit(habit_id)
+            if self.due_queue is not None:
+                self.due_queue.remove(habit_id)
 
-    def mark_habit_completed(self, habit_id):
+    def mark_habit_completed(self, habit_id, completed_at=None):
         """
-        Marks a habit as completed by calling the complete_habit method of the Habit class.
+        Marks a habit as completed through the storage component's completion fast path,
+        which updates the persisted rows in one short transaction.
 
         :param habit_id: The ID of the habit to be marked as completed.
+        :param completed_at: When the habit was completed, defaults to now.
         :return: A message indicating the result of the completion attempt.
         """
-        habit = next((h for h in self.habits if h.id == habit_id), None)
-        habit_attrs = {k: v for k, v in vars(habit).items() if not k.startswith(
-            '__') and not callable(v) and not k.startswith('_')}
+        result = self.storage.complete_habit(habit_id, completed_at)
+        if result.status == COMPLETED:
+            self._refresh_snapshot(habit_id)
+            self._schedule(habit_id, result.next_completion_date)
+        return STATUS_MESSAGES[result.status]
 
-        # removing uneccessary attrs
-        if habit_attrs.get("created_at"):
-            del habit_attrs["created_at"]
-        if habit_attrs.get("updated_at"):
-            del habit_attrs["updated_at"]
-        if habit_attrs.get("id"):
-            del habit_attrs["id"]
+    def complete_habits(self, completions):
+        """
+        Marks many habits as completed in one transaction, e.g. a batch synced from a device.
 
-        if habit:
-            habit_obj = Habit(**habit_attrs)
-            latest_task = self.storage.load_tasks_for_habit(habit_id)[-1]
-            return habit_obj.complete_habit(latest_task, self.storage)
-        return "Habit not found."
+        :param completions: Iterable of (habit_id, completed_at) pairs; each completion is checked
+                            and recorded at its own completed_at.
+        :return: A CompletionResult per completion, in input order.
+        """
+        results = self.storage.complete_habits(completions)
+        completed = [result for result in results if result.status == COMPLETED]
+        for habit_id in dict.fromkeys(result.habit_id for result in completed):
+            self._refresh_snapshot(habit_id)
+        # A habit's later completions move its next completion date further out
+        for result in sorted(completed, key=lambda result: result.next_completion_date):
+            self._schedule(result.habit_id, result.next_completion_date)
+        return results
+
+    def record_completion(self, habit_id, completed_at=None):
+        """
+        Records a completion in the completion journal instead of writing it to the database.
+        A JournalCompactor applies it to the habit later.
+
+        :param habit_id: The ID of the completed habit.
+        :param completed_at: When the habit was completed, defaults to now.
+        :return: The journal position of the recorded completion.
+        """
+        if self.journal is None:
+            raise ValueError("HabitManager was created without a completion journal.")
+        return self.journal.append(habit_id, completed_at)
 
     def clear_habits(self):
         """
         Clears all habits from the habit list.
         """
-        self.habits.clear()
-        self.storage.session.query(Habit).delete()
-        self.storage.session.commit()
+        self._habits.clear()
+        self._loaded = True
+        self.storage.clear_habits()
+        if self.due_queue is not None:
+            self.due_queue.clear()
+
+
+class AsyncHabitManager:
+    """
+    Asyncio counterpart of HabitManager.
+    needs an AsyncStorageComponent; call `load()` to fill the habit list.
+    """
+
+    def __init__(self, storage_component):
+        self.storage = storage_component
+        self.habits = []
+
+    @property
+    def habits(self):
+        return self._habits
+
+    @habits.setter
+    def habits(self, habits):
+        self._habits = habits if isinstance(habits, IndexedCollection) else IndexedCollection(habits, HABIT_INDEXES)
+
+    async def load(self):
+        """
+        Loads the habit list from storage.
+        """
+        self.habits = await self.storage.load_habits()
+        return self.habits
+
+    async def create_habit(self, name, periodicity):
+        """
+        Creates a new habit and adds it to the habit list.
+        :param name: The name of the habit.
+        :param periodicity: The periodicity of the habit (e.g., daily, weekly).
+        """
+        new_habit = Habit(name=name, periodicity=periodicity)
+        new_habit.next_completion_date = new_habit.calculate_next_completion()
+        created_habit = await self.storage.save_habit(new_habit)
+        self.habits.append(created_habit)
+        return created_habit
+
+    async def update_habit(self, habit_id, **kwargs):
+        """
+        Updates an existing habit.
+        :param habit_id: The ID of the habit to be updated.
+        :param kwargs: Key-value pairs of attributes to update.
+        """
+        habit = self.habits.get(habit_id)
+        if habit:
+            for key, value in kwargs.items():
+                if hasattr(habit, key):
+                    setattr(habit, key, value)
+            await self.storage.save_habit(habit)
+            self.habits.reindex(habit)
+
+    async def delete_habit(self, habit_id):
+        """
+        Deletes a habit from the habit list.
+        :param habit_id: The ID of the habit to be deleted.
+        """
+        habit = self.habits.get(habit_id)
+        if habit:
+            self.habits.remove(habit)
+            await self.storage.delete_habit(habit_id)
+
+    async def mark_habit_completed(self, habit_id):
+        """
+        Marks a habit as completed, committing the task update, the next task and the habit in one transaction.
+
+        :param habit_id: The ID of the habit to be marked as completed.
+        :return: A message indicating the result of the completion attempt.
+        """
+        habit = self.habits.get(habit_id)
+        if not habit:
+            return NOT_FOUND_MESSAGE
+
+        habit_obj = Habit(habit.name, habit.periodicity, habit.current_streak,
+                          habit.longest_streak, habit.next_completion_date, habit.created_at)
+        async with self.storage.unit_of_work() as storage:
+            latest_task = await storage.load_latest_task(habit_id)
+            if not habit_obj.apply_completion(latest_task, datetime.now()):
+                return NOT_DUE_MESSAGE
+            await storage.save_task(latest_task)
+            await AsyncTaskManager(storage).create_task(habit_id, habit.periodicity, habit.created_at)
+            await storage.save_habit(habit_obj)
+            await storage.update_habit_stats(habit_id, latest_task.completed_on, latest_task.expected_completion_by)
+
+        habit.current_streak = habit_obj.current_streak
+        habit.longest_streak = habit_obj.longest_streak
+        habit.next_completion_date = habit_obj.next_completion_date
+        return COMPLETED_MESSAGE
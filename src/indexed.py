@@ -0,0 +1,127 @@
+from collections import OrderedDict
+
+
+class IndexedCollection:
+    """
+    Insertion-ordered collection of objects keyed by their `id`, with optional secondary indexes,
+    so finding, replacing and removing an item take O(1) instead of a pass over a list.
+
+    Secondary indexes map a key computed from each item, e.g. a habit's name, to the items with
+    that key. Call reindex() after changing an attribute an index is computed from.
+    With `maxlen`, appending to a full collection drops the oldest item, like a bounded deque.
+    """
+
+    def __init__(self, items=(), indexes=None, maxlen=None):
+        """
+        :param items: Initial items.
+        :param indexes: Dict mapping index names to functions computing an item's key.
+        :param maxlen: Optional maximum number of items.
+        """
+        self.maxlen = maxlen
+        self._key_functions = dict(indexes or {})
+        self._items = OrderedDict()
+        self._indexes = {name: {} for name in self._key_functions}
+        # The keys each item is indexed under, so it can be unindexed after its attributes changed
+        self._keys = {}
+        self.extend(items)
+
+    @staticmethod
+    def _id(item):
+        item_id = getattr(item, "id", None)
+        # Items that have not been saved yet are told apart by identity
+        return item_id if item_id is not None else ("unsaved", id(item))
+
+    def _index(self, item_id, item):
+        keys = {name: key_function(item) for name, key_function in self._key_functions.items()}
+        for name, key in keys.items():
+            self._indexes[name].setdefault(key, {})[item_id] = item
+        self._keys[item_id] = keys
+
+    def _unindex(self, item_id):
+        for name, key in self._keys.pop(item_id, {}).items():
+            bucket = self._indexes[name][key]
+            del bucket[item_id]
+            if not bucket:
+                del self._indexes[name][key]
+
+    def append(self, item):
+        """
+        Add an item, replacing the item with the same ID in place.
+        """
+        item_id = self._id(item)
+        if item_id in self._items:
+            self._unindex(item_id)
+        elif self.maxlen is not None and len(self._items) >= self.maxlen:
+            oldest_id, _ = self._items.popitem(last=False)
+            self._unindex(oldest_id)
+        self._items[item_id] = item
+        self._index(item_id, item)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def remove(self, item):
+        """
+        Remove an item, like list.remove().
+        :raises ValueError: If no item with its ID is in the collection.
+        """
+        if self.discard(self._id(item)) is None:
+            raise ValueError("Item not in collection.")
+
+    def discard(self, item_id):
+        """
+        Remove the item with an ID if there is one.
+        :return: The removed item, or None.
+        """
+        item = self._items.pop(item_id, None)
+        if item is not None:
+            self._unindex(item_id)
+        return item
+
+    def get(self, item_id, default=None):
+        """
+        :return: The item with an ID, or `default`.
+        """
+        return self._items.get(item_id, default)
+
+    def find(self, index, key):
+        """
+        :param index: Name of a secondary index.
+        :param key: The key to look up.
+        :return: The items with that key, in insertion order of the index.
+        """
+        return list(self._indexes[index].get(key, {}).values())
+
+    def reindex(self, item):
+        """
+        Update the secondary indexes of an item in the collection after its attributes changed.
+        """
+        item_id = self._id(item)
+        if item_id in self._items:
+            self._unindex(item_id)
+            self._index(item_id, item)
+
+    def clear(self):
+        self._items.clear()
+        self._keys.clear()
+        for index in self._indexes.values():
+            index.clear()
+
+    def __contains__(self, item):
+        return self._id(item) in self._items
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __eq__(self, other):
+        # Compares like a list, so a collection equals the list of its items
+        if isinstance(other, (IndexedCollection, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"IndexedCollection({list(self)!r})"
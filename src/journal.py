@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from itertools import islice
+
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATH = "completion_journal.log"
+# Events applied per compaction transaction
+COMPACTION_BATCH_SIZE = 500
+
+
+class CompletionJournal:
+    """
+    Append-only log of habit completions, one JSON line per event.
+    Appending only touches the log file, so bursts of completions never wait on database locks;
+    a JournalCompactor applies the events to the database later.
+    An event's position is the byte offset just past its line.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, fsync=True):
+        """
+        :param path: Path of the log file; created on first append.
+        :param fsync: Whether every append is flushed to disk before returning.
+        """
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._repair()
+
+    def _repair(self):
+        """
+        Drop a partially written last line left behind by a crash.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as file:
+            data = file.read()
+            if data and not data.endswith(b"\n"):
+                file.truncate(data.rfind(b"\n") + 1)
+
+    def append(self, habit_id, completed_at=None):
+        """
+        Record a completion.
+
+        :param habit_id: The ID of the completed habit.
+        :param completed_at: When the habit was completed, defaults to now.
+        :return: The position just past the new event.
+        """
+        event = {"habit_id": habit_id, "completed_at": (completed_at or datetime.now()).isoformat()}
+        line = (json.dumps(event) + "\n").encode()
+        with self._lock:
+            with open(self.path, "ab") as file:
+                file.write(line)
+                file.flush()
+                if self.fsync:
+                    os.fsync(file.fileno())
+                return file.tell()
+
+    def read(self, position=0):
+        """
+        Iterate over the events recorded after `position`.
+
+        :param position: Position to start reading from.
+        :return: A generator of (position after the event, event) pairs.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as file:
+            file.seek(position)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    # Still being written
+                    return
+                position += len(line)
+                event = json.loads(line)
+                event["completed_at"] = datetime.fromisoformat(event["completed_at"])
+                yield position, event
+
+
+class JournalCompactor:
+    """
+    Applies completion journal events to the habits and tasks tables in batches.
+    Each batch is applied in one transaction together with the journal checkpoint,
+    so after a crash `replay()` continues exactly where the last commit stopped.
+    """
+
+    def __init__(self, journal, storage_component, name="completions", batch_size=COMPACTION_BATCH_SIZE,
+                 interval=1.0):
+        """
+        :param journal: The CompletionJournal to read.
+        :param storage_component: Storage component used to apply the events.
+        :param name: Checkpoint name, one per journal.
+        :param batch_size: Maximum number of events applied per transaction.
+        :param interval: Seconds between compactions when running in the background.
+        """
+        self.journal = journal
+        self.storage = storage_component
+        self.name = name
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def compact_once(self):
+        """
+        Apply the next batch of events.
+        :return: The number of events read from the journal.
+        """
+        with self.storage.unit_of_work():
+            position = self.storage.load_journal_position(self.name)
+            events = list(islice(self.journal.read(position), self.batch_size))
+            if not events:
+                return 0
+            # Completions of habits that no longer exist or are not due at the event time
+            # are skipped, which also makes re-applying an event harmless
+            self.storage.complete_habits((event["habit_id"], event["completed_at"]) for _, event in events)
+            self.storage.save_journal_position(self.name, events[-1][0])
+        return len(events)
+
+    def replay(self):
+        """
+        Apply every pending event, e.g. on startup after a crash.
+        :return: The number of events read from the journal.
+        """
+        total = 0
+        while applied := self.compact_once():
+            total += applied
+        return total
+
+    def start(self):
+        """
+        Start compacting in a background thread every `interval` seconds.
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="journal-compactor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.replay()
+            except Exception:
+                # The failed batch was rolled back with its checkpoint, e.g. after racing a direct
+                # completion, so it is simply retried on the next tick
+                logger.exception("Journal compaction failed; retrying in %s seconds.", self.interval)
+
+    def stop(self):
+        """
+        Stop the background thread and apply whatever is still pending.
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.replay()
@@ -1,19 +1,29 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Index
+from sqlalchemy.orm import relationship, declarative_base, validates
 
 # Define the base for declarative models
 Base = declarative_base()
 
 
+def day_ordinal(value):
+    """
+    Day number of a date or datetime, as date.toordinal() (0001-01-01 is day 1), or None.
+    """
+    return value.toordinal() if value is not None else None
+
+
 class Habit(Base):
     __tablename__ = 'habits'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String)
-    periodicity = Column(String)
+    # Owner of the habit; NULL for single-user databases
+    user_id = Column(Integer, index=True)
+    name = Column(String, index=True)
+    periodicity = Column(String, index=True)
     current_streak = Column(Integer)
     longest_streak = Column(Integer)
-    next_completion_date = Column(DateTime)
+    # Indexed for the due and overdue lookups of DueQueue
+    next_completion_date = Column(DateTime, index=True)
 
     created_at = Column(DateTime)
     updated_at = Column(DateTime)
@@ -27,15 +37,122 @@ class Habit(Base):
 
 class Task(Base):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        # Serves both "all tasks for a habit" and "latest task for a habit"
+        # lookups, so a separate single-column habit_id index is not needed.
+        Index('ix_tasks_habit_id_expected_day', 'habit_id', 'expected_day'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     habit_id = Column(Integer, ForeignKey('habits.id'))
+    # Owner of the task, same as its habit's; NULL for single-user databases
+    user_id = Column(Integer, index=True)
     completed = Column(Boolean)
     completed_on = Column(DateTime)
     expected_completion_by = Column(DateTime)
+    # Day ordinals of the two dates above, see day_ordinal(). Deadlines are always at the end
+    # of the day, so due-date and streak checks, range queries and sorting use these instead.
+    completed_day = Column(Integer)
+    expected_day = Column(Integer, index=True)
 
     created_at = Column(DateTime)
     updated_at = Column(DateTime)
 
     # Many-to-One relationship with Habit
     habits = relationship('Habit', back_populates='tasks')
+
+    @validates('completed_on')
+    def _set_completed_day(self, key, value):
+        self.completed_day = day_ordinal(value)
+        return value
+
+    @validates('expected_completion_by')
+    def _set_expected_day(self, key, value):
+        self.expected_day = day_ordinal(value)
+        return value
+
+
+class JournalCheckpoint(Base):
+    """
+    How far a consumer of the completion journal has applied it.
+    Written in the same transaction as the changes it records.
+    """
+    __tablename__ = 'journal_checkpoints'
+
+    name = Column(String, primary_key=True)
+    position = Column(Integer)
+    updated_at = Column(DateTime)
+
+
+class ArchivedTask(Base):
+    """
+    Completed task moved out of `tasks` by the archival job, see src/archive.py.
+    Same columns as Task, plus when it was archived.
+    """
+    __tablename__ = 'tasks_archive'
+    __table_args__ = (
+        Index('ix_tasks_archive_habit_id_expected_day', 'habit_id', 'expected_day'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    habit_id = Column(Integer)
+    user_id = Column(Integer, index=True)
+    completed = Column(Boolean)
+    completed_on = Column(DateTime)
+    expected_completion_by = Column(DateTime)
+    completed_day = Column(Integer)
+    expected_day = Column(Integer)
+
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime)
+
+
+class TaskRollup(Base):
+    """
+    Per-habit, per-month summary of the archived tasks, by month of expected_completion_by.
+    """
+    __tablename__ = 'task_rollups'
+
+    habit_id = Column(Integer, primary_key=True)
+    # "YYYY-MM"
+    month = Column(String, primary_key=True)
+    user_id = Column(Integer, index=True)
+    completed_count = Column(Integer)
+    # Completed by the expected completion date
+    on_time_count = Column(Integer)
+    first_completed_on = Column(DateTime)
+    last_completed_on = Column(DateTime)
+    updated_at = Column(DateTime)
+
+
+class HabitStats(Base):
+    """
+    Running completion totals of a habit, updated in the same transaction as each completion,
+    so completion rates are read without scanning the tasks.
+    """
+    __tablename__ = 'habit_stats'
+
+    habit_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, index=True)
+    completions = Column(Integer)
+    # Completions made after the expected completion date, i.e. that broke the streak
+    misses = Column(Integer)
+    last_completed_on = Column(DateTime)
+    updated_at = Column(DateTime)
+
+
+class HabitPeriodStats(Base):
+    """
+    Completion counts of a habit per week ("2024-01-01", the Monday) and per month ("2024-01")
+    of the completion date.
+    """
+    __tablename__ = 'habit_period_stats'
+
+    habit_id = Column(Integer, primary_key=True)
+    # "week" or "month"
+    kind = Column(String, primary_key=True)
+    period = Column(String, primary_key=True)
+    user_id = Column(Integer, index=True)
+    completions = Column(Integer)
+    misses = Column(Integer)
@@ -0,0 +1,261 @@
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+import numpy as np
+
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+UNSUPPORTED_MESSAGE = ("Unsupported periodicity. Use 'daily', 'weekly', 'monthly', 'every N days' "
+                       "or weekdays such as 'mon,wed,fri'.")
+# Deadlines are at the end of their day
+END_OF_DAY = np.timedelta64(86399, "s")
+ONE_DAY = np.timedelta64(1, "D")
+
+
+def weekday_of(days):
+    """
+    :param days: datetime64[D] array.
+    :return: Integer array of weekdays, Monday is 0 as in date.weekday().
+    """
+    # 1970-01-01 was a Thursday
+    return (days.astype(np.int64) + 3) % 7
+
+
+def _offset_tables():
+    """
+    For every set of weekdays (a 7-bit mask, bit 0 is Monday) and every weekday, the number of days
+    to the next day in the set: counting today (0-6), and strictly after today (1-7).
+    """
+    from_today = np.zeros((128, 7), dtype=np.int64)
+    after_today = np.zeros((128, 7), dtype=np.int64)
+    for mask in range(1, 128):
+        for weekday in range(7):
+            offsets = [offset for offset in range(8) if mask >> ((weekday + offset) % 7) & 1]
+            from_today[mask, weekday] = offsets[0]
+            after_today[mask, weekday] = next(offset for offset in offsets if offset > 0)
+    return from_today, after_today
+
+
+# Precomputed once; weekday rules are then a table lookup per habit
+OFFSETS_FROM_TODAY, OFFSETS_AFTER_TODAY = _offset_tables()
+
+
+class Periodicity(ABC):
+    """
+    A rule placing a habit's deadlines. The methods work on whole datetime64[D] arrays,
+    one element per habit. `origin` is the first deadline of each habit's series, for rules
+    whose later deadlines depend on it.
+    """
+
+    def first(self, today):
+        """
+        :return: The first deadline of a new habit created `today`.
+        """
+        return today
+
+    @abstractmethod
+    def next(self, today, anchor, origin):
+        """
+        :param anchor: The deadline that was just met.
+        :return: The next deadline after a completion `today`.
+        """
+
+    @abstractmethod
+    def rollover(self, today, anchor, origin):
+        """
+        :param anchor: The deadline that was missed.
+        :return: The earliest deadline from `today` on, in the series of the missed one.
+        """
+
+
+class EveryNDays(Periodicity):
+    """
+    Due every `days` days; daily is EveryNDays(1).
+    """
+
+    def __init__(self, days):
+        if days < 1:
+            raise ValueError(UNSUPPORTED_MESSAGE)
+        self.days = days
+
+    def next(self, today, anchor, origin):
+        return today + self.days * ONE_DAY
+
+    def rollover(self, today, anchor, origin):
+        periods = -((anchor - today) // ONE_DAY // self.days)
+        return anchor + np.maximum(periods, 0) * self.days * ONE_DAY
+
+
+class Weekly(Periodicity):
+    """
+    Due once a week, on the weekday of the previous deadline.
+    """
+
+    def next(self, today, anchor, origin):
+        # That weekday in the next Monday-to-Sunday week
+        next_monday = today - weekday_of(today) * ONE_DAY + 7 * ONE_DAY
+        return next_monday + weekday_of(anchor) * ONE_DAY
+
+    def rollover(self, today, anchor, origin):
+        return EveryNDays(7).rollover(today, anchor, origin)
+
+
+class Weekdays(Periodicity):
+    """
+    Due on each of a set of weekdays.
+    """
+
+    def __init__(self, weekdays):
+        self.mask = sum(1 << weekday for weekday in set(weekdays))
+        if not self.mask:
+            raise ValueError(UNSUPPORTED_MESSAGE)
+
+    def first(self, today):
+        return today + OFFSETS_FROM_TODAY[self.mask, weekday_of(today)] * ONE_DAY
+
+    def next(self, today, anchor, origin):
+        return today + OFFSETS_AFTER_TODAY[self.mask, weekday_of(today)] * ONE_DAY
+
+    def rollover(self, today, anchor, origin):
+        return self.first(today)
+
+
+class Monthly(Periodicity):
+    """
+    Due once a month, on the day of the month of the series' first deadline,
+    or the month's last day if it is shorter. The day comes from `origin` rather than
+    the previous deadline, so a deadline moved to a month's end returns to its day afterwards.
+    """
+
+    @staticmethod
+    def _in_month(months, day_of_month):
+        starts = months.astype("datetime64[D]")
+        lengths = ((months + 1).astype("datetime64[D]") - starts) // ONE_DAY
+        return starts + (np.minimum(day_of_month, lengths) - 1) * ONE_DAY
+
+    @staticmethod
+    def _day_of_month(days):
+        return (days - days.astype("datetime64[M]").astype("datetime64[D]")) // ONE_DAY + 1
+
+    def next(self, today, anchor, origin):
+        return self._in_month(today.astype("datetime64[M]") + 1, self._day_of_month(origin))
+
+    def rollover(self, today, anchor, origin):
+        months = today.astype("datetime64[M]")
+        day_of_month = self._day_of_month(origin)
+        this_month = self._in_month(months, day_of_month)
+        return np.where(this_month >= today, this_month, self._in_month(months + 1, day_of_month))
+
+
+def _parse_fixed(text):
+    return {"daily": EveryNDays(1), "weekly": Weekly(), "monthly": Monthly()}.get(text)
+
+
+def _parse_every_n_days(text):
+    match = re.fullmatch(r"every (\d+) days?", text)
+    return EveryNDays(int(match.group(1))) if match else None
+
+
+def _parse_weekdays(text):
+    names = [name.strip()[:3] for name in text.split(",")]
+    if all(name in WEEKDAYS for name in names):
+        return Weekdays(WEEKDAYS.index(name) for name in names)
+    return None
+
+
+# Tried in order; register_periodicity() adds more
+PERIODICITY_PARSERS = [_parse_fixed, _parse_every_n_days, _parse_weekdays]
+
+
+def register_periodicity(parser):
+    """
+    Add a periodicity format.
+    :param parser: Function taking a lower-cased periodicity string and returning a
+                   Periodicity, or None if the string is not in its format.
+    :return: The parser, so this can be used as a decorator.
+    """
+    PERIODICITY_PARSERS.insert(0, parser)
+    parse_periodicity.cache_clear()
+    return parser
+
+
+@lru_cache(maxsize=256)
+def parse_periodicity(periodicity):
+    """
+    :param periodicity: A periodicity string such as "daily" or "every 3 days".
+    :return: Its Periodicity rule.
+    :raises ValueError: If no parser accepts it.
+    """
+    if isinstance(periodicity, str):
+        text = periodicity.strip().lower()
+        for parser in PERIODICITY_PARSERS:
+            rule = parser(text)
+            if rule is not None:
+                return rule
+    raise ValueError(UNSUPPORTED_MESSAGE)
+
+
+def is_supported(periodicity):
+    try:
+        parse_periodicity(periodicity)
+    except ValueError:
+        return False
+    return True
+
+
+def _deadlines(method, periodicities, anchors, now, origins=None):
+    """
+    Apply a Periodicity method to every habit, one vectorized call per distinct periodicity.
+    Habits without an anchor get their first deadline; habits without an origin use their anchor.
+    """
+    periodicities = list(periodicities)
+    anchors = np.array(list(anchors), dtype="datetime64[s]")
+    today = np.broadcast_to(np.asarray(now, dtype="datetime64[s]").astype("datetime64[D]"), anchors.shape)
+    anchor_days = anchors.astype("datetime64[D]")
+    unanchored = np.isnat(anchors)
+    origin_days = anchor_days if origins is None else \
+        np.array(list(origins), dtype="datetime64[s]").astype("datetime64[D]")
+    origin_days = np.where(np.isnat(origin_days), anchor_days, origin_days)
+
+    deadlines = np.empty(anchors.shape, dtype="datetime64[D]")
+    groups = {}
+    for index, periodicity in enumerate(periodicities):
+        groups.setdefault(periodicity, []).append(index)
+    for periodicity, indexes in groups.items():
+        rule = parse_periodicity(periodicity)
+        indexes = np.array(indexes)
+        with np.errstate(invalid="ignore"):
+            anchored = getattr(rule, method)(today[indexes], anchor_days[indexes], origin_days[indexes])
+        deadlines[indexes] = np.where(unanchored[indexes], rule.first(today[indexes]), anchored)
+    return deadlines.astype("datetime64[s]") + END_OF_DAY
+
+
+def next_deadlines(periodicities, anchors, now, origins=None):
+    """
+    Next deadlines of many habits after a completion, in one vectorized pass.
+
+    :param periodicities: Sequence of periodicity strings, one per habit.
+    :param anchors: Sequence of each habit's current deadline, or None for a new habit.
+    :param now: Time of the completion, a datetime or an array of them.
+    :param origins: Optional sequence of each habit's first deadline, i.e. its creation time;
+                    None elements, or no sequence at all, fall back to the anchors.
+    :return: A datetime64[s] array of deadlines, at the end of their day.
+    :raises ValueError: If a periodicity is not supported.
+    """
+    return _deadlines("next", periodicities, anchors, now, origins)
+
+
+def rollover_deadlines(periodicities, anchors, now, origins=None):
+    """
+    New deadlines of many habits whose deadline passed uncompleted, in one vectorized pass.
+    See next_deadlines() for the parameters.
+    """
+    return _deadlines("rollover", periodicities, anchors, now, origins)
+
+
+def next_deadline(periodicity, anchor, now, origin=None):
+    """
+    Scalar next_deadlines().
+    :return: The deadline as a datetime.
+    """
+    return next_deadlines([periodicity], [anchor], now, [origin])[0].item()
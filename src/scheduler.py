@@ -0,0 +1,135 @@
+import heapq
+from collections import namedtuple
+from datetime import datetime
+
+
+DueEntry = namedtuple("DueEntry", ["next_completion_date", "habit_id"])
+
+
+class DueQueue:
+    """
+    In-process min-heap of habits keyed on their next completion date, so reminder and
+    overdue views do not load every habit.
+
+    The heap is filled by one query over the next_completion_date index, and HabitManager
+    keeps it in step as habits are created, completed and deleted. An entry replaced by
+    push() or dropped by remove() stays in the heap until it reaches the top, or until
+    stale entries outnumber current ones and the heap is rebuilt.
+    """
+
+    def __init__(self, storage_component):
+        """
+        :param storage_component: Storage component to load the due dates from.
+        """
+        self.storage = storage_component
+        self._heap = []
+        self._dates = {}
+        self.load()
+
+    def load(self):
+        """
+        (Re)load the heap from the database. Rows come back sorted, which is already a valid heap.
+        """
+        self._heap = [DueEntry(*row) for row in self.storage.load_due_dates()]
+        self._dates = {entry.habit_id: entry.next_completion_date for entry in self._heap}
+
+    def _is_current(self, entry):
+        return self._dates.get(entry.habit_id) == entry.next_completion_date
+
+    def _compact(self):
+        # Rebuild once stale entries outnumber current ones
+        if len(self._heap) > 2 * len(self._dates):
+            self._heap = [DueEntry(date, habit_id) for habit_id, date in self._dates.items()]
+            heapq.heapify(self._heap)
+        while self._heap and not self._is_current(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def push(self, habit_id, next_completion_date):
+        """
+        Add a habit or move it to its new next completion date.
+        :param habit_id: The ID of the habit.
+        :param next_completion_date: Its next completion date; None removes the habit.
+        """
+        if next_completion_date is None:
+            self.remove(habit_id)
+            return
+        if self._dates.get(habit_id) == next_completion_date:
+            return
+        self._dates[habit_id] = next_completion_date
+        heapq.heappush(self._heap, DueEntry(next_completion_date, habit_id))
+        self._compact()
+
+    def remove(self, habit_id):
+        """
+        :param habit_id: The ID of the habit to drop, e.g. after it was deleted.
+        """
+        if self._dates.pop(habit_id, None) is not None:
+            self._compact()
+
+    def clear(self):
+        self._heap = []
+        self._dates = {}
+
+    def get(self, habit_id):
+        """
+        :return: The habit's next completion date, or None if it is not queued.
+        """
+        return self._dates.get(habit_id)
+
+    def __contains__(self, habit_id):
+        return habit_id in self._dates
+
+    def __len__(self):
+        return len(self._dates)
+
+    def due_now(self, now=None):
+        """
+        Habits whose next completion date has been reached, overdue ones included.
+        Only the entries returned and their direct children in the heap are visited.
+
+        :param now: Optional reference time, defaults to the current time.
+        :return: A list of DueEntry tuples, earliest first.
+        """
+        now = now or datetime.now()
+        due = []
+        pending = [0] if self._heap else []
+        while pending:
+            index = pending.pop()
+            entry = self._heap[index]
+            if entry.next_completion_date > now:
+                continue
+            if self._is_current(entry):
+                due.append(entry)
+            pending.extend(child for child in (2 * index + 1, 2 * index + 2) if child < len(self._heap))
+        due.sort()
+        return due
+
+    def next_due(self, k=1):
+        """
+        The `k` habits due soonest, found by walking the heap without popping it.
+
+        :param k: Number of habits to return.
+        :return: A list of at most `k` DueEntry tuples, earliest first.
+        """
+        found = []
+        candidates = [(self._heap[0], 0)] if self._heap else []
+        while candidates and len(found) < k:
+            entry, index = heapq.heappop(candidates)
+            if self._is_current(entry):
+                found.append(entry)
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(self._heap):
+                    heapq.heappush(candidates, (self._heap[child], child))
+        return found
+
+    def due_between(self, start, end):
+        """
+        Habits due within a time window, e.g. for upcoming reminders. The heap cannot answer
+        a range without visiting everything due before `start`, so this is a range scan of
+        the next_completion_date index instead.
+
+        :param start: Start of the window, inclusive; None for no lower bound.
+        :param end: End of the window, inclusive.
+        :return: A list of DueEntry tuples, earliest first.
+        """
+        return [DueEntry(*row) for row in self.storage.load_due_between(start, end)]
@@ -0,0 +1,85 @@
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.orm import scoped_session, sessionmaker
+from src.db import StorageComponent, create_db_engine, initialize_db
+
+
+class ShardRouter:
+    """
+    Maps users to database shards by a stable hash of their user ID.
+    Each shard has its own engine and scoped session registry.
+    """
+
+    def __init__(self, urls, config=None):
+        """
+        :param urls: Database URLs of the shards; their order defines the mapping, so it must not change.
+        :param config: Optional engine settings applied to every shard, see load_database_config().
+        """
+        if not urls:
+            raise ValueError("At least one shard URL is required.")
+        self.engines = [create_db_engine({**(config or {}), "url": url}) for url in urls]
+        self.sessions = [scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
+                         for engine in self.engines]
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a router from the comma-separated DATABASE_SHARD_URLS environment variable.
+        :return: A ShardRouter, or None if the variable is not set.
+        """
+        urls = [url.strip() for url in os.getenv("DATABASE_SHARD_URLS", "").split(",") if url.strip()]
+        return cls(urls) if urls else None
+
+    def shard_for(self, user_id):
+        """
+        :param user_id: The user's ID.
+        :return: The index of the shard holding the user's data.
+        """
+        # crc32 rather than hash(), which is salted per process for strings
+        return zlib.crc32(str(user_id).encode()) % len(self.engines)
+
+    def engine_for(self, user_id):
+        return self.engines[self.shard_for(user_id)]
+
+    def session_for(self, user_id):
+        return self.sessions[self.shard_for(user_id)]
+
+    def storage_for(self, user_id):
+        """
+        :return: A StorageComponent scoped to the user on the user's shard.
+        """
+        return StorageComponent(user_id=user_id, router=self)
+
+    def initialize(self):
+        """
+        Create or upgrade the schema on every shard.
+        """
+        for engine in self.engines:
+            initialize_db(engine)
+
+    def fan_out(self, operation, max_workers=None):
+        """
+        Run `operation` against every shard in parallel.
+
+        :param operation: Function taking an unscoped StorageComponent for one shard.
+        :param max_workers: Optional thread limit, one thread per shard by default.
+        :return: The results of `operation`, in shard order.
+        """
+        def run(shard):
+            storage = StorageComponent(self.engines[shard], self.sessions[shard])
+            try:
+                return operation(storage)
+            finally:
+                storage.close()
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(self.engines)) as executor:
+            return list(executor.map(run, range(len(self.engines))))
+
+    def dispose(self):
+        """
+        Close every shard's sessions and connections.
+        """
+        for session, engine in zip(self.sessions, self.engines):
+            session.remove()
+            engine.dispose()
@@ -0,0 +1,332 @@
+import mmap
+import os
+import struct
+from collections import namedtuple
+from datetime import datetime, timedelta
+from src.models import Habit
+
+
+SNAPSHOT_PATH = "habit_snapshot.bin"
+MAGIC = b"HSNP"
+VERSION = 1
+# magic, version, build ID, habit count, latest habit update, highest task ID
+HEADER = struct.Struct("<4sHxxqqqq")
+# id, name offset, name length, periodicity code, flags, current streak,
+# longest streak, next completion date, latest task ID
+RECORD = struct.Struct("<qQIBBiiqq")
+# The names file starts with the build ID of the records file it belongs to
+NAMES_HEADER = struct.Struct("<q")
+# Periodicity codes are indexes into this tuple; only append to it
+PERIODICITIES = (None, "daily", "weekly", "monthly")
+# Any other periodicity, e.g. "every 3 days", is stored after the name, separated by a NUL byte
+CUSTOM_PERIODICITY = 255
+DELETED = 1
+NO_DATE = -2 ** 63
+EPOCH = datetime(1970, 1, 1)
+
+HabitRecord = namedtuple("HabitRecord", [
+    "id", "name", "periodicity", "current_streak", "longest_streak", "next_completion_date", "latest_task_id"])
+
+
+def _encode_date(value):
+    return NO_DATE if value is None else (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _decode_date(value):
+    return None if value == NO_DATE else EPOCH + timedelta(microseconds=value)
+
+
+def _label(habit):
+    """
+    :return: The bytes stored in the names file for a habit.
+    """
+    name = (habit.name or "").encode()
+    if habit.periodicity in PERIODICITIES:
+        return name
+    return name + b"\0" + habit.periodicity.encode()
+
+
+def _encode_stamp(stamp):
+    habit_count, updated_at, max_task_id = stamp
+    return habit_count, _encode_date(updated_at), max_task_id or 0
+
+
+class HabitSnapshot:
+    """
+    Memory-mapped binary copy of every habit's hot state, so the CLI can list habits
+    at startup without loading them through the ORM.
+
+    Two files make up a snapshot: `path` holds a header followed by fixed-width records
+    sorted by habit ID, looked up by binary search; `path + ".names"` holds the habit names,
+    append-only, which the records point into. Writes update single records in place.
+
+    The snapshot stands in for HabitManager's habit list: iterating it yields HabitRecord
+    tuples, and `append`, `extend`, `remove` and `clear` keep it in step with the manager.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        """
+        :param path: Path of the records file; it and the names file are created by rebuild().
+        """
+        self.path = path
+        self.names_path = path + ".names"
+        self._file = None
+        self._names_file = None
+        self._records = None
+        self._names = None
+        self._map()
+
+    @classmethod
+    def load(cls, storage_component, path=SNAPSHOT_PATH):
+        """
+        Open the snapshot at `path`, rebuilding it first if it is missing or
+        the database has been written since it was last updated.
+
+        :param storage_component: Storage component the snapshot mirrors.
+        :param path: Path of the records file.
+        :return: A current HabitSnapshot.
+        """
+        snapshot = cls(path)
+        if not snapshot.is_current(storage_component):
+            snapshot.rebuild(storage_component)
+        return snapshot
+
+    def _map(self):
+        self.close()
+        if not (os.path.exists(self.path) and os.path.exists(self.names_path)):
+            return
+        self._file = open(self.path, "r+b")
+        self._names_file = open(self.names_path, "rb")
+        if os.path.getsize(self.path) < HEADER.size or os.path.getsize(self.names_path) < NAMES_HEADER.size:
+            return
+        self._records = mmap.mmap(self._file.fileno(), 0)
+        self._names = mmap.mmap(self._names_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """
+        Unmap and close the snapshot files.
+        """
+        for resource in (self._records, self._names, self._file, self._names_file):
+            if resource is not None:
+                resource.close()
+        self._records = self._names = self._file = self._names_file = None
+
+    def _header(self):
+        return HEADER.unpack_from(self._records, 0)
+
+    def is_valid(self):
+        """
+        :return: Whether both files exist, belong together and are not truncated.
+        """
+        if self._records is None:
+            return False
+        magic, version, build_id, _, _, _ = self._header()
+        return (magic == MAGIC and version == VERSION
+                and NAMES_HEADER.unpack_from(self._names, 0)[0] == build_id
+                and (len(self._records) - HEADER.size) % RECORD.size == 0)
+
+    def is_current(self, storage_component):
+        """
+        :param storage_component: Storage component the snapshot mirrors.
+        :return: Whether the snapshot is valid and reflects the latest writes to the database.
+        """
+        if not self.is_valid():
+            return False
+        return self._header()[3:] == _encode_stamp(storage_component.load_snapshot_stamp())
+
+    def rebuild(self, storage_component):
+        """
+        Write a fresh snapshot from the database, streaming the habits table.
+        The new files replace the old ones only once they are complete.
+
+        :param storage_component: Storage component the snapshot mirrors.
+        """
+        stamp = _encode_stamp(storage_component.load_snapshot_stamp())
+        latest_task_ids = storage_component.load_latest_task_ids()
+        build_id = int.from_bytes(os.urandom(8), "little", signed=True)
+
+        with open(self.path + ".tmp", "wb") as records, open(self.names_path + ".tmp", "wb") as names:
+            records.write(HEADER.pack(MAGIC, VERSION, build_id, *stamp))
+            names.write(NAMES_HEADER.pack(build_id))
+            name_offset = NAMES_HEADER.size
+            for batch in storage_component.iter_rows(Habit):
+                for row in batch:
+                    label = _label(row)
+                    names.write(label)
+                    records.write(self._pack(row, name_offset, len(label), latest_task_ids.get(row.id, 0)))
+                    name_offset += len(label)
+
+        self.close()
+        # A crash between the two renames leaves files with different build IDs,
+        # which is_valid() rejects, so the snapshot is rebuilt on the next load
+        os.replace(self.names_path + ".tmp", self.names_path)
+        os.replace(self.path + ".tmp", self.path)
+        self._map()
+
+    @staticmethod
+    def _pack(habit, name_offset, name_length, latest_task_id, flags=0):
+        periodicity = PERIODICITIES.index(habit.periodicity) if habit.periodicity in PERIODICITIES \
+            else CUSTOM_PERIODICITY
+        return RECORD.pack(habit.id, name_offset, name_length, periodicity, flags,
+                           habit.current_streak or 0, habit.longest_streak or 0,
+                           _encode_date(habit.next_completion_date), latest_task_id or 0)
+
+    def _count(self):
+        return (len(self._records) - HEADER.size) // RECORD.size if self._records is not None else 0
+
+    def _unpack(self, index):
+        return RECORD.unpack_from(self._records, HEADER.size + index * RECORD.size)
+
+    def _id_at(self, index):
+        return struct.unpack_from("<q", self._records, HEADER.size + index * RECORD.size)[0]
+
+    def _find(self, habit_id):
+        """
+        :return: The index of the habit's record, or where it would be inserted.
+        """
+        low, high = 0, self._count()
+        while low < high:
+            middle = (low + high) // 2
+            if self._id_at(middle) < habit_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _record(self, index):
+        habit_id, name_offset, name_length, periodicity, flags, current_streak, longest_streak, \
+            next_completion_date, latest_task_id = self._unpack(index)
+        if flags & DELETED:
+            return None
+        name = self._names[name_offset:name_offset + name_length].decode()
+        if periodicity == CUSTOM_PERIODICITY:
+            name, periodicity = name.split("\0", 1)
+        else:
+            periodicity = PERIODICITIES[periodicity]
+        return HabitRecord(habit_id, name, periodicity, current_streak, longest_streak,
+                           _decode_date(next_completion_date), latest_task_id or None)
+
+    def get(self, habit_id):
+        """
+        :param habit_id: The ID of the habit.
+        :return: The habit's HabitRecord, or None if it is not in the snapshot.
+        """
+        index = self._find(habit_id)
+        if index < self._count() and self._id_at(index) == habit_id:
+            return self._record(index)
+        return None
+
+    def __contains__(self, habit_id):
+        return self.get(habit_id) is not None
+
+    def __iter__(self):
+        for index in range(self._count()):
+            record = self._record(index)
+            if record is not None:
+                yield record
+
+    def __len__(self):
+        return self._header()[3] if self._records is not None else 0
+
+    def _update_header(self, count_delta=0, updated_at=None, max_task_id=None):
+        magic, version, build_id, count, stamp_updated_at, stamp_max_task_id = self._header()
+        if updated_at is not None:
+            stamp_updated_at = max(stamp_updated_at, _encode_date(updated_at))
+        if max_task_id:
+            stamp_max_task_id = max(stamp_max_task_id, max_task_id)
+        HEADER.pack_into(self._records, 0, magic, version, build_id, count + count_delta,
+                         stamp_updated_at, stamp_max_task_id)
+
+    def _append_name(self, name):
+        offset = os.path.getsize(self.names_path)
+        with open(self.names_path, "ab") as names:
+            names.write(name)
+        return offset
+
+    def upsert(self, habit, latest_task_id=None):
+        """
+        Add or update a habit's record. Existing records are rewritten in place;
+        a name is only appended to the names file when it changed.
+
+        :param habit: The habit, with its ID set.
+        :param latest_task_id: ID of the habit's latest task; None keeps the recorded one.
+        """
+        if not self.is_valid():
+            raise ValueError("The snapshot has not been built; call rebuild() first.")
+        name = _label(habit)
+        index = self._find(habit.id)
+        exists = index < self._count() and self._id_at(index) == habit.id
+
+        count_delta = 1
+        name_offset = None
+        if exists:
+            _, old_offset, old_length, _, flags, _, _, _, old_latest_task_id = self._unpack(index)
+            count_delta = 1 if flags & DELETED else 0
+            if self._names[old_offset:old_offset + old_length] == name:
+                name_offset = old_offset
+            if latest_task_id is None:
+                latest_task_id = old_latest_task_id
+        if name_offset is None:
+            name_offset = self._append_name(name)
+        record = self._pack(habit, name_offset, len(name), latest_task_id)
+
+        position = HEADER.size + index * RECORD.size
+        if exists:
+            self._records[position:position + RECORD.size] = record
+        else:
+            # New habits normally have the highest ID, so this is an append
+            tail = self._records[position:]
+            self._records.close()
+            self._file.seek(position)
+            self._file.write(record + tail)
+            self._file.flush()
+        self._map()
+        self._update_header(count_delta, getattr(habit, "updated_at", None), latest_task_id)
+
+    def remove(self, habit):
+        """
+        Drop a habit's record by flagging it as deleted.
+        :param habit: The habit, or its ID.
+        """
+        habit_id = getattr(habit, "id", habit)
+        index = self._find(habit_id)
+        if index >= self._count() or self._id_at(index) != habit_id:
+            return
+        record = list(self._unpack(index))
+        if record[4] & DELETED:
+            return
+        record[4] |= DELETED
+        RECORD.pack_into(self._records, HEADER.size + index * RECORD.size, *record)
+        self._update_header(count_delta=-1)
+
+    def refresh(self, storage_component, habit_id):
+        """
+        Re-read one habit and its latest task from the database into the snapshot.
+        :param storage_component: Storage component the snapshot mirrors.
+        :param habit_id: The ID of the habit.
+        """
+        habit = storage_component.load_habit(habit_id, refresh=True)
+        if habit is None:
+            self.remove(habit_id)
+            return
+        latest_task = storage_component.load_latest_task(habit_id)
+        self.upsert(habit, latest_task.id if latest_task else 0)
+
+    def append(self, habit):
+        self.upsert(habit)
+
+    def extend(self, habits):
+        for habit in habits:
+            self.upsert(habit)
+
+    def clear(self):
+        """
+        Drop every record, e.g. after the habits table has been cleared.
+        """
+        build_id = self._header()[2]
+        self.close()
+        with open(self.path, "wb") as records, open(self.names_path, "wb") as names:
+            records.write(HEADER.pack(MAGIC, VERSION, build_id, 0, NO_DATE, 0))
+            names.write(NAMES_HEADER.pack(build_id))
+        self._map()
+
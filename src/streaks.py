@@ -0,0 +1,118 @@
+"""
+Recompute every habit's current and longest streak from its task history.
+
+Run from the project root:
+    python -m src.streaks
+
+The streaks are normally updated one completion at a time; this rebuilds them
+from the tasks, hot and archived, and writes back the ones that drifted.
+"""
+import argparse
+from datetime import date
+import numpy as np
+from src.db import BULK_CHUNK_SIZE, STREAM_BATCH_SIZE, StorageComponent
+
+
+# Columns of the arrays returned by load_task_arrays()
+HABIT_ID, TASK_ID, COMPLETED, COMPLETED_DAY, EXPECTED_DAY = range(5)
+
+
+def load_task_arrays(storage_component, batch_size=STREAM_BATCH_SIZE):
+    """
+    Read the task history into one int64 array, sorted by habit and deadline.
+
+    :param storage_component: Storage component to read from.
+    :param batch_size: Number of rows fetched at a time.
+    :return: An (n, 5) array with the columns HABIT_ID, TASK_ID, COMPLETED, COMPLETED_DAY and EXPECTED_DAY.
+    """
+    batches = [np.array(batch, dtype=np.int64) for batch in storage_component.iter_task_days(batch_size)]
+    if not batches:
+        return np.empty((0, 5), dtype=np.int64)
+    tasks = np.concatenate(batches)
+    order = np.lexsort((tasks[:, TASK_ID], tasks[:, EXPECTED_DAY], tasks[:, HABIT_ID]))
+    return tasks[order]
+
+
+def compute_streaks(tasks, today=None):
+    """
+    Compute the streaks of every habit in `tasks` with run-length operations over the whole array.
+
+    Completions count the way Habit.apply_completion() does: an on-time completion extends the
+    streak and a late one starts a new streak at 1. A task whose deadline passed uncompleted
+    breaks the streak; one still open is ignored.
+
+    :param tasks: Array as returned by load_task_arrays().
+    :param today: Day ordinal that deadlines are compared with, defaults to today.
+    :return: A (habit_ids, current_streaks, longest_streaks) tuple of arrays, one entry per habit.
+    """
+    today = today if today is not None else date.today().toordinal()
+    completed = tasks[:, COMPLETED].astype(bool)
+    tasks = tasks[completed | (tasks[:, EXPECTED_DAY] < today)]
+    if not len(tasks):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    habit_ids = tasks[:, HABIT_ID]
+    completed = tasks[:, COMPLETED].astype(bool)
+    late = completed & (tasks[:, COMPLETED_DAY] > tasks[:, EXPECTED_DAY])
+
+    first = np.ones(len(tasks), dtype=bool)
+    first[1:] = habit_ids[1:] != habit_ids[:-1]
+    starts = np.flatnonzero(first)
+    ends = np.append(starts[1:], len(tasks)) - 1
+
+    # A run starts at each habit's first task, at each missed task and at each late completion.
+    # Within a run, the streak after a task is its offset from the run's start, plus one if the
+    # run started with a completion rather than a miss.
+    positions = np.arange(len(tasks))
+    run_starts = np.maximum.accumulate(np.where(first | ~completed | late, positions, 0))
+    streaks = positions - run_starts + completed[run_starts]
+
+    current = np.where(completed[ends], streaks[ends], 0)
+    longest = np.maximum.reduceat(streaks, starts)
+    return habit_ids[starts], current, longest
+
+
+def recompute_streaks(storage_component, today=None, batch_size=STREAM_BATCH_SIZE, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Recompute the streaks of every habit and write back those that differ from the stored ones.
+    Habits without completed or missed tasks get streaks of 0.
+
+    :param storage_component: Storage component to read from and write to.
+    :param today: Day ordinal that deadlines are compared with, defaults to today.
+    :param batch_size: Number of task rows fetched at a time.
+    :param chunk_size: Number of habits updated per transaction.
+    :return: The number of corrected habits.
+    """
+    habit_ids, current, longest = compute_streaks(load_task_arrays(storage_component, batch_size), today)
+
+    stored = np.array([(habit_id, current_streak or 0, longest_streak or 0)
+                       for habit_id, current_streak, longest_streak in storage_component.load_streaks()],
+                      dtype=np.int64).reshape(-1, 3)
+    expected = np.zeros_like(stored)
+    expected[:, 0] = stored[:, 0]
+    # Tasks of habits that no longer exist are dropped here
+    found = np.isin(habit_ids, stored[:, 0])
+    rows = np.searchsorted(stored[:, 0], habit_ids[found])
+    expected[rows, 1] = current[found]
+    expected[rows, 2] = longest[found]
+
+    drifted = expected[(expected != stored).any(axis=1)]
+    return storage_component.save_streaks(drifted.tolist(), chunk_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute habit streaks from the task history.")
+    parser.add_argument("--batch-size", type=int, default=STREAM_BATCH_SIZE)
+    args = parser.parse_args()
+
+    storage = StorageComponent()
+    try:
+        corrected = recompute_streaks(storage, batch_size=args.batch_size)
+    finally:
+        storage.close()
+    print(f"Corrected the streaks of {corrected} habits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Nightly sweep resetting the streaks of habits whose deadline passed uncompleted.
+
+Run from the project root, e.g. nightly:
+    python -m src.sweeper
+"""
+import argparse
+import time
+from collections import namedtuple
+from datetime import datetime
+from src.db import StorageComponent
+
+
+SweepResult = namedtuple("SweepResult", ["habits", "tasks", "seconds"])
+
+
+def sweep_overdue_habits(storage_component, now=None):
+    """
+    Reset the streaks of overdue habits and roll them forward to a new task,
+    see StorageComponent.sweep_overdue().
+
+    :param storage_component: Storage component to sweep through.
+    :param now: Optional reference time, defaults to the current time.
+    :return: A SweepResult with the number of reset habits, of new tasks, and the duration in seconds.
+    """
+    started = time.perf_counter()
+    habits, tasks = storage_component.sweep_overdue(now or datetime.now())
+    return SweepResult(habits, tasks, time.perf_counter() - started)
+
+
+def main():
+    argparse.ArgumentParser(description="Reset the streaks of overdue habits.").parse_args()
+
+    storage = StorageComponent()
+    try:
+        result = sweep_overdue_habits(storage)
+    finally:
+        storage.close()
+    print(f"Reset {result.habits} habits and created {result.tasks} tasks in {result.seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,13 @@
 import datetime
+from operator import attrgetter
+from .indexed import IndexedCollection
+from .periodicity import next_deadline, next_deadlines
+
+
+# Number of recent tasks TaskManager keeps in memory
+TASK_WINDOW_SIZE = 500
+# Secondary indexes of a manager's task list
+TASK_INDEXES = {"habit_id": attrgetter("habit_id")}
 
 
 class Task:
@@ -15,6 +24,20 @@ class Task:
         self.completed_on = completed_on
         self.expected_completion_by = expected_completion_by
 
+    @property
+    def completed_day(self):
+        """
+        Day ordinal (date.toordinal()) of the completion date.
+        """
+        return self.completed_on.toordinal() if self.completed_on else None
+
+    @property
+    def expected_day(self):
+        """
+        Day ordinal (date.toordinal()) of the expected completion date.
+        """
+        return self.expected_completion_by.toordinal() if self.expected_completion_by else None
+
     def record_habit_completion(self, habit_id, next_completion_date, current_streak, longest_streak):
         """
         Records the completion of a habit.
@@ -38,64 +61,79 @@ class Task:
         self.completed_on = date
         return self.completed_on
 
-    def calculate_expected_completion_by(self, habit_periodicity, last_task_completion_date=None):
+    def calculate_expected_completion_by(self, habit_periodicity, last_task_completion_date=None, now=None,
+                                         origin=None):
         """
-        Calculate the expected completion date for a task based on the habit's periodicity.
+        Calculate the expected completion date for a task based on the habit's periodicity, see src.periodicity.
 
         :param habit_periodicity: The periodicity of the habit (e.g., daily, weekly).
         :param last_task_completion_date: The completion date of the last task for the habit.
+        :param now: Optional reference time, defaults to the current time.
+        :param origin: Optional creation time of the habit, which monthly deadlines keep the day of.
         :return: The expected completion date.
         """
-        now = datetime.datetime.now()
-
-        # raise a value error if the wrong periodicity is entered
-        if habit_periodicity not in ['daily', 'weekly']:
-            raise ValueError(
-                "Unsupported periodicity. Use 'daily' or 'weekly'.")
-
-        # If there is no last task completion date, the expected completion date is today at the end of the day
-        if not last_task_completion_date:
-            return now.replace(hour=23, minute=59, second=59, microsecond=0)
-
-        base_date = now
-
-        if habit_periodicity == 'daily':
-            return (base_date + datetime.timedelta(days=1)).replace(hour=23, minute=59, second=59, microsecond=0)
-
-        elif habit_periodicity == 'weekly':
-            # Weekday of the last task completion date
-            last_task_completion_date_weekday = last_task_completion_date.weekday()
-            now_weekday = now.weekday()  # Current weekday (today)
-
-            # If the current weekday matches the base weekday
-            if now_weekday == last_task_completion_date_weekday:
-                return (now + datetime.timedelta(weeks=1)).replace(hour=23, minute=59, second=59, microsecond=0)
-            else:
-                # Calculate days difference to the next occurrence of the base weekday
-                days_difference = (
-                    last_task_completion_date_weekday - now_weekday + 7) % 7
-                next_closest_date = now + \
-                    datetime.timedelta(days=days_difference)
-
-                # If the closest date is within the same week as the current date, choose that closest date
-                if next_closest_date <= now + datetime.timedelta(days=6 - now_weekday):
-                    # meaning that the time completion time had elapsed, but the user went ahead to complete the habit in the current week, hence the following week should be the next completion date
-                    return (next_closest_date + datetime.timedelta(weeks=1)).replace(hour=23, minute=59, second=59, microsecond=0)
-                else:
-                    return next_closest_date.replace(hour=23, minute=59, second=59, microsecond=0)
+        return next_deadline(habit_periodicity, last_task_completion_date, now or datetime.datetime.now(), origin)
 
 
 class TaskManager:
     """
     Manages a collection of tasks, allowing for the creation, updating, and deletion of tasks.
-    Must be initialized with a storage component
+    Must be initialized with a storage component.
+    Only the `window_size` most recent tasks are kept in memory; older tasks are looked up in storage.
     """
 
-    def __init__(self, storage_component):
+    def __init__(self, storage_component, window_size=TASK_WINDOW_SIZE):
         self.storage = storage_component
-        self.tasks = self.storage.load_tasks()
+        self.window_size = window_size
+        # The window is loaded from storage on first access; until then it only holds the created tasks
+        self._tasks = IndexedCollection((), TASK_INDEXES, maxlen=window_size)
+        self._loaded = False
+
+    @property
+    def tasks(self):
+        if not self._loaded:
+            tasks = IndexedCollection(self.storage.load_recent_tasks(self.window_size), TASK_INDEXES,
+                                      maxlen=self.window_size)
+            # Tasks created before the first access are normally part of the result already
+            tasks.extend(task for task in self._tasks if task not in tasks)
+            self._tasks = tasks
+            self._loaded = True
+        return self._tasks
+
+    @tasks.setter
+    def tasks(self, tasks):
+        # Indexed by ID and habit ID; the oldest task is dropped once the window is full
+        if isinstance(tasks, IndexedCollection):
+            self._tasks = tasks
+        else:
+            self._tasks = IndexedCollection(tasks, TASK_INDEXES, maxlen=self.window_size)
+        self._loaded = True
 
-    def create_task(self, habit_id, habit_periodicity):
+    def refresh(self):
+        """
+        Drop the task window, so it is loaded again from storage on next access.
+        """
+        self._tasks = IndexedCollection((), TASK_INDEXES, maxlen=self.window_size)
+        self._loaded = False
+
+    def get_tasks(self, task_ids):
+        """
+        Tasks by ID, from the window when they are in it and from storage otherwise,
+        without loading the window.
+        :param task_ids: The IDs of the tasks.
+        :return: The tasks that exist, in the order of `task_ids`.
+        """
+        task_ids = list(task_ids)
+        by_id = {task.id: task for task in map(self._tasks.get, task_ids) if task is not None}
+        missing = [task_id for task_id in task_ids if task_id not in by_id]
+        if missing:
+            by_id.update((task.id, task) for task in self.storage.load_tasks(ids=missing))
+        return [by_id[task_id] for task_id in task_ids if task_id in by_id]
+
+    def _find_task(self, task_id):
+        return next(iter(self.get_tasks([task_id])), None)
+
+    def create_task(self, habit_id, habit_periodicity, origin=None):
         """
         Create a new task and add it to the task list.
         :param habit_id: The ID of the habit associated with the task.
@@ -110,43 +148,141 @@ class TaskManager:
         Create a new task and add it to the task list.
         :param habit_id: The ID of the habit associated with the task.
         :param habit_periodicity: The periodicity of the habit (e.g., daily, weekly).
-        :param is_initial_task: Whether this is the first task for the habit.
+        :param origin: Optional creation time of the habit, see Task.calculate_expected_completion_by().
         """
         # checking if there is an existing task for the habit already, meaning this is an existing habit
-        tasks_for_habit = self.storage.load_tasks_for_habit(habit_id)
-        last_task = tasks_for_habit[-1] if tasks_for_habit else None
+        last_task = self.storage.load_latest_task(habit_id)
 
         # print(last_task.expected_completion_by)
         # checking the expected completion date for the latest task record
         last_task_expected_completion_date = last_task.expected_completion_by if last_task else None
         expected_completion_date = Task(habit_id).calculate_expected_completion_by(
-            habit_periodicity, last_task_expected_completion_date)
+            habit_periodicity, last_task_expected_completion_date, origin=origin)
         new_task = Task(habit_id=habit_id,
                         expected_completion_by=expected_completion_date)
         created_task = self.storage.save_task(new_task)
-        self.tasks.append(created_task)
+        self._tasks.append(created_task)
         return created_task
 
+    def create_tasks(self, habit_specs):
+        """
+        Create the next task for several habits in bulk and add them to the task list.
+        :param habit_specs: Iterable of (habit_id, habit_periodicity) pairs.
+        :return: The created tasks, in input order.
+        """
+        habit_specs = list(habit_specs)
+        if not habit_specs:
+            return []
+        last_deadlines = []
+        for habit_id, _ in habit_specs:
+            last_task = self.storage.load_latest_task(habit_id)
+            last_deadlines.append(last_task.expected_completion_by if last_task else None)
+        # All deadlines in one vectorized call
+        deadlines = next_deadlines([periodicity for _, periodicity in habit_specs], last_deadlines,
+                                   datetime.datetime.now())
+        new_tasks = [Task(habit_id=habit_id, expected_completion_by=deadline.item())
+                     for (habit_id, _), deadline in zip(habit_specs, deadlines)]
+
+        task_ids = self.storage.save_tasks(new_tasks)
+        created_by_id = {task.id: task for task in self.storage.load_tasks(ids=task_ids)}
+        created_tasks = [created_by_id[task_id] for task_id in task_ids]
+        self._tasks.extend(created_tasks)
+        return created_tasks
+
     def update_task(self, task_id, **kwargs):
         """
         Update an existing task in the task list.
         :param task_id: The ID of the task to be updated.
         :param kwargs: Key-value pairs of attributes to update.
         """
-        task = next((t for t in self.tasks if t.id == task_id), None)
+        task = self._find_task(task_id)
         if task:
             for key, value in kwargs.items():
                 if hasattr(task, key):
                     setattr(task, key, value)
             self.storage.save_task(task)
+            self._tasks.reindex(task)
 
     def delete_task(self, task_id):
         """
         Delete a task from the task list.
         :param task_id: The ID of the task to be deleted.
         """
-        task = next((t for t in self.tasks if t.id == task_id), None)
+        task = self._find_task(task_id)
+        if task:
+            self._tasks.discard(task_id)
+            self.storage.delete_task(task_id)
+
+    def find_tasks(self, habit_id):
+        """
+        :param habit_id: The ID of the habit.
+        :return: The habit's tasks among the tasks kept in memory, oldest first.
+        """
+        return self.tasks.find("habit_id", habit_id)
+
+
+class AsyncTaskManager:
+    """
+    Asyncio counterpart of TaskManager.
+    Must be initialized with an AsyncStorageComponent; call `load()` to fill the task list.
+    """
+
+    def __init__(self, storage_component):
+        self.storage = storage_component
+        self.tasks = []
+
+    @property
+    def tasks(self):
+        return self._tasks
+
+    @tasks.setter
+    def tasks(self, tasks):
+        self._tasks = tasks if isinstance(tasks, IndexedCollection) else IndexedCollection(tasks, TASK_INDEXES)
+
+    async def load(self):
+        """
+        Loads the task list from storage.
+        """
+        self.tasks = await self.storage.load_tasks()
+        return self.tasks
+
+    async def create_task(self, habit_id, habit_periodicity, origin=None):
+        """
+        Create the next task for a habit and add it to the task list.
+        :param habit_id: The ID of the habit associated with the task.
+        :param habit_periodicity: The periodicity of the habit (e.g., daily, weekly).
+        :param origin: Optional creation time of the habit, see Task.calculate_expected_completion_by().
+        """
+        last_task = await self.storage.load_latest_task(habit_id)
+        last_task_expected_completion_date = last_task.expected_completion_by if last_task else None
+        expected_completion_date = Task(habit_id).calculate_expected_completion_by(
+            habit_periodicity, last_task_expected_completion_date, origin=origin)
+        new_task = Task(habit_id=habit_id,
+                        expected_completion_by=expected_completion_date)
+        created_task = await self.storage.save_task(new_task)
+        self.tasks.append(created_task)
+        return created_task
+
+    async def update_task(self, task_id, **kwargs):
+        """
+        Update an existing task in the task list.
+        :param task_id: The ID of the task to be updated.
+        :param kwargs: Key-value pairs of attributes to update.
+        """
+        task = self.tasks.get(task_id)
+        if task:
+            for key, value in kwargs.items():
+                if hasattr(task, key):
+                    setattr(task, key, value)
+            await self.storage.save_task(task)
+            self.tasks.reindex(task)
+
+    async def delete_task(self, task_id):
+        """
+        Delete a task from the task list.
+        :param task_id: The ID of the task to be deleted.
+        """
+        task = self.tasks.get(task_id)
         if task:
             self.tasks.remove(task)
-            self.storage.session.delete(task)
-            self.storage.session.commit()
+            await self.storage.delete_task(task_id)
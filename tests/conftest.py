@@ -1,12 +1,16 @@
 import pytest
 from datetime import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from src.db import StorageComponent
+from src.models import Base
 from src.habits import Habit, HabitManager
 from src.tasks import Task, TaskManager
 
 
 @pytest.fixture
 def mock_storage(mocker):
-    return mocker.Mock()
+    return mocker.MagicMock()
 
 
 @pytest.fixture
@@ -28,8 +32,10 @@ def mock_task_manager(mocker):
 
 @pytest.fixture
 def mock_task(mocker):
+    now = datetime.now()
     return mocker.Mock(
-        expected_completion_by=datetime.now(),
+        expected_completion_by=now,
+        expected_day=now.toordinal(),
         habit_id=1
     )
 
@@ -54,3 +60,30 @@ def mock_datetime(mocker):
     mock = mocker.patch('datetime.datetime', autospec=True)
     mock.now.return_value = datetime(2023, 1, 1, 12, 0, 0)
     return mock
+
+
+@pytest.fixture
+def sqlite_engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def storage(sqlite_engine):
+    session = sessionmaker(bind=sqlite_engine, expire_on_commit=False)()
+    yield StorageComponent(sqlite_engine, session)
+    session.close()
+
+
+@pytest.fixture
+def statements(sqlite_engine):
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement.split()[0].upper())
+
+    event.listen(sqlite_engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(sqlite_engine, "before_cursor_execute", record)
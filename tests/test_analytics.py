@@ -1,5 +1,7 @@
 from datetime import datetime
 from src.analytics import (
+    completion_rates,
+    completions_by_month_for_given_habit,
     list_habits,
     list_habits_periodicity,
     longest_streak_from_habits,
@@ -52,3 +54,35 @@ def test_longest_streak_for_given_habit(mocker, mock_storage):
     result = longest_streak_for_given_habit("Exercise")
 
     assert result == "The longest streak for habit 'Exercise' is 15."
+
+
+def test_completions_by_month_for_given_habit(mocker, mock_storage):
+    habit = Habit("Exercise", "daily")
+    habit.id = 1
+    mock_storage.load_habits.return_value = [habit]
+    mock_storage.load_monthly_completions.return_value = [
+        mocker.Mock(month="2024-01", completed_count=20, on_time_count=18)]
+    mocker.patch('src.analytics.StorageComponent', return_value=mock_storage)
+
+    assert completions_by_month_for_given_habit("Exercise") == [("2024-01", 20, 18)]
+    mock_storage.load_monthly_completions.assert_called_once_with(1)
+
+
+def test_completion_rates(mocker, mock_storage):
+    mock_storage.load_completion_rates.return_value = [
+        mocker.Mock(name="Exercise", on_time_rate=0.5), mocker.Mock(name="Read", on_time_rate=0.9)]
+    mocker.patch('src.analytics.StorageComponent', return_value=mock_storage)
+
+    assert [row.on_time_rate for row in completion_rates()] == [0.9, 0.5]
+
+
+def test_analytics_query_habits_once(mocker, mock_storage):
+    mock_storage.load_habits.return_value = [Habit("Exercise", "daily", longest_streak=3)]
+    mocker.patch('src.analytics.StorageComponent', return_value=mock_storage)
+
+    list_habits()
+    mock_storage.load_habits.assert_called_once_with()
+
+    mock_storage.load_habits.reset_mock()
+    longest_streak_for_given_habit("Exercise")
+    mock_storage.load_habits.assert_called_once_with(name="Exercise")
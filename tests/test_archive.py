@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+from src.archive import archive_old_tasks
+from src.habits import Habit
+from src.models import ArchivedTask, TaskRollup
+from src.tasks import Task
+
+
+def completed_task(habit_id, expected_completion_by, days_late=0):
+    return Task(habit_id=habit_id, completed=True,
+                completed_on=expected_completion_by + timedelta(days=days_late),
+                expected_completion_by=expected_completion_by)
+
+
+def test_archive_moves_old_completed_tasks_and_rolls_them_up(storage):
+    habit_id, other_habit_id = storage.save_habits([Habit("Exercise", "daily"), Habit("Read", "weekly")])
+    deadline = datetime(2024, 1, 30, 23, 59, 59)
+    storage.save_tasks([
+        completed_task(habit_id, deadline),
+        completed_task(habit_id, deadline + timedelta(days=1), days_late=1),
+        completed_task(habit_id, deadline + timedelta(days=2)),
+        completed_task(habit_id, deadline + timedelta(days=200)),  # within the horizon
+        Task(habit_id=habit_id, expected_completion_by=deadline + timedelta(days=201)),
+        completed_task(other_habit_id, deadline),  # the habit's latest task
+    ])
+    history_before = storage.load_task_history(habit_id)
+
+    assert archive_old_tasks(storage, horizon_days=90, now=deadline + timedelta(days=210), batch_size=2) == 3
+
+    assert len(storage.load_tasks()) == 3
+    assert storage.session.query(ArchivedTask).count() == 3
+    assert storage.load_task_history(habit_id) == history_before
+    rollups = {(rollup.month, rollup.completed_count, rollup.on_time_count)
+               for rollup in storage.session.query(TaskRollup)}
+    assert rollups == {("2024-01", 2, 1), ("2024-02", 1, 1)}
+    assert [tuple(row) for row in storage.load_monthly_completions(habit_id)] == [
+        (habit_id, "2024-01", 2, 1), (habit_id, "2024-02", 1, 1), (habit_id, "2024-08", 1, 1)]
+
+    assert archive_old_tasks(storage, horizon_days=90, now=deadline + timedelta(days=210)) == 0
+
+
+def test_delete_habit_removes_archived_tasks(storage):
+    habit_id = storage.save_habit(Habit("Exercise", "daily")).id
+    deadline = datetime(2024, 1, 1, 23, 59, 59)
+    storage.save_tasks([completed_task(habit_id, deadline), Task(habit_id=habit_id, expected_completion_by=deadline)])
+    archive_old_tasks(storage, horizon_days=0, now=deadline + timedelta(days=1))
+
+    storage.delete_habit(habit_id)
+
+    assert storage.load_task_history() == []
+    assert storage.session.query(TaskRollup).count() == 0
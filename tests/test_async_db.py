@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from src.async_db import AsyncStorageComponent
+from src.habits import AsyncHabitManager, Habit, COMPLETED_MESSAGE, NOT_DUE_MESSAGE
+from src.models import Base
+from src.tasks import AsyncTaskManager, Task
+
+
+@pytest.fixture
+def async_storage():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+
+    async def create_schema():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_schema())
+    yield AsyncStorageComponent(engine)
+    asyncio.run(engine.dispose())
+
+
+def test_save_and_load_habits(async_storage):
+    async def scenario():
+        habit = await async_storage.save_habit(Habit("Exercise", "daily"))
+        habit.current_streak = 3
+        await async_storage.save_habit(habit)
+        await async_storage.save_task(Task(habit_id=habit.id, expected_completion_by=datetime(2024, 1, 1)))
+        await async_storage.save_task(Task(habit_id=habit.id, expected_completion_by=datetime(2024, 1, 2)))
+        return (habit, await async_storage.load_habits(periodicity="daily"),
+                await async_storage.load_tasks_for_habit(habit.id),
+                await async_storage.load_latest_task(habit.id))
+
+    habit, habits, tasks, latest = asyncio.run(scenario())
+
+    assert [(h.id, h.current_streak) for h in habits] == [(habit.id, 3)]
+    assert len(tasks) == 2
+    assert latest.expected_completion_by == datetime(2024, 1, 2)
+
+
+def test_concurrent_completions(async_storage):
+    async def scenario():
+        habit_manager = AsyncHabitManager(async_storage)
+        task_manager = AsyncTaskManager(async_storage)
+        habits = [await habit_manager.create_habit(f"Habit {i}", "daily") for i in range(5)]
+        for habit in habits:
+            await task_manager.create_task(habit.id, habit.periodicity)
+
+        first = await asyncio.gather(*(habit_manager.mark_habit_completed(habit.id) for habit in habits))
+        second = await habit_manager.mark_habit_completed(habits[0].id)
+        return first, second, await async_storage.load_habits(), await async_storage.load_tasks()
+
+    first, second, habits, tasks = asyncio.run(scenario())
+
+    assert first == [COMPLETED_MESSAGE] * 5
+    assert second == NOT_DUE_MESSAGE
+    assert all(habit.current_streak == 1 for habit in habits)
+    assert len(tasks) == 10
+    assert sum(task.completed for task in tasks) == 5
+    assert all(task.expected_completion_by.date() == (datetime.now() + timedelta(days=1)).date()
+               for task in tasks if not task.completed)
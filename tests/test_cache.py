@@ -0,0 +1,46 @@
+from src.cache import QueryCache
+
+
+def test_get_or_load_counts_hits_and_misses():
+    cache = QueryCache()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return "value"
+
+    assert cache.get_or_load("key", loader) == "value"
+    assert cache.get_or_load("key", loader) == "value"
+    assert len(loads) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_entries_expire_after_ttl():
+    now = [0]
+    cache = QueryCache(ttl=10, clock=lambda: now[0])
+    cache.get_or_load("key", lambda: "old")
+
+    now[0] = 11
+
+    assert cache.get_or_load("key", lambda: "new") == "new"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(maxsize=2)
+    cache.get_or_load("a", lambda: 1)
+    cache.get_or_load("b", lambda: 2)
+    cache.get_or_load("a", lambda: 1)
+    cache.get_or_load("c", lambda: 3)
+
+    assert cache.get_or_load("a", lambda: "reloaded") == 1
+    assert cache.get_or_load("b", lambda: "reloaded") == "reloaded"
+
+
+def test_invalidate_with_predicate():
+    cache = QueryCache()
+    cache.get_or_load("daily", lambda: [1])
+    cache.get_or_load("weekly", lambda: [2])
+
+    assert cache.invalidate(lambda key, value: key == "daily") == 1
+    assert cache.get_or_load("daily", lambda: "reloaded") == "reloaded"
+    assert cache.get_or_load("weekly", lambda: "reloaded") == [2]
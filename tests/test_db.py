@@ -0,0 +1,405 @@
+import pytest
+import threading
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import object_session, scoped_session, sessionmaker
+from src.db import (
+    StorageComponent,
+    add_missing_columns,
+    backfill_task_days,
+    create_db_engine,
+    create_indexes,
+    create_search_index,
+    initialize_db,
+)
+from src.habits import COMPLETED, COMPLETED_MESSAGE, NOT_DUE, NOT_FOUND, Habit, HabitManager
+from src.tasks import Task
+
+
+def test_upgrade_existing_database():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE habits (id INTEGER PRIMARY KEY, name VARCHAR, periodicity VARCHAR, current_streak INTEGER, "
+            "longest_streak INTEGER, next_completion_date DATETIME, created_at DATETIME, updated_at DATETIME)"))
+        conn.execute(text(
+            "CREATE TABLE tasks (id INTEGER PRIMARY KEY, habit_id INTEGER REFERENCES habits (id), completed BOOLEAN, "
+            "completed_on DATETIME, expected_completion_by DATETIME, created_at DATETIME, updated_at DATETIME)"))
+        conn.execute(text("CREATE INDEX ix_tasks_expected_completion_by ON tasks (expected_completion_by)"))
+        conn.execute(text(
+            "INSERT INTO tasks (habit_id, completed, completed_on, expected_completion_by) "
+            "VALUES (1, 1, '2024-01-02 08:00:00.000000', '2024-01-01 23:59:59.000000')"))
+
+    assert add_missing_columns(engine) == [
+        "habits.user_id", "tasks.user_id", "tasks.completed_day", "tasks.expected_day"]
+    assert backfill_task_days(engine) == 2
+    create_indexes(engine)
+    initialize_db(engine)  # idempotent
+
+    inspector = inspect(engine)
+    habit_indexes = {index["name"] for index in inspector.get_indexes("habits")}
+    task_indexes = {index["name"]: index["column_names"] for index in inspector.get_indexes("tasks")}
+    assert {"ix_habits_name", "ix_habits_periodicity"} <= habit_indexes
+    assert task_indexes["ix_tasks_habit_id_expected_day"] == ["habit_id", "expected_day"]
+    assert "ix_tasks_expected_day" in task_indexes
+    assert "ix_tasks_expected_completion_by" not in task_indexes
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT completed_day, expected_day FROM tasks")).one() == (
+            date(2024, 1, 2).toordinal(), date(2024, 1, 1).toordinal())
+        # The completion was late, which the summary rebuilt on upgrade counts as a miss
+        assert conn.execute(text("SELECT completions, misses FROM habit_stats")).one() == (1, 1)
+
+
+def test_save_habits_inserts_and_updates_in_bulk(storage):
+    existing = Habit("Exercise", "daily")
+    existing.id = storage.save_habit(existing).id
+    existing.current_streak = 4
+
+    ids = storage.save_habits([Habit("Read", "weekly"), existing, Habit("Meditate", "daily")], chunk_size=2)
+
+    assert len(ids) == 3
+    assert ids[1] == existing.id
+    habits = {habit.id: habit for habit in storage.load_habits()}
+    assert habits[ids[0]].name == "Read"
+    assert habits[ids[1]].current_streak == 4
+    assert habits[ids[2]].name == "Meditate"
+
+
+def test_save_tasks_keeps_explicit_ids(storage):
+    ids = storage.save_tasks([Task(habit_id=1, expected_completion_by=datetime(2024, 1, 1))])
+    task = Task(habit_id=1, completed=True, expected_completion_by=datetime(2024, 1, 2))
+    task.id = 42
+
+    assert storage.save_tasks([task]) == [42]
+    assert {task.id for task in storage.load_tasks()} == {ids[0], 42}
+
+
+def test_save_habit_updates_without_select(storage, statements):
+    tracked = storage.save_habit(Habit("Exercise", "daily"))
+    detached = Habit("Read", "weekly")
+    detached.id = storage.save_habit(Habit("Read", "weekly")).id
+    statements.clear()
+
+    tracked.current_streak = 3
+    storage.save_habit(tracked)
+    detached.current_streak = 2
+    storage.save_habit(detached)
+
+    assert statements == ["UPDATE", "UPDATE"]
+    assert {habit.name: habit.current_streak for habit in storage.load_habits()} == {"Exercise": 3, "Read": 2}
+
+
+def test_save_task_inserts_when_id_is_unknown(storage, statements):
+    task = Task(habit_id=1, expected_completion_by=datetime(2024, 1, 1))
+    task.id = 99
+
+    saved = storage.save_task(task)
+
+    assert statements == ["UPDATE", "INSERT"]
+    assert saved.id != 99
+    assert len(storage.load_tasks()) == 1
+
+
+def test_load_latest_task(storage):
+    storage.save_tasks([
+        Task(habit_id=1, expected_completion_by=datetime(2024, 1, 3)),
+        Task(habit_id=1, expected_completion_by=datetime(2024, 1, 5)),
+        Task(habit_id=1, expected_completion_by=datetime(2024, 1, 4)),
+        Task(habit_id=2, expected_completion_by=datetime(2024, 1, 9)),
+    ])
+
+    assert storage.load_latest_task(1).expected_completion_by == datetime(2024, 1, 5)
+    assert storage.load_latest_task(3) is None
+
+
+def test_create_db_engine_applies_sqlite_pragmas(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLITE_SYNCHRONOUS", "FULL")
+    engine = create_db_engine({"url": f"sqlite:///{tmp_path / 'habits.sqlite3'}", "busy_timeout": 1234})
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 2  # FULL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 1234
+    engine.dispose()
+
+
+def test_unit_of_work_commits_once(storage, mocker):
+    commit = mocker.spy(storage.session, "commit")
+
+    with storage.unit_of_work():
+        habit = storage.save_habit(Habit("Exercise", "daily"))
+        storage.save_task(Task(habit_id=habit.id, expected_completion_by=datetime(2024, 1, 1)))
+        with storage.unit_of_work():
+            storage.save_tasks([Task(habit_id=habit.id, expected_completion_by=datetime(2024, 1, 2))])
+
+    assert commit.call_count == 1
+    assert len(storage.load_tasks()) == 2
+
+
+def test_unit_of_work_rolls_back_on_error(storage):
+    with pytest.raises(RuntimeError):
+        with storage.unit_of_work():
+            storage.save_habit(Habit("Exercise", "daily"))
+            raise RuntimeError("boom")
+
+    assert storage.load_habits() == []
+
+
+def test_scoped_session_per_thread(sqlite_engine):
+    registry = scoped_session(sessionmaker(bind=sqlite_engine))
+    storage = StorageComponent(sqlite_engine, registry)
+    sessions = []
+
+    def use_session():
+        sessions.append(storage.session())
+        storage.close()
+
+    threads = [threading.Thread(target=use_session) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sessions[0] is not sessions[1]
+
+
+def test_delete_habit_removes_its_tasks(storage):
+    habit = storage.save_habit(Habit("Exercise", "daily"))
+    other = storage.save_habit(Habit("Read", "weekly"))
+    storage.save_tasks([Task(habit_id=habit.id), Task(habit_id=other.id)])
+
+    storage.delete_habit(habit.id)
+
+    assert [h.id for h in storage.load_habits()] == [other.id]
+    assert [t.habit_id for t in storage.load_tasks()] == [other.id]
+
+
+def test_iter_tasks_pages_with_filters(storage, statements):
+    storage.save_tasks([Task(habit_id=habit_id, expected_completion_by=datetime(2024, 1, day))
+                        for day in (5, 1, 3, 2, 4) for habit_id in (1, 2)])
+    statements.clear()
+
+    by_deadline = list(storage.iter_tasks(habit_id=1, start=datetime(2024, 1, 2),
+                                          order_by="expected_completion_by", batch_size=2))
+    by_id = list(storage.iter_tasks(batch_size=3))
+
+    assert [task.expected_completion_by.day for task in by_deadline] == [2, 3, 4, 5]
+    assert [task.id for task in by_id] == list(range(1, 11))
+    assert statements.count("SELECT") == 3 + 4
+
+
+def test_iter_habits(storage):
+    storage.save_habits([Habit(f"Habit {i}", "daily" if i % 2 else "weekly") for i in range(7)])
+
+    assert [habit.name for habit in storage.iter_habits(batch_size=2, periodicity="weekly")] == \
+        ["Habit 0", "Habit 2", "Habit 4", "Habit 6"]
+
+
+def test_load_habits_is_cached_until_a_write(storage, statements):
+    exercise = storage.save_habit(Habit("Exercise", "daily"))
+    storage.save_habit(Habit("Read", "weekly"))
+    statements.clear()
+
+    assert len(storage.load_habits(periodicity="weekly")) == 1
+    assert len(storage.load_habits(periodicity="weekly")) == 1
+    assert len(storage.load_habits(periodicity="daily")) == 1
+    assert statements == ["SELECT", "SELECT"]
+
+    # Moving a habit into the weekly results drops both affected entries
+    exercise.periodicity = "weekly"
+    storage.save_habit(exercise)
+    statements.clear()
+
+    assert len(storage.load_habits(periodicity="weekly")) == 2
+    assert storage.load_habits(periodicity="daily") == []
+    assert statements == ["SELECT", "SELECT"]
+    assert storage.habit_cache.stats()["hits"] == 1
+
+
+def test_load_habits_cache_is_per_session(sqlite_engine, statements):
+    sessions = [sessionmaker(bind=sqlite_engine, expire_on_commit=False)() for _ in range(2)]
+    first, second = (StorageComponent(sqlite_engine, session) for session in sessions)
+    first.save_habit(Habit("Read", "daily"))
+
+    first_habits, second_habits = first.load_habits(), second.load_habits()
+
+    assert object_session(first_habits[0]) is sessions[0]
+    assert object_session(second_habits[0]) is sessions[1]
+    assert not sessions[0].dirty
+
+    # A write through one component drops the other session's entries as well
+    second_habits[0].current_streak = 3
+    second.save_habit(second_habits[0])
+    statements.clear()
+    first.load_habits()
+    assert statements == ["SELECT"]
+    for storage in (first, second):
+        storage.close()
+
+
+def test_search_habits_uses_full_text_index(sqlite_engine, storage):
+    storage.save_habits([Habit(name, "daily") for name in
+                         ("Evening exercise", "Exercise", "Read a book", "Bookkeeping")])
+    create_search_index(sqlite_engine)
+    storage.save_habit(Habit("Morning exercise", "weekly"))
+
+    assert [h.name for h in storage.search_habits("exerc")] == ["Exercise", "Evening exercise", "Morning exercise"]
+    assert [h.name for h in storage.search_habits("book")] == ["Bookkeeping", "Read a book"]
+    assert [h.name for h in storage.search_habits("a book")] == ["Read a book"]
+    assert [h.name for h in storage.load_habits(name="ERCISE", periodicity="weekly")] == ["Morning exercise"]
+
+
+def test_search_index_follows_renames_and_deletes(sqlite_engine, storage):
+    create_search_index(sqlite_engine)
+    habit = storage.save_habit(Habit("Exercise", "daily"))
+    storage.save_habit(Habit("Meditate", "daily"))
+
+    habit.name = "Stretching"
+    storage.save_habit(habit)
+    assert storage.search_habits("exercise") == []
+    assert [h.name for h in storage.search_habits("stretch")] == ["Stretching"]
+
+    storage.delete_habit(habit.id)
+    assert storage.search_habits("stretch") == []
+
+
+def test_habit_stats_follow_completions(storage):
+    habit = storage.save_habit(Habit("Exercise", "daily", next_completion_date=datetime.now() - timedelta(days=2)))
+    storage.save_task(Task(habit_id=habit.id, expected_completion_by=datetime.now() - timedelta(days=2)))
+    manager = HabitManager(storage)
+
+    assert manager.mark_habit_completed(habit.id) == COMPLETED_MESSAGE
+    stats, periods = storage.load_habit_stats(habit.id)
+    assert (stats.completions, stats.misses) == (1, 1)
+    assert {period.kind for period in periods} == {"week", "month"}
+    assert all(period.completions == 1 for period in periods)
+
+    storage.update_habit_stats(habit.id, datetime(2024, 1, 1, 8), datetime(2024, 1, 1, 23, 59, 59))
+    stats, periods = storage.load_habit_stats(habit.id)
+    assert (stats.completions, stats.misses) == (2, 1)
+    assert ("month", "2024-01", 1) in {(period.kind, period.period, period.completions) for period in periods}
+
+    other = storage.save_habit(Habit("Read", "weekly"))
+    rates = {row.name: row for row in storage.load_completion_rates()}
+    assert rates["Exercise"].on_time_rate == 0.5
+    assert (rates["Read"].completions, rates["Read"].on_time_rate) == (0, 0.0)
+
+    storage.delete_habit(habit.id)
+    assert storage.load_habit_stats(habit.id) == (None, [])
+    assert [row.habit_id for row in storage.load_completion_rates()] == [other.id]
+
+
+def test_rebuild_habit_stats_from_history(storage):
+    habit = storage.save_habit(Habit("Exercise", "daily"))
+    storage.save_tasks([
+        Task(habit_id=habit.id, completed=True, completed_on=datetime(2024, 1, 1, 8),
+             expected_completion_by=datetime(2024, 1, 1, 23, 59, 59)),
+        Task(habit_id=habit.id, completed=True, completed_on=datetime(2024, 1, 4, 8),
+             expected_completion_by=datetime(2024, 1, 2, 23, 59, 59)),
+        Task(habit_id=habit.id, expected_completion_by=datetime(2024, 1, 5, 23, 59, 59)),
+    ])
+
+    storage.rebuild_habit_stats()
+
+    stats, periods = storage.load_habit_stats(habit.id)
+    assert (stats.completions, stats.misses, stats.last_completed_on) == (2, 1, datetime(2024, 1, 4, 8))
+    assert [(period.kind, period.period, period.completions) for period in periods] == [
+        ("month", "2024-01", 2), ("week", "2024-01-01", 2)]
+
+
+def test_task_day_columns_follow_dates(storage):
+    task = storage.save_task(Task(habit_id=1, expected_completion_by=datetime(2024, 1, 1, 23, 59, 59)))
+    assert (task.expected_day, task.completed_day) == (date(2024, 1, 1).toordinal(), None)
+
+    task.completed_on = datetime(2024, 1, 2, 8)
+    storage.save_task(task)
+    storage.save_tasks([Task(habit_id=1, expected_completion_by=datetime(2024, 1, 2, 23, 59, 59))])
+
+    rows = storage.session.execute(text("SELECT expected_day, completed_day FROM tasks ORDER BY id")).all()
+    assert rows == [(date(2024, 1, 1).toordinal(), date(2024, 1, 2).toordinal()),
+                    (date(2024, 1, 2).toordinal(), None)]
+
+
+def test_complete_habit_updates_rows_in_place(storage, statements):
+    deadline = datetime(2024, 1, 1, 23, 59, 59)
+    habit = storage.save_habit(Habit("Exercise", "daily", 2, 2, next_completion_date=deadline))
+    task = storage.save_task(Task(habit_id=habit.id, expected_completion_by=deadline))
+    statements.clear()
+
+    result = storage.complete_habit(habit.id, datetime(2024, 1, 1, 9))
+
+    # The latest task and the updated habit row are the only reads
+    assert statements.count("SELECT") == 2
+    assert result.status == COMPLETED
+    assert (result.current_streak, result.longest_streak) == (3, 3)
+    assert result.next_completion_date == datetime(2024, 1, 2, 23, 59, 59)
+    # The loaded copies are kept in step
+    assert (habit.current_streak, task.completed, task.completed_on) == (3, True, datetime(2024, 1, 1, 9))
+    latest = storage.load_latest_task(habit.id)
+    assert (latest.id, latest.expected_completion_by) == (result.task_id, datetime(2024, 1, 2, 23, 59, 59))
+    assert storage.load_habit_stats(habit.id)[0].completions == 1
+
+    assert storage.complete_habit(habit.id, datetime(2024, 1, 1, 10)).status == NOT_DUE
+    late = storage.complete_habit(habit.id, datetime(2024, 1, 5, 9))
+    assert (late.status, late.current_streak, late.longest_streak) == (COMPLETED, 1, 3)
+    assert storage.complete_habit(12345).status == NOT_FOUND
+
+
+def test_complete_monthly_habit_keeps_its_day(storage):
+    deadline = datetime(2024, 1, 31, 23, 59, 59)
+    habit_id, = storage.save_habits([Habit("Budget", "monthly", next_completion_date=deadline,
+                                           created_at=datetime(2024, 1, 31, 8))])
+    storage.save_task(Task(habit_id=habit_id, expected_completion_by=deadline))
+
+    deadlines = []
+    for completed_at in (datetime(2024, 1, 31, 9), datetime(2024, 2, 29, 9), datetime(2024, 3, 31, 9)):
+        deadlines.append(storage.complete_habit(habit_id, completed_at).next_completion_date.date())
+
+    assert [str(day) for day in deadlines] == ["2024-02-29", "2024-03-31", "2024-04-30"]
+    assert storage.load_latest_task(habit_id).expected_completion_by.date() == deadlines[-1]
+
+
+def test_complete_habit_counts_a_task_once(storage):
+    habit = storage.save_habit(Habit("Exercise", "daily"))
+    task = storage.save_task(Task(habit_id=habit.id, completed=True, completed_on=datetime(2024, 1, 1),
+                                  expected_completion_by=datetime(2024, 1, 1, 23, 59, 59)))
+
+    assert storage.complete_habit(habit.id, datetime(2024, 1, 1, 9)).status == NOT_DUE
+    assert storage.load_habit(habit.id, refresh=True).current_streak == 0
+    assert storage.load_latest_task(habit.id).id == task.id
+
+
+def test_complete_habits_in_one_transaction(storage, mocker):
+    deadline = datetime(2024, 1, 1, 23, 59, 59)
+    exercise = storage.save_habit(Habit("Exercise", "daily", 1, 1, next_completion_date=deadline))
+    read = storage.save_habit(Habit("Read", "weekly", 4, 6, next_completion_date=deadline))
+    storage.save_tasks([Task(habit_id=exercise.id, expected_completion_by=deadline),
+                        Task(habit_id=read.id, expected_completion_by=deadline)])
+    commit = mocker.spy(storage.session, "commit")
+
+    results = storage.complete_habits([
+        (exercise.id, datetime(2024, 1, 2, 8)),
+        (read.id, datetime(2024, 1, 1, 20)),
+        (exercise.id, datetime(2024, 1, 1, 7)),
+        (exercise.id, datetime(2024, 1, 1, 9)),
+        (12345, datetime(2024, 1, 1, 9)),
+    ])
+
+    assert commit.call_count == 1
+    assert [result.status for result in results] == [COMPLETED, COMPLETED, COMPLETED, NOT_DUE, NOT_FOUND]
+    # Completions of one habit are applied in time order
+    assert (results[2].current_streak, results[0].current_streak) == (2, 3)
+    assert (results[1].current_streak, results[1].longest_streak) == (5, 6)
+    assert (exercise.current_streak, exercise.longest_streak) == (3, 3)
+
+    history = storage.load_tasks_for_habit(exercise.id)
+    assert [(task.completed, task.completed_on) for task in history] == [
+        (True, datetime(2024, 1, 1, 7)), (True, datetime(2024, 1, 2, 8)), (False, None)]
+    assert storage.load_latest_task(exercise.id).id == results[0].task_id
+    stats, periods = storage.load_habit_stats(exercise.id)
+    assert (stats.completions, stats.misses, stats.last_completed_on) == (2, 0, datetime(2024, 1, 2, 8))
+
+    storage.complete_habits([(exercise.id, datetime(2024, 1, 3, 8))])
+    stats, periods = storage.load_habit_stats(exercise.id)
+    assert stats.completions == 3
+    assert ("week", "2024-01-01", 3) in {(period.kind, period.period, period.completions) for period in periods}
@@ -0,0 +1,43 @@
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+from datetime import datetime
+from src.export import export
+from src.habits import Habit
+from src.tasks import Task
+
+
+def test_export_round_trips_through_pandas(storage, tmp_path):
+    habits = storage.save_habits([Habit("Exercise", "daily"), Habit("Read", "weekly"), Habit("Walk", "daily")])
+    storage.save_tasks([
+        Task(habit_id=habits[0], completed=True, completed_on=datetime(2024, 1, 1, 8),
+             expected_completion_by=datetime(2024, 1, 1, 23, 59, 59)),
+        Task(habit_id=habits[0], completed=False, expected_completion_by=datetime(2024, 2, 1, 23, 59, 59)),
+        Task(habit_id=habits[1], completed=False, expected_completion_by=datetime(2024, 1, 7, 23, 59, 59)),
+    ])
+
+    assert export(storage, str(tmp_path), batch_size=2) == {"habits": 3, "tasks": 3}
+
+    habit_frame = pd.read_parquet(tmp_path / "habits.parquet")
+    assert list(habit_frame["name"]) == ["Exercise", "Read", "Walk"]
+    assert isinstance(habit_frame["periodicity"].dtype, pd.CategoricalDtype)
+    assert pq.ParquetFile(tmp_path / "habits.parquet").metadata.num_row_groups == 2
+
+    assert sorted(os.listdir(tmp_path / "tasks" / f"habit_id={habits[0]}")) == ["month=2024-01", "month=2024-02"]
+    task_frame = pd.read_parquet(tmp_path / "tasks").sort_values("id")
+    assert len(task_frame) == 3
+    assert task_frame["expected_completion_by"].dtype == "datetime64[us]"
+    assert list(task_frame["completed"]) == [True, False, False]
+    assert task_frame["completed_on"].iloc[0] == pd.Timestamp(2024, 1, 1, 8)
+
+
+def test_export_replaces_previous_partitions(storage, tmp_path):
+    habit = storage.save_habit(Habit("Exercise", "daily"))
+    task = storage.save_task(Task(habit_id=habit.id, completed=False,
+                                  expected_completion_by=datetime(2024, 1, 1, 23, 59, 59)))
+    export(storage, str(tmp_path))
+    task.completed = True
+    storage.save_task(task)
+    export(storage, str(tmp_path))
+
+    assert list(pd.read_parquet(tmp_path / "tasks")["completed"]) == [True]
@@ -1,6 +1,7 @@
 import pytest
 from datetime import datetime, timedelta
 from src.habits import Habit
+from src.tasks import Task
 
 
 def test_get_streak(sample_habit):
@@ -60,3 +61,18 @@ def test_is_due(sample_habit):
 
     sample_habit.next_completion_date = datetime.now() + timedelta(days=1)
     assert sample_habit.is_due() is False
+
+
+@pytest.mark.parametrize("completed_at,completed,streak", [
+    (datetime(2024, 1, 1, 8), True, 3),
+    (datetime(2024, 1, 2, 8), True, 1),
+    (datetime(2023, 12, 31, 8), False, 2),
+])
+def test_apply_completion_compares_days(completed_at, completed, streak):
+    habit = Habit("Exercise", "daily", current_streak=2, longest_streak=2,
+                  next_completion_date=datetime(2024, 1, 1))
+    # A deadline without the usual 23:59:59 still counts for its whole day
+    latest_task = Task(habit_id=1, expected_completion_by=datetime(2024, 1, 1))
+
+    assert habit.apply_completion(latest_task, completed_at) is completed
+    assert habit.current_streak == streak
@@ -1,5 +1,5 @@
 import pytest
-from src.habits import Habit  # Replace 'your_module' with the actual module name
+from src.habits import COMPLETED, NOT_DUE, NOT_DUE_MESSAGE, CompletionResult, Habit, HabitManager  # Replace 'your_module' with the actual module name
 
 
 def test_create_habit(habit_manager, mock_storage):
@@ -33,22 +33,22 @@ def test_delete_habit(habit_manager, mock_storage):
     habit_manager.delete_habit(1)
 
     assert len(habit_manager.habits) == 0
-    mock_storage.session.delete.assert_called_once_with(habit)
-    mock_storage.session.commit.assert_called_once()
+    mock_storage.delete_habit.assert_called_once_with(1)
 
 
-def test_mark_habit_completed(habit_manager, mock_storage, mock_task):
-    habit = Habit("Exercise", "daily")
-    habit.id = 1
-    habit_manager.habits = [habit]
-
-    mock_storage.load_tasks_for_habit.return_value = [mock_task]
+def test_mark_habit_completed(habit_manager, mock_storage):
+    mock_storage.complete_habit.return_value = CompletionResult(1, COMPLETED, 1, 1)
 
     result = habit_manager.mark_habit_completed(1)
 
     assert result == "Habit marked as completed😊!"
-    mock_storage.save_task.assert_called()
-    mock_storage.save_habit.assert_called_once()
+    mock_storage.complete_habit.assert_called_once_with(1, None)
+
+
+def test_mark_habit_completed_not_due(habit_manager, mock_storage):
+    mock_storage.complete_habit.return_value = CompletionResult(1, NOT_DUE)
+
+    assert habit_manager.mark_habit_completed(1) == NOT_DUE_MESSAGE
 
 
 def test_clear_habits(habit_manager, mock_storage):
@@ -58,6 +58,73 @@ def test_clear_habits(habit_manager, mock_storage):
     habit_manager.clear_habits()
 
     assert len(habit_manager.habits) == 0
-    mock_storage.session.query.assert_called_once()
-    mock_storage.session.query().delete.assert_called_once()
-    mock_storage.session.commit.assert_called_once()
+    mock_storage.clear_habits.assert_called_once()
+
+
+def test_create_habits(habit_manager, mock_storage):
+    created = [Habit("Exercise", "daily"), Habit("Read", "weekly")]
+    created[0].id, created[1].id = 1, 2
+    habit_manager.habits = []
+    mock_storage.save_habits.return_value = [2, 1]
+    mock_storage.load_habits.return_value = created
+
+    result = habit_manager.create_habits([("Read", "weekly"), ("Exercise", "daily")])
+
+    assert [habit.id for habit in result] == [2, 1]
+    assert habit_manager.habits == result
+    saved = mock_storage.save_habits.call_args[0][0]
+    assert [habit.name for habit in saved] == ["Read", "Exercise"]
+    mock_storage.load_habits.assert_called_with(ids=[2, 1])
+
+
+def test_find_habits_after_rename(habit_manager, mock_storage):
+    habit = Habit("Exercise", "daily")
+    habit.id = 1
+    habit_manager.habits = [habit]
+
+    habit_manager.update_habit(1, name="Stretch")
+
+    assert habit_manager.find_habits("Exercise") == []
+    assert habit_manager.find_habits("Stretch") == [habit]
+
+
+def test_habits_load_on_first_access(mock_storage):
+    habit = Habit("Exercise", "daily")
+    habit.id = 1
+    mock_storage.load_habits.return_value = [habit]
+    manager = HabitManager(mock_storage)
+    mock_storage.load_habits.assert_not_called()
+
+    assert list(manager.habits) == [habit]
+    assert list(manager.habits) == [habit]
+    mock_storage.load_habits.assert_called_once_with()
+
+
+def test_get_habits_loads_only_missing(mock_storage):
+    first, second = Habit("Exercise", "daily"), Habit("Read", "weekly")
+    first.id, second.id = 1, 2
+    mock_storage.load_habit.return_value = first
+    mock_storage.load_habits.return_value = [second]
+    manager = HabitManager(mock_storage)
+
+    manager.update_habit(1, name="Stretch")
+    result = manager.get_habits([2, 1])
+
+    assert result == [second, first]
+    mock_storage.load_habit.assert_called_once_with(1)
+    mock_storage.load_habits.assert_called_once_with(ids=[2])
+
+
+def test_refresh(habit_manager, mock_storage):
+    stale, fresh = Habit("Exercise", "daily"), Habit("Exercise", "daily", current_streak=4)
+    stale.id = fresh.id = 1
+    habit_manager.habits = [stale]
+    mock_storage.load_habit.return_value = fresh
+
+    habit_manager.refresh([1])
+    assert list(habit_manager.habits) == [fresh]
+    mock_storage.load_habit.assert_called_once_with(1, refresh=True)
+
+    mock_storage.load_habits.return_value = []
+    habit_manager.refresh()
+    assert list(habit_manager.habits) == []
@@ -0,0 +1,52 @@
+import pytest
+from operator import attrgetter
+from src.habits import Habit
+from src.indexed import IndexedCollection
+
+
+def make_habit(habit_id, name):
+    habit = Habit(name, "daily")
+    habit.id = habit_id
+    return habit
+
+
+def test_lookup_by_id_and_index():
+    first, second, third = make_habit(1, "Read"), make_habit(2, "Run"), make_habit(3, "Read")
+    habits = IndexedCollection([first, second, third], {"name": attrgetter("name")})
+
+    assert habits.get(2) is second
+    assert habits.get(4) is None
+    assert habits.find("name", "Read") == [first, third]
+    assert habits == [first, second, third]
+
+
+def test_remove_and_reindex():
+    first, second = make_habit(1, "Read"), make_habit(2, "Run")
+    habits = IndexedCollection([first, second], {"name": attrgetter("name")})
+
+    second.name = "Read"
+    habits.reindex(second)
+    habits.remove(first)
+
+    assert habits.find("name", "Read") == [second]
+    assert habits.find("name", "Run") == []
+    assert first not in habits
+    with pytest.raises(ValueError):
+        habits.remove(first)
+
+
+def test_append_replaces_same_id_and_respects_maxlen():
+    habits = IndexedCollection([make_habit(1, "Read"), make_habit(2, "Run")], maxlen=2)
+    replacement = make_habit(1, "Walk")
+
+    habits.append(replacement)
+    assert [habit.name for habit in habits] == ["Walk", "Run"]
+
+    habits.append(make_habit(3, "Swim"))
+    assert [habit.id for habit in habits] == [2, 3]
+
+
+def test_unsaved_items_are_kept_apart():
+    habits = IndexedCollection([Habit("Read", "daily"), Habit("Read", "daily")])
+
+    assert len(habits) == 2
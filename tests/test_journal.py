@@ -0,0 +1,89 @@
+import os
+import pytest
+from datetime import datetime, timedelta
+from src.habits import Habit, HabitManager
+from src.journal import CompletionJournal, JournalCompactor
+from src.tasks import Task
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return CompletionJournal(str(tmp_path / "completions.log"), fsync=False)
+
+
+@pytest.fixture
+def habit_with_task(storage):
+    habit = storage.save_habit(Habit("Exercise", "daily", next_completion_date=datetime(2024, 1, 1, 23, 59, 59)))
+    storage.save_task(Task(habit_id=habit.id, expected_completion_by=datetime(2024, 1, 1, 23, 59, 59)))
+    return habit
+
+
+def test_append_and_read(journal):
+    first = journal.append(1, datetime(2024, 1, 1, 8))
+    journal.append(2, datetime(2024, 1, 1, 9))
+
+    events = list(journal.read())
+    assert [event["habit_id"] for _, event in events] == [1, 2]
+    assert events[0] == (first, {"habit_id": 1, "completed_at": datetime(2024, 1, 1, 8)})
+    assert [event["habit_id"] for _, event in journal.read(first)] == [2]
+
+
+def test_torn_last_line_is_repaired(journal):
+    journal.append(1, datetime(2024, 1, 1, 8))
+    with open(journal.path, "a") as file:
+        file.write('{"habit_id": 2, "compl')
+
+    assert len(list(journal.read())) == 1
+    journal = CompletionJournal(journal.path, fsync=False)
+    journal.append(3, datetime(2024, 1, 1, 9))
+    assert [event["habit_id"] for _, event in journal.read()] == [1, 3]
+
+
+def test_compactor_applies_events_with_their_timestamps(journal, storage, habit_with_task):
+    manager = HabitManager(storage, journal=journal)
+    manager.record_completion(habit_with_task.id, datetime(2024, 1, 1, 10))
+    manager.record_completion(habit_with_task.id, datetime(2024, 1, 1, 11))  # not due again the same day
+    manager.record_completion(habit_with_task.id, datetime(2024, 1, 2, 9))
+
+    compactor = JournalCompactor(journal, storage, batch_size=2)
+    assert compactor.replay() == 3
+    assert compactor.replay() == 0
+
+    habit = storage.load_habit(habit_with_task.id, refresh=True)
+    tasks = sorted(storage.load_tasks(), key=lambda task: task.expected_completion_by)
+    assert habit.current_streak == 2
+    assert [task.completed for task in tasks] == [True, True, False]
+    assert tasks[-1].expected_completion_by == datetime(2024, 1, 3, 23, 59, 59)
+    assert storage.load_journal_position("completions") == os.path.getsize(journal.path)
+
+
+def test_background_compactor(journal, storage, habit_with_task):
+    compactor = JournalCompactor(journal, storage, interval=0.01)
+    compactor.start()
+    journal.append(habit_with_task.id, datetime(2024, 1, 1, 10))
+    compactor.stop()
+
+    assert storage.load_habit(habit_with_task.id, refresh=True).current_streak == 1
+
+
+def test_background_compactor_survives_a_failed_batch(journal, storage, habit_with_task, mocker, caplog):
+    complete_habits = storage.complete_habits
+    failures = [ValueError("Some of the habits were completed concurrently; retry the batch.")]
+
+    def flaky(completions):
+        if failures:
+            raise failures.pop()
+        return complete_habits(completions)
+
+    mocker.patch.object(storage, "complete_habits", side_effect=flaky)
+    journal.append(habit_with_task.id, datetime(2024, 1, 1, 10))
+    compactor = JournalCompactor(journal, storage, interval=0.01)
+    compactor.start()
+    # The session is only touched from the compactor thread until it stops
+    while storage.complete_habits.call_count < 2:
+        assert compactor._thread.is_alive()
+        compactor._stop.wait(0.01)
+    compactor.stop()
+
+    assert "Journal compaction failed" in caplog.text
+    assert storage.load_habit(habit_with_task.id, refresh=True).current_streak == 1
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from datetime import datetime
+from src.periodicity import (
+    PERIODICITY_PARSERS,
+    EveryNDays,
+    next_deadline,
+    next_deadlines,
+    parse_periodicity,
+    register_periodicity,
+    rollover_deadlines,
+)
+
+
+NOW = datetime(2024, 1, 20, 8)  # a Saturday
+
+
+@pytest.mark.parametrize("periodicity, anchor, expected", [
+    ("daily", None, datetime(2024, 1, 20, 23, 59, 59)),
+    ("daily", datetime(2024, 1, 19, 23, 59, 59), datetime(2024, 1, 21, 23, 59, 59)),
+    ("weekly", datetime(2024, 1, 16, 23, 59, 59), datetime(2024, 1, 23, 23, 59, 59)),
+    ("weekly", datetime(2024, 1, 20, 23, 59, 59), datetime(2024, 1, 27, 23, 59, 59)),
+    ("every 3 days", datetime(2024, 1, 19, 23, 59, 59), datetime(2024, 1, 23, 23, 59, 59)),
+    ("mon,fri", None, datetime(2024, 1, 22, 23, 59, 59)),
+    ("Mon, Sat", datetime(2024, 1, 20, 23, 59, 59), datetime(2024, 1, 22, 23, 59, 59)),
+    ("monthly", datetime(2024, 1, 31, 23, 59, 59), datetime(2024, 2, 29, 23, 59, 59)),
+])
+def test_next_deadline(periodicity, anchor, expected):
+    assert next_deadline(periodicity, anchor, NOW) == expected
+
+
+def test_batch_deadlines():
+    periodicities = ["daily", "weekly", "monthly", "every 3 days", "tue"]
+    anchors = [datetime(2024, 1, 10, 23, 59, 59)] * len(periodicities)
+
+    assert next_deadlines(periodicities, anchors, NOW).tolist() == [
+        datetime(2024, 1, 21, 23, 59, 59), datetime(2024, 1, 24, 23, 59, 59), datetime(2024, 2, 10, 23, 59, 59),
+        datetime(2024, 1, 23, 23, 59, 59), datetime(2024, 1, 23, 23, 59, 59)]
+    assert rollover_deadlines(periodicities, anchors, NOW).tolist() == [
+        datetime(2024, 1, 20, 23, 59, 59), datetime(2024, 1, 24, 23, 59, 59), datetime(2024, 2, 10, 23, 59, 59),
+        datetime(2024, 1, 22, 23, 59, 59), datetime(2024, 1, 23, 23, 59, 59)]
+    assert next_deadlines([], [], NOW).dtype == np.dtype("datetime64[s]")
+
+
+def test_monthly_keeps_the_day_of_its_origin():
+    origin = datetime(2024, 1, 31, 9)
+    deadline = datetime(2024, 1, 31, 23, 59, 59)
+    deadlines = []
+    for _ in range(4):
+        deadline = next_deadline("monthly", deadline, deadline.replace(hour=12), origin)
+        deadlines.append(deadline.date())
+
+    assert [str(day) for day in deadlines] == ["2024-02-29", "2024-03-31", "2024-04-30", "2024-05-31"]
+    assert rollover_deadlines(["monthly"], [datetime(2024, 2, 29, 23, 59, 59)], datetime(2024, 3, 2),
+                              [origin]).tolist() == [datetime(2024, 3, 31, 23, 59, 59)]
+
+
+def test_unsupported_and_registered_periodicities():
+    for periodicity in ("fortnightly", "every 0 days", None):
+        with pytest.raises(ValueError, match="Unsupported periodicity"):
+            parse_periodicity(periodicity)
+
+    parser = register_periodicity(lambda text: EveryNDays(14) if text == "fortnightly" else None)
+    try:
+        assert next_deadline("fortnightly", datetime(2024, 1, 19), NOW) == datetime(2024, 2, 3, 23, 59, 59)
+    finally:
+        PERIODICITY_PARSERS.remove(parser)
+        parse_periodicity.cache_clear()
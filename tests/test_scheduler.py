@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from src.habits import Habit, HabitManager
+from src.scheduler import DueEntry, DueQueue
+from src.tasks import Task
+
+
+NOW = datetime(2024, 3, 1, 12)
+
+
+def test_due_queue_lookups(storage):
+    ids = storage.save_habits([
+        Habit("Exercise", "daily", next_completion_date=NOW - timedelta(days=2)),
+        Habit("Read", "weekly", next_completion_date=NOW + timedelta(days=3)),
+        Habit("Stretch", "daily", next_completion_date=NOW - timedelta(hours=1)),
+        Habit("Journal", "daily", next_completion_date=NOW + timedelta(hours=5)),
+        Habit("Undated", "daily"),
+    ])
+    queue = DueQueue(storage)
+
+    assert len(queue) == 4 and ids[4] not in queue
+    assert queue.due_now(NOW) == [DueEntry(NOW - timedelta(days=2), ids[0]),
+                                  DueEntry(NOW - timedelta(hours=1), ids[2])]
+    assert [entry.habit_id for entry in queue.next_due(3)] == [ids[0], ids[2], ids[3]]
+    assert [entry.habit_id for entry in queue.due_between(NOW, NOW + timedelta(days=7))] == [ids[3], ids[1]]
+
+    queue.push(ids[0], NOW + timedelta(days=1))
+    queue.remove(ids[2])
+    assert queue.due_now(NOW) == []
+    assert [entry.habit_id for entry in queue.next_due(10)] == [ids[3], ids[0], ids[1]]
+
+
+def test_habit_manager_keeps_due_queue_in_step(storage):
+    manager = HabitManager(storage, due_queue=DueQueue(storage))
+    habit = manager.create_habit("Exercise", "daily")
+    assert manager.due_queue.get(habit.id) == habit.next_completion_date
+
+    storage.save_task(Task(habit_id=habit.id, expected_completion_by=habit.next_completion_date))
+    manager.mark_habit_completed(habit.id)
+    assert manager.due_queue.get(habit.id) == storage.load_habit(habit.id, refresh=True).next_completion_date
+    assert manager.due_queue.due_now() == []
+
+    manager.delete_habit(habit.id)
+    assert habit.id not in manager.due_queue
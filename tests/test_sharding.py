@@ -0,0 +1,44 @@
+import pytest
+from src.analytics import list_habits_across_shards, longest_streak_across_shards
+from src.habits import Habit
+from src.sharding import ShardRouter
+from src.tasks import Task
+
+
+@pytest.fixture
+def router(tmp_path):
+    router = ShardRouter([f"sqlite:///{tmp_path / f'shard{i}.sqlite3'}" for i in range(3)])
+    router.initialize()
+    yield router
+    router.dispose()
+
+
+def test_users_are_routed_to_stable_shards(router):
+    assert router.shard_for(42) == router.shard_for(42)
+    assert {router.shard_for(user_id) for user_id in range(50)} == {0, 1, 2}
+
+
+def test_storage_is_scoped_to_its_user(router):
+    users = [user_id for user_id in range(20) if router.shard_for(user_id) == 0][:2]
+    alice, bob = (router.storage_for(user_id) for user_id in users)
+
+    habit = alice.save_habit(Habit("Exercise", "daily"))
+    alice.save_task(Task(habit_id=habit.id))
+    bob.save_habit(Habit("Read", "weekly"))
+
+    assert [h.name for h in alice.load_habits()] == ["Exercise"]
+    assert [h.name for h in bob.load_habits()] == ["Read"]
+    assert [t.user_id for t in alice.load_tasks()] == [users[0]]
+    assert bob.load_tasks() == []
+    assert bob.load_latest_task(habit.id) is None
+
+    bob.delete_habit(habit.id)
+    assert len(alice.load_habits()) == 1
+
+
+def test_cross_shard_analytics(router):
+    for user_id, streak in ((1, 3), (2, 9), (3, 5), (4, 1)):
+        router.storage_for(user_id).save_habit(Habit(f"Habit {user_id}", "daily", longest_streak=streak))
+
+    assert len(list_habits_across_shards(router)) == 4
+    assert longest_streak_across_shards(router) == "The habit with the longest streak is 'Habit 2' with a streak of 9."
@@ -0,0 +1,95 @@
+import pytest
+from datetime import datetime
+from src.habits import COMPLETED_MESSAGE, Habit, HabitManager
+from src.snapshot import HabitRecord, HabitSnapshot
+from src.tasks import Task
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return str(tmp_path / "habits.bin")
+
+
+@pytest.fixture
+def populated_storage(storage):
+    habit_ids = storage.save_habits([
+        Habit("Exercise", "daily", 2, 5, datetime(2024, 1, 1, 23, 59, 59)),
+        Habit("Read", "weekly"),
+    ])
+    storage.save_tasks([
+        Task(habit_id=habit_ids[0], expected_completion_by=datetime(2024, 1, 1, 23, 59, 59)),
+        Task(habit_id=habit_ids[0], expected_completion_by=datetime(2024, 1, 2, 23, 59, 59)),
+    ])
+    return storage
+
+
+def test_load_builds_snapshot(populated_storage, snapshot_path):
+    snapshot = HabitSnapshot.load(populated_storage, snapshot_path)
+    exercise, read = populated_storage.load_habits()
+    latest_task = populated_storage.load_latest_task(exercise.id)
+
+    assert list(snapshot) == [
+        HabitRecord(exercise.id, "Exercise", "daily", 2, 5, datetime(2024, 1, 1, 23, 59, 59), latest_task.id),
+        HabitRecord(read.id, "Read", "weekly", 0, 0, None, None),
+    ]
+    assert len(snapshot) == 2
+    assert snapshot.get(read.id).name == "Read"
+    assert snapshot.get(read.id + 1) is None
+    assert snapshot.is_current(populated_storage)
+    snapshot.close()
+
+    reopened = HabitSnapshot(snapshot_path)
+    assert reopened.is_current(populated_storage)
+    assert [record.name for record in reopened] == ["Exercise", "Read"]
+
+
+def test_snapshot_detects_outside_writes(populated_storage, snapshot_path):
+    snapshot = HabitSnapshot.load(populated_storage, snapshot_path)
+    habit = populated_storage.load_habits(name="Read")[0]
+    populated_storage.save_task(Task(habit_id=habit.id, expected_completion_by=datetime(2024, 1, 7, 23, 59, 59)))
+
+    assert not snapshot.is_current(populated_storage)
+    snapshot.rebuild(populated_storage)
+    assert snapshot.get(habit.id).latest_task_id is not None
+
+
+def test_incremental_updates(populated_storage, snapshot_path):
+    snapshot = HabitSnapshot.load(populated_storage, snapshot_path)
+    exercise, read = populated_storage.load_habits()
+
+    exercise.name = "Morning run"
+    exercise.current_streak = 3
+    snapshot.upsert(exercise)
+    snapshot.remove(read.id)
+    new_habit = populated_storage.save_habit(Habit("Meditate", "daily"))
+    snapshot.append(new_habit)
+
+    assert [(record.name, record.current_streak) for record in snapshot] == [("Morning run", 3), ("Meditate", 0)]
+    assert snapshot.get(exercise.id).latest_task_id is not None
+    assert read.id not in snapshot and new_habit.id in snapshot
+    assert len(snapshot) == 2
+
+    new_habit.periodicity = "every 3 days"
+    snapshot.upsert(new_habit)
+    assert (snapshot.get(new_habit.id).name, snapshot.get(new_habit.id).periodicity) == ("Meditate", "every 3 days")
+
+
+def test_habit_manager_with_snapshot(populated_storage, snapshot_path, mocker):
+    snapshot = HabitSnapshot.load(populated_storage, snapshot_path)
+    load_habits = mocker.spy(populated_storage, "load_habits")
+    manager = HabitManager(populated_storage, snapshot=snapshot)
+    load_habits.assert_not_called()
+
+    exercise = snapshot.get(populated_storage.load_habits(name="Exercise")[0].id)
+    manager.update_habit(exercise.id, name="Running")
+    assert snapshot.get(exercise.id).name == "Running"
+
+    assert manager.mark_habit_completed(exercise.id) == COMPLETED_MESSAGE
+    assert snapshot.get(exercise.id).current_streak == 1
+    assert snapshot.get(exercise.id).latest_task_id == populated_storage.load_latest_task(exercise.id).id
+    assert snapshot.is_current(populated_storage)
+
+    created = manager.create_habit("Stretch", "daily")
+    manager.delete_habit(exercise.id)
+    assert [record.name for record in manager.habits] == ["Read", "Stretch"]
+    assert created.id in snapshot
@@ -0,0 +1,51 @@
+import numpy as np
+from datetime import datetime, timedelta
+from src.habits import Habit
+from src.streaks import compute_streaks, recompute_streaks
+from src.tasks import Task
+
+
+START = datetime(2024, 1, 1, 23, 59, 59)
+
+
+def daily_tasks(habit_id, outcomes):
+    """
+    :param outcomes: One character per day: "x" on time, "l" a day late, "-" missed, "o" still open.
+    """
+    tasks = []
+    for day, outcome in enumerate(outcomes):
+        deadline = START + timedelta(days=day)
+        completed_on = {"x": deadline - timedelta(hours=12), "l": deadline + timedelta(days=1)}.get(outcome)
+        tasks.append(Task(habit_id=habit_id, completed=completed_on is not None, completed_on=completed_on,
+                          expected_completion_by=deadline))
+    return tasks
+
+
+def test_compute_streaks():
+    rows = []
+    for habit_id, outcomes in ((1, "xxx-xxlxo"), (2, "xx-"), (3, "o")):
+        rows += [(habit_id, 0, int(task.completed), task.completed_day or 0, task.expected_day)
+                 for task in daily_tasks(habit_id, outcomes)]
+    tasks = np.array(rows, dtype=np.int64)
+    tasks[:, 1] = np.arange(len(tasks))
+
+    habit_ids, current, longest = compute_streaks(tasks, today=(START + timedelta(days=8)).toordinal())
+
+    # Habit 3's only task is overdue by now, which counts as a miss
+    assert habit_ids.tolist() == [1, 2, 3]
+    assert current.tolist() == [2, 0, 0]
+    assert longest.tolist() == [3, 2, 0]
+
+
+def test_recompute_streaks_writes_back_drifted_habits(storage):
+    drifted = storage.save_habit(Habit("Exercise", "daily", current_streak=7, longest_streak=7))
+    correct = storage.save_habit(Habit("Read", "daily", current_streak=2, longest_streak=3))
+    idle = storage.save_habit(Habit("Stretch", "daily", current_streak=4, longest_streak=4))
+    storage.save_tasks(daily_tasks(drifted.id, "xx--xlo") + daily_tasks(correct.id, "xxx-xxo"))
+
+    assert recompute_streaks(storage, today=(START + timedelta(days=6)).toordinal()) == 2
+
+    streaks = {row.id: (row.current_streak, row.longest_streak) for row in storage.load_streaks()}
+    assert streaks == {drifted.id: (1, 2), correct.id: (2, 3), idle.id: (0, 0)}
+    assert (drifted.current_streak, drifted.longest_streak) == (1, 2)
+    assert recompute_streaks(storage, today=(START + timedelta(days=6)).toordinal()) == 0
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from src.habits import Habit
+from src.sweeper import sweep_overdue_habits
+from src.tasks import Task
+
+
+def test_sweep_resets_overdue_habits(storage, statements):
+    now = datetime(2024, 3, 6, 9)  # a Wednesday
+    daily, weekly, on_track, done = storage.save_habits([
+        Habit("Exercise", "daily", 5, 8, next_completion_date=datetime(2024, 3, 4, 23, 59, 59)),
+        Habit("Read", "weekly", 3, 3, next_completion_date=datetime(2024, 3, 1, 23, 59, 59)),
+        Habit("Stretch", "daily", 2, 2, next_completion_date=datetime(2024, 3, 6, 23, 59, 59)),
+        Habit("Journal", "daily", 1, 1, next_completion_date=datetime(2024, 3, 5, 23, 59, 59)),
+    ])
+    storage.save_tasks([
+        Task(habit_id=daily, expected_completion_by=datetime(2024, 3, 4, 23, 59, 59)),
+        Task(habit_id=weekly, expected_completion_by=datetime(2024, 3, 1, 23, 59, 59)),  # a Friday
+        Task(habit_id=on_track, expected_completion_by=datetime(2024, 3, 6, 23, 59, 59)),
+        Task(habit_id=done, completed=True, completed_on=datetime(2024, 3, 5, 8),
+             expected_completion_by=datetime(2024, 3, 5, 23, 59, 59)),
+    ])
+    loaded = storage.load_habit(daily)
+    statements.clear()
+
+    result = sweep_overdue_habits(storage, now)
+
+    assert (result.habits, result.tasks) == (2, 2)
+    assert result.seconds >= 0
+    assert statements.count("INSERT") == 1 and statements.count("UPDATE") == 1
+    assert (loaded.current_streak, loaded.longest_streak) == (0, 8)
+    assert loaded.next_completion_date == datetime(2024, 3, 6, 23, 59, 59)
+    assert storage.load_habit(weekly).next_completion_date == datetime(2024, 3, 8, 23, 59, 59)
+    assert storage.load_latest_task(weekly).expected_completion_by == datetime(2024, 3, 8, 23, 59, 59)
+    assert len(storage.load_tasks_for_habit(daily)) == 2
+    assert storage.load_habit(on_track).current_streak == 2
+    assert storage.load_habit(done).current_streak == 1
+
+    assert sweep_overdue_habits(storage, now)[:2] == (0, 0)
@@ -46,4 +46,4 @@ def test_calculate_expected_completion_by_weekly(sample_task, sample_datetime, m
 
 def test_calculate_expected_completion_by_invalid_periodicity(sample_task):
     with pytest.raises(ValueError, match="Unsupported periodicity"):
-        sample_task.calculate_expected_completion_by("monthly")
+        sample_task.calculate_expected_completion_by("fortnightly")
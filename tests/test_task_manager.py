@@ -1,10 +1,10 @@
 import pytest
 from datetime import datetime, timedelta
-from src.tasks import Task
+from src.tasks import Task, TaskManager
 
 
 def test_create_task(task_manager, mock_storage):
-    mock_storage.load_tasks_for_habit.return_value = []
+    mock_storage.load_latest_task.return_value = None
     expected_task = Task(habit_id=1, expected_completion_by=datetime.now())
     mock_storage.save_task.return_value = expected_task
 
@@ -13,13 +13,13 @@ def test_create_task(task_manager, mock_storage):
     assert created_task.habit_id == 1
     assert created_task.expected_completion_by is not None
     mock_storage.save_task.assert_called_once()
-    mock_storage.load_tasks_for_habit.assert_called_once_with(1)
+    mock_storage.load_latest_task.assert_called_once_with(1)
     assert created_task == expected_task
 
 
 def test_create_task_existing_habit(task_manager, mock_storage):
     existing_task = Task(habit_id=1, expected_completion_by=datetime.now())
-    mock_storage.load_tasks_for_habit.return_value = [existing_task]
+    mock_storage.load_latest_task.return_value = existing_task
     expected_new_task = Task(
         habit_id=1, expected_completion_by=datetime.now() + timedelta(days=1))
     mock_storage.save_task.return_value = expected_new_task
@@ -29,7 +29,7 @@ def test_create_task_existing_habit(task_manager, mock_storage):
     assert created_task.habit_id == 1
     assert created_task.expected_completion_by > existing_task.expected_completion_by
     mock_storage.save_task.assert_called_once()
-    mock_storage.load_tasks_for_habit.assert_called_once_with(1)
+    mock_storage.load_latest_task.assert_called_once_with(1)
     assert created_task == expected_new_task
 
 
@@ -52,5 +52,74 @@ def test_delete_task(task_manager, mock_storage):
     task_manager.delete_task(1)
 
     assert task not in task_manager.tasks
-    mock_storage.session.delete.assert_called_once_with(task)
-    mock_storage.session.commit.assert_called_once()
+    mock_storage.delete_task.assert_called_once_with(1)
+
+
+def test_create_tasks(task_manager, mock_storage):
+    mock_storage.load_latest_task.return_value = None
+    created = Task(habit_id=1, expected_completion_by=datetime.now())
+    created.id = 7
+    mock_storage.save_tasks.return_value = [7]
+    mock_storage.load_tasks.return_value = [created]
+    task_manager.tasks = []
+
+    result = task_manager.create_tasks([(1, "daily")])
+
+    assert result == [created]
+    assert task_manager.tasks == [created]
+    mock_storage.save_tasks.assert_called_once()
+    mock_storage.load_tasks.assert_called_with(ids=[7])
+
+
+def test_task_window_is_bounded(mock_storage):
+    mock_storage.load_recent_tasks.return_value = []
+    manager = TaskManager(mock_storage, window_size=2)
+    mock_storage.load_latest_task.return_value = None
+    mock_storage.save_task.side_effect = lambda task: task
+
+    for habit_id in range(3):
+        manager.create_task(habit_id, "daily")
+
+    assert [task.habit_id for task in manager.tasks] == [1, 2]
+    mock_storage.load_recent_tasks.assert_called_once_with(2)
+
+
+def test_update_task_outside_window(task_manager, mock_storage):
+    task = Task(habit_id=1)
+    task.id = 5
+    task_manager.tasks.clear()
+    mock_storage.load_tasks.return_value = [task]
+
+    task_manager.update_task(5, completed=True)
+
+    assert task.completed
+    mock_storage.load_tasks.assert_called_once_with(ids=[5])
+    mock_storage.save_task.assert_called_once_with(task)
+
+
+def test_find_tasks(task_manager, mock_storage):
+    tasks = [Task(habit_id=habit_id) for habit_id in (1, 2, 1)]
+    for task_id, task in enumerate(tasks, start=1):
+        task.id = task_id
+    task_manager.tasks = tasks
+
+    task_manager.delete_task(1)
+
+    assert task_manager.find_tasks(1) == [tasks[2]]
+    assert task_manager.find_tasks(2) == [tasks[1]]
+
+
+def test_tasks_load_on_first_access(mock_storage):
+    window_task, other_task = Task(habit_id=1), Task(habit_id=2)
+    window_task.id, other_task.id = 1, 2
+    mock_storage.load_recent_tasks.return_value = [window_task]
+    mock_storage.load_tasks.return_value = [other_task]
+    manager = TaskManager(mock_storage, window_size=10)
+
+    assert manager.get_tasks([2]) == [other_task]
+    mock_storage.load_recent_tasks.assert_not_called()
+
+    assert list(manager.tasks) == [window_task]
+    manager.refresh()
+    assert list(manager.tasks) == [window_task]
+    assert mock_storage.load_recent_tasks.call_count == 2